@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Measure the time needed to import the relayr package.
+
+Each measurement imports the package in a new Python interpreter, like
+a short-lived script or a serverless function does on a cold start.
+The median of all runs is printed, and with ``--max`` the exit status
+is 1 if it exceeds the given number of milliseconds, e.g. for use in
+a CI job:
+
+    python benchmarks/import_time.py --runs 20 --max 100
+"""
+
+import sys
+import argparse
+import subprocess
+
+
+CODE = '''
+import time
+start = time.time()
+import %s
+print(time.time() - start)
+'''
+
+
+def measure(module, runs):
+    "Return the import times of a module in seconds, one per run."
+    times = []
+    for i in range(runs):
+        out = subprocess.check_output([sys.executable, '-c', CODE % module])
+        times.append(float(out))
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10,
+        help='number of measurements (default: 10)')
+    parser.add_argument('--module', default='relayr.client',
+        help='the module to import (default: relayr.client)')
+    parser.add_argument('--max', type=float,
+        help='maximum median import time in milliseconds')
+    args = parser.parse_args()
+
+    times = sorted(measure(args.module, args.runs))
+    median = times[len(times) // 2] * 1000
+    print('import %s: median %.1f ms, min %.1f ms, max %.1f ms (%d runs)' % (
+        args.module, median, times[0] * 1000, times[-1] * 1000, len(times)))
+    if args.max is not None and median > args.max:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
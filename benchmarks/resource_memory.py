@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Measure the memory needed per device object.
+
+Devices are created from the same kind of records the API returns when
+listing the devices of a user, once as the resource objects of this
+package and once as plain objects copying every field into their
+``__dict__``, like the resources of earlier versions did. Both variants
+share one device model object per model ID, so only the storage of the
+device fields is compared. Only the memory of the objects themselves is
+counted, not the one of the field values, which both variants share:
+
+    python benchmarks/resource_memory.py --devices 200000
+"""
+
+import argparse
+import tracemalloc
+
+from relayr.client import Client
+from relayr.resources import Device
+
+
+MODEL = {
+    'id': 'a7ec1b21-8582-4304-b1cf-15a1fc66d1e8',
+    'name': 'Wunderbar Thermometer & Humidity Sensor',
+    'manufacturer': 'Relayr GmbH',
+    'readings': [{'meaning': 'temperature', 'unit': 'celsius'},
+                 {'meaning': 'humidity', 'unit': 'percent'}],
+}
+
+
+class DictResource(object):
+    "A resource storing its fields in its ``__dict__``, as in earlier versions."
+
+    def __init__(self, id=None, client=None):
+        self.id = id
+        self.client = client
+
+
+def records(count):
+    "Return device records like the ones of ``Api.get_user_devices()``."
+    return [{
+        'id': '%08d-1111-2222-3333-444444444444' % i,
+        'name': 'My Wunderbar Thermometer',
+        'description': '',
+        'owner': 'a0b1c2d3-1111-2222-3333-444444444444',
+        'model': MODEL,
+        'public': False,
+        'secret': '123456',
+        'firmwareVersion': '1.0.0',
+    } for i in range(count)]
+
+
+# the device models shared by the devices of earlier versions, by ID
+old_models = {}
+
+
+def old_device(record, client):
+    "Create a device like earlier versions did, but with shared models."
+    d = DictResource(record['id'], client=client)
+    for k, v in record.items():
+        if k == 'model':
+            m = old_models.get(v['id'])
+            if m is None:
+                m = old_models[v['id']] = DictResource(v['id'], client=client)
+                for k2, v2 in v.items():
+                    setattr(m, k2, v2)
+            v = m
+        setattr(d, k, v)
+    return d
+
+
+def new_device(record, client):
+    "Create a device like ``User.get_devices()`` does."
+    return Device(client=client, **record)
+
+
+def measure(create, data, client):
+    "Return the number of bytes allocated per device by a function."
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    devices = [create(r, client) for r in data]
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del devices
+    return size / float(len(data))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--devices', type=int, default=100000,
+        help='number of devices (default: 100000)')
+    args = parser.parse_args()
+
+    client = Client(check_status=False)
+    data = records(args.devices)
+    old = measure(old_device, data, client)
+    new = measure(new_device, data, client)
+    print('%d devices: %.0f bytes per device before, %.0f after (%.0f%% less)' % (
+        args.devices, old, new, 100 * (1 - new / old)))
+
+
+if __name__ == '__main__':
+    main()
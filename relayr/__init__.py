@@ -3,7 +3,19 @@
 :license: MIT, see LICENSE.txt for details.
 """
 
-from relayr.client import Client, Api
+import sys
+
+
+def __getattr__(name):
+    # import the client machinery only when it is used, for fast startup
+    if name in ('Client', 'Api'):
+        from relayr import client
+        return getattr(client, name)
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
+
+if sys.version_info < (3, 7):
+    # no lazy module attributes
+    from relayr.client import Client, Api
 
 
 def show_docs(url=''):
@@ -0,0 +1,477 @@
+# -*- coding: utf-8 -*-
+
+"""
+Asynchronous implementation of the relayr HTTP RESTful API.
+
+This module contains the ``AsyncApi`` class providing the same endpoint
+methods as :py:class:`relayr.api.Api`, but for use with ``asyncio``: every
+endpoint method returns an awaitable for the result instead of blocking
+the calling thread. All requests share one pool of connections and the
+number of requests in flight is bounded, so a single event loop can drive
+thousands of concurrent calls.
+
+Retries, request coalescing, hedging and circuit breakers of ``Api`` are
+not available here. Deadlines set with :py:meth:`AsyncApi.deadline` apply
+to the current task instead of the current thread, and
+:py:meth:`AsyncApi.iter_history_devices` is an asynchronous generator.
+
+This module needs Python 3.7 or higher and the ``aiohttp`` package,
+which can be installed with ``pip install relayr[async]``.
+"""
+
+import asyncio
+import contextlib
+import contextvars
+
+import aiohttp
+
+from relayr import config
+from relayr import api
+from relayr.api import Api, endpoint_template
+from relayr.compat import monotonic
+from relayr.concurrency import BatchResult, call_args
+from relayr.exceptions import RelayrApiException, RelayrApiTimeoutException
+from relayr.utils.jsonstream import ArrayItemParser
+
+
+# the deadline of the innermost ``AsyncApi.deadline()`` block of a task
+_deadline = contextvars.ContextVar('relayr_deadline', default=None)
+
+
+class AsyncApi(Api):
+    """
+    This class provides asynchronous access to the relayr API endpoints.
+
+    Examples:
+
+    .. code-block:: python
+
+        import asyncio
+        from relayr.aio import AsyncApi
+
+        async def get_devices(token, deviceIDs):
+            async with AsyncApi(token=token) as a:
+                await a.check_server_status()
+                calls = [a.get_device(id) for id in deviceIDs]
+                return await asyncio.gather(*calls)
+    """
+
+    # seconds to cache host addresses for, the default of aiohttp
+    _dns_cache_ttl = 10
+
+    def __init__(self, token=None, session=None, pool_size=None, keep_alive=None,
+                 concurrency=None, rate_limiter=None, timeout=None, metrics=True,
+                 hooks=None):
+        """
+        Object construction.
+
+        Unlike :py:class:`relayr.api.Api` this doesn't check the server status,
+        call and await :py:meth:`check_server_status` for that.
+
+        :param token: A token generated on the relayr platform for a combination of
+            a relayr user and application.
+        :type token: string
+        :param session: An HTTP session to be used for all requests, e.g. one
+            shared with other ``AsyncApi`` objects (default: a new session
+            created on the first request).
+        :type session: ``aiohttp.ClientSession``
+        :param pool_size: Maximum number of pooled connections (default:
+            ``config.POOL_SIZE``), ignored if ``session`` is given.
+        :type pool_size: integer
+        :param keep_alive: Reuse connections between requests (default:
+            ``config.KEEP_ALIVE``).
+        :type keep_alive: boolean
+        :param concurrency: Maximum number of requests in flight at any
+            time (default: ``pool_size``), more requests wait for their turn.
+        :type concurrency: integer
+        :param rate_limiter: Budgets delaying requests to stay within
+            the rate limits of the API (default: no limits), can be shared
+            with other ``Api`` and ``AsyncApi`` objects.
+        :type rate_limiter: :py:class:`relayr.ratelimit.RateLimiter`
+        :param timeout: Maximum number of seconds for connecting to the API
+            and for waiting for response data, as a ``(connect, read)`` tuple
+            or one number for both (default: ``(config.CONNECT_TIMEOUT,
+            config.READ_TIMEOUT)``).
+        :type timeout: float or tuple
+        :param metrics: A registry for recording latencies, status codes and
+            sizes of all calls per endpoint (default: ``True`` for the
+            registry shared by all API objects), ``False`` disables recording.
+        :type metrics: :py:class:`relayr.metrics.MetricsRegistry`
+        :param hooks: Functions to be called at some point of every API call,
+            mapping events to lists of functions, see
+            :py:meth:`relayr.api.Api.add_hook`.
+        :type hooks: dict
+        """
+        super(AsyncApi, self).__init__(token=token, session=session,
+            pool_size=pool_size, keep_alive=keep_alive, check_status=False,
+            retry=False, circuit_breaker=False, rate_limiter=rate_limiter,
+            timeout=timeout, metrics=metrics, hooks=hooks, coalesce=False,
+            concurrency_limiter=False)
+        self.concurrency = concurrency or self.pool_size
+        self._semaphore = None
+
+    def _create_session(self):
+        "Defer creating the session until the first request inside the event loop."
+        return None
+
+    def _enable_dns_cache(self, ttl):
+        "Let the connector of the session cache host addresses for ``ttl`` seconds."
+        self._dns_cache_ttl = ttl
+
+    def _after_fork(self):
+        "Drop the session and semaphore inherited from the parent process."
+        super(AsyncApi, self)._after_fork()
+        self._semaphore = None
+
+    def _get_session(self):
+        "Return the HTTP session, create it first if needed."
+        if self.session is None:
+            connector = aiohttp.TCPConnector(limit=self.pool_size,
+                force_close=not self.keep_alive,
+                ttl_dns_cache=self._dns_cache_ttl)
+            self.session = aiohttp.ClientSession(connector=connector)
+        return self.session
+
+    def _get_semaphore(self):
+        "Return the semaphore bounding the requests in flight, create it first if needed."
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._semaphore
+
+    async def close(self):
+        """
+        Close all pooled connections of this object.
+
+        A session passed in by the caller is left open since it might be
+        shared with other objects.
+        """
+        if self._own_session and self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def warm(self, connections=None):
+        """
+        Open pooled connections to the API hosts ahead of time.
+
+        See :py:meth:`relayr.api.Api.warm`.
+
+        :rtype: A dict mapping the hosts to the numbers of connections opened.
+        """
+        connections = connections or self.pool_size
+        hosts = [self.host] + [h for h in [self.history_host] if h != self.host]
+        arguments = [host for host in hosts for i in range(connections)]
+        if not self.keep_alive:
+            return dict((host, 0) for host in hosts)
+
+        session = self._get_session()
+        connect, read = self.timeout
+        timeout = aiohttp.ClientTimeout(sock_connect=connect, sock_read=read)
+
+        async def open_connection(host):
+            async with session.request('HEAD', host + '/', timeout=timeout):
+                pass
+
+        results = await asyncio.gather(*[open_connection(host) for host in arguments],
+            return_exceptions=True)
+        opened = dict((host, 0) for host in hosts)
+        for host, result in zip(arguments, results):
+            if not isinstance(result, Exception):
+                opened[host] += 1
+        return opened
+
+    async def check_server_status(self, ttl=None):
+        """
+        Check if the API is available, reusing a recent result if possible.
+
+        This shares the cache of recent results with
+        :py:meth:`relayr.api.Api.check_server_status`.
+
+        :param ttl: Maximum age of a reused result in seconds (default:
+            ``config.STATUS_CHECK_TTL``), 0 forces a new check.
+        :type ttl: float
+        :rtype: A dict with certain fields describing the server status.
+        """
+        ttl = config.STATUS_CHECK_TTL if ttl is None else ttl
+        entry = api._server_status_cache.get(self.host)
+        if entry is not None and monotonic() - entry[0] < ttl:
+            return entry[1]
+        status = await self.get_server_status()
+        api._server_status_cache[self.host] = (monotonic(), status)
+        return status
+
+    async def batch(self, endpoint, arguments, workers=None):
+        """
+        Call an API endpoint concurrently for many sets of arguments.
+
+        See :py:meth:`relayr.api.Api.batch`, this awaits all calls instead
+        of running them in threads.
+
+        :param workers: the maximum number of calls in flight (default:
+            the ``concurrency`` of this object)
+        :type workers: integer
+        :rtype: :py:class:`relayr.concurrency.BatchResult`
+        """
+        if not callable(endpoint):
+            endpoint = getattr(self, endpoint)
+        semaphore = asyncio.Semaphore(workers or self.concurrency)
+        start = monotonic()
+
+        async def call(args):
+            async with semaphore:
+                return await call_args(endpoint, args)
+
+        arguments = list(arguments)
+        results = await asyncio.gather(*[call(args) for args in arguments],
+            return_exceptions=True)
+        errors = dict((i, r) for (i, r) in enumerate(results) if isinstance(r, BaseException))
+        for i in errors:
+            results[i] = None
+        return BatchResult(results, errors, monotonic() - start)
+
+    @contextlib.contextmanager
+    def deadline(self, seconds):
+        """
+        Limit the total time of all API calls made in a ``with`` block.
+
+        See :py:meth:`relayr.api.Api.deadline`. The deadline applies to
+        the calls made by the current task, including those prepared in
+        the block but awaited later, e.g. with ``asyncio.gather()``.
+
+        :param seconds: the time available for the block
+        :type seconds: float
+
+        Example:
+
+        .. code-block:: python
+
+            with a.deadline(2.5):
+                dev = await a.get_device(deviceID)
+                model = await a.get_device_model(dev['model']['id'])
+        """
+        token = _deadline.set(self._get_deadline(seconds))
+        try:
+            yield
+        finally:
+            _deadline.reset(token)
+
+    def _get_deadline(self, seconds=None):
+        """
+        Return the deadline for a call in ``relayr.compat.monotonic()`` time.
+
+        This is the earlier of the deadline of the current ``with``
+        block, if any, and the given number of seconds from now, if any.
+        """
+        deadlines = [_deadline.get()]
+        if seconds is not None:
+            deadlines.append(monotonic() + seconds)
+        deadlines = [d for d in deadlines if d is not None]
+        return min(deadlines) if deadlines else None
+
+    async def _client_timeout(self, method, url, timeout, deadline):
+        """
+        Wait for the rate limit, if any, and return the timeout of a request.
+
+        ``deadline`` is in ``relayr.compat.monotonic()`` time. A
+        ``RelayrApiTimeoutException`` is raised if the rate limit doesn't
+        allow the request before the deadline.
+        """
+        remaining = None if deadline is None else deadline - monotonic()
+        if self.rate_limiter is not None:
+            delay = self.rate_limiter.reserve(method, url, remaining)
+            if delay is None:
+                self._record_timeout(method, url)
+                msg = "API request deadline exceeded waiting for the rate limit - {0} {1}"
+                raise RelayrApiTimeoutException(msg.format(method.upper(), url))
+            if delay > 0:
+                await asyncio.sleep(delay)
+        total = None
+        if deadline is not None:
+            # the rate limit wait counts against the deadline, too
+            total = max(deadline - monotonic(), 0.001)
+        connect, read = timeout or self.timeout
+        return aiohttp.ClientTimeout(total=total, sock_connect=connect, sock_read=read)
+
+    async def iter_history_devices(self, deviceID, start=None, end=None, sample=None,
+                                   meaning=None, path=None, offset=None, limit=None,
+                                   chunk_size=None, field='data'):
+        """
+        Yield past data for a specific device while it is being received.
+
+        See :py:meth:`relayr.api.Api.iter_history_devices`, this is an
+        asynchronous generator. The request takes up one of the
+        ``concurrency`` slots of this object until the iteration ends.
+
+        Example:
+
+        .. code-block:: python
+
+            async for reading in a.iter_history_devices(deviceID, limit=10000):
+                print(reading)
+        """
+        url = self._history_devices_url(deviceID, start=start, end=end,
+            sample=sample, meaning=meaning, path=path, offset=offset, limit=limit)
+        template = endpoint_template(url)
+        headers = self._request_headers(self.headers)
+        client_timeout = await self._client_timeout('GET', url, None,
+            self._get_deadline())
+        if self.logger is not None:
+            self._log_request('GET', url, None, headers)
+        info = self._start_call('GET', url, template, b'', 'iter_history_devices')
+        session = self._get_session()
+        parser = ArrayItemParser(field)
+        start = monotonic()
+        status, error, received, pending = None, None, 0, []
+        try:
+            async with self._get_semaphore():
+                async with session.request('GET', url, headers=headers,
+                        timeout=client_timeout) as resp:
+                    status = resp.status
+                    if self.logger is not None:
+                        self._log_response(status, resp.headers)
+                    if not 200 <= status < 300:
+                        content = await resp.read()
+                        received += len(content)
+                        self._handle_response('GET', url, None, headers, status, content)
+                    chunks = resp.content.iter_chunked(2**16)
+                    while not parser.done:
+                        try:
+                            chunk = await chunks.__anext__()
+                        except StopAsyncIteration:
+                            chunk = None
+                        except asyncio.TimeoutError:
+                            self._record_timeout('GET', url)
+                            msg = "API response timed out - GET {0}"
+                            raise RelayrApiTimeoutException(msg.format(url))
+                        except aiohttp.ClientError as e:
+                            msg = "API response interrupted - GET {0}: {1}"
+                            raise RelayrApiException(msg.format(url, e))
+                        try:
+                            if chunk is None:
+                                items = parser.close()
+                            else:
+                                received += len(chunk)
+                                items = parser.feed(chunk)
+                        except ValueError as e:
+                            # a malformed body or one cut short by the server
+                            msg = "API response malformed or truncated - GET {0}: {1}"
+                            raise RelayrApiException(msg.format(url, e))
+                        if not chunk_size:
+                            for item in items:
+                                yield item
+                        else:
+                            pending.extend(items)
+                            while len(pending) >= chunk_size:
+                                yield pending[:chunk_size]
+                                del pending[:chunk_size]
+                        if chunk is None:
+                            break
+            if pending:
+                yield pending
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            # also reached when the caller stops iterating early
+            if self.metrics is not None:
+                self.metrics.observe('GET', template, monotonic() - start,
+                    status, 0, received)
+            if info is not None:
+                self._finish_call(info, status, error=error,
+                    size=None if status is None else received)
+
+    def perform_request(self, method, url, data=None, headers=None, endpoint=None):
+        """
+        Prepare an API call and return an awaitable for its JSON result.
+
+        The result is wrapped in a ``(None, awaitable)`` tuple in place of
+        the ``(status, data)`` tuple returned by
+        :py:meth:`relayr.api.Api.perform_request`, so that all endpoint
+        methods inherited from ``Api`` return awaitables, e.g.
+        ``data = await a.get_device(deviceID)``. Use
+        :py:meth:`perform_request_async` to access the status code, too.
+        """
+        # the deadline of the block preparing the call, not awaiting it
+        deadline = self._get_deadline()
+        return None, self._perform_request_data(method, url, data, headers,
+            deadline, endpoint)
+
+    async def _perform_request_data(self, method, url, data, headers, deadline,
+                                    endpoint):
+        _, js = await self._perform_request(method, url, data, headers, None,
+            deadline, endpoint)
+        return js
+
+    async def perform_request_async(self, method, url, data=None, headers=None,
+                                    timeout=None, deadline=None, endpoint=None):
+        """
+        Perform an API call and return its status code and JSON result.
+
+        See :py:meth:`relayr.api.Api.perform_request` for the parameters and
+        the exceptions raised. ``endpoint`` is the name of the endpoint
+        method passed to hooks, see :py:meth:`relayr.api.Api.add_hook`.
+
+        :rtype: A ``(status, data)`` tuple.
+        """
+        return await self._perform_request(method, url, data, headers, timeout,
+            self._get_deadline(deadline), endpoint)
+
+    async def _perform_request(self, method, url, data, headers, timeout, deadline,
+                               endpoint):
+        """
+        Perform an API call, see :py:meth:`perform_request_async`.
+
+        ``deadline`` is in ``relayr.compat.monotonic()`` time.
+        """
+        if self.logger is not None:
+            self._log_request(method, url, data, headers)
+
+        json_data = self._encode_body(method, data)
+        headers = self._request_headers(headers)
+        session = self._get_session()
+        client_timeout = await self._client_timeout(method, url, timeout, deadline)
+        info = self._start_call(method, url, endpoint_template(url), json_data,
+            endpoint)
+        start = monotonic()
+        try:
+            async with self._get_semaphore():
+                async with session.request(method.upper(), url, data=json_data,
+                        headers=headers, timeout=client_timeout) as resp:
+                    status = resp.status
+                    content = await resp.read()
+                    if self.logger is not None:
+                        self._log_response(status, resp.headers, content)
+        except Exception as e:
+            error = e
+            if isinstance(e, asyncio.TimeoutError):
+                msg = "API request timed out - {0} {1}"
+                error = RelayrApiTimeoutException(msg.format(method.upper(), url))
+            if self.metrics is not None:
+                template = endpoint_template(url)
+                self.metrics.observe(method, template, monotonic() - start,
+                    sent=len(json_data))
+                if error is not e:
+                    self.metrics.record_timeout(method, template)
+            if info is not None:
+                self._finish_call(info, error=error)
+            if error is not e:
+                raise error
+            raise
+        if self.metrics is not None:
+            self.metrics.observe(method, endpoint_template(url), monotonic() - start,
+                status, len(json_data), len(content))
+
+        try:
+            result = self._handle_response(method, url, data, headers, status, content)
+        except RelayrApiException as e:
+            if info is not None:
+                self._finish_call(info, status, content, e)
+            raise
+        if info is not None:
+            self._finish_call(info, status, content)
+        return result
@@ -7,45 +7,60 @@ used in that endpoint e.g. ``post_user_app`` for the endpoint
 ``POST /users/<id>/apps/<id>`` with minor modifications.
 """
 
-import os
+import re
 import time
 import json
-import platform
-import urllib
+import random
 import warnings
-import logging
-import datetime
-
-import requests
+import threading
+import contextlib
 
 from relayr import config
-from relayr.version import __version__
-from relayr.exceptions import RelayrApiException
+from relayr import forksafe
+from relayr.compat import monotonic, string_types, urlencode
+from relayr.concurrency import call_many, SingleFlight, AdaptiveLimiter
+from relayr.cache import ResponseCache
+from relayr.codec import get_codec
+from relayr.metrics import get_registry
+from relayr.hedge import HedgePolicy
+from relayr.hooks import RequestInfo, HOOK_EVENTS
+from relayr.utils.jsonstream import iter_array_items, iter_chunked
+from relayr.retry import RetryPolicy, parse_retry_after, get_circuit_breaker,\
+    circuit_breaker_stats
+from relayr.exceptions import RelayrApiException, RelayrCircuitOpenException,\
+    RelayrApiTimeoutException
+
+
+# Results of recent server status checks shared by all Api objects,
+# mapping API hosts to (timestamp, status) tuples, and locks per host
+# letting one thread at a time check the status of a host.
+_server_status_cache = {}
+_server_status_locks = {}
+_server_status_lock = threading.Lock()
 
 
-def create_logger(sender):
-    """Create a logger for the requesting object."""
+def _reset_server_status_lock():
+    global _server_status_lock
+    _server_status_lock = threading.Lock()
+    _server_status_locks.clear()
 
-    logger = logging.getLogger('Relayr API Client')
-    logger.setLevel(logging.DEBUG)
+forksafe.register_hook(_reset_server_status_lock)
 
-    logfile = "{0}/relayr-api-{1}.log".format(config.LOG_DIR, id(sender))
-    h = logging.FileHandler(logfile)
-    # h = logging.RotatingFileHandler(logfile,
-    #     mode='a', maxBytes=2**14, backupCount=5, encoding=None, delay=0)
 
-    # h.setLevel(logging.DEBUG)
+def _get_server_status_lock(host):
+    "Return the lock for checking the status of a host, create it first if needed."
+    with _server_status_lock:
+        lock = _server_status_locks.get(host)
+        if lock is None:
+            lock = _server_status_locks[host] = threading.Lock()
+        return lock
 
-    # create formatter and add it to the handler(s)
-    fmt = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    formatter = logging.Formatter(fmt, '%Y-%m-%d %H:%M:%S.%f %Z%z')
-    formatter.converter = time.gmtime
-    h.setFormatter(formatter)
 
-    # add the handler(s) to the logger
-    logger.addHandler(h)
+def create_logger(sender=None):
+    "Return the shared logger for API requests, see :py:func:`relayr.logs.create_logger`."
+    from relayr.logs import create_logger
+    return create_logger(sender)
 
-    return logger
 
 def build_curl_call(method, url, data=None, headers=None):
     """
@@ -79,6 +94,84 @@ def build_curl_call(method, url, data=None, headers=None):
         command += " --data {0}".format(json.dumps(jsdata))
     return command
 
+# path segments taken as resource IDs in endpoint templates, e.g. UUIDs
+_ID_SEGMENT = re.compile(r'^(?=.*[0-9])[^/]{8,}$|@')
+
+
+def endpoint_template(url):
+    """
+    Return the endpoint template of a URL, used to identify API endpoints.
+
+    The template is the URL path without host and query, and with all
+    segments looking like IDs (containing a digit and at least eight
+    characters long, like UUIDs, or containing an ``@``) replaced by
+    ``{id}``.
+
+    :param url: Full HTTP path.
+    :type url: string
+    :rtype: string
+
+    Example:
+
+    .. code-block:: python
+
+        url = 'https://api.relayr.io/devices/a7ec1b21-8582-4304-b1cf-15a1fc66d1e8/cmd'
+        assert endpoint_template(url) == '/devices/{id}/cmd'
+    """
+    path = url.split('?', 1)[0]
+    if '://' in path:
+        path = '/' + path.split('://', 1)[1].partition('/')[2]
+    segments = ['{id}' if _ID_SEGMENT.search(seg) else seg
+        for seg in path.split('/')]
+    return '/'.join(segments)
+
+
+def _discard_response(future):
+    "Close the response of a request whose result isn't needed anymore."
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+
+def create_session(pool_size=None):
+    """
+    Create an HTTP session with a pool of persistent connections.
+
+    The returned session can be shared by several :py:class:`Api` objects
+    (it is safe to use from multiple threads) so that all of them reuse
+    the same TCP/TLS connections to the relayr hosts.
+
+    :param pool_size: Maximum number of connections kept per host
+        (default: ``config.POOL_SIZE``).
+    :type pool_size: integer
+    :rtype: ``requests.Session``
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    pool_size = config.POOL_SIZE if pool_size is None else pool_size
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def reset_session(session):
+    """
+    Drop all pooled connections of an HTTP session, e.g. in a forked process.
+
+    The connections are closed without notifying the server, so they stay
+    usable by other processes sharing them.
+
+    :param session: the HTTP session
+    :type session: ``requests.Session``
+    """
+    for adapter in getattr(session, 'adapters', {}).values():
+        poolmanager = getattr(adapter, 'poolmanager', None)
+        if poolmanager is not None:
+            poolmanager.clear()
+
 class Api(object):
     """
     This class provides direct access to the relayr API endpoints.
@@ -95,15 +188,126 @@ class Api(object):
         assert a.get_public_device_model_meanings() > 0
     """
 
-    def __init__(self, token=None):
+    def __init__(self, token=None, session=None, pool_size=None, keep_alive=None,
+                 check_status=True, cache=None, cache_ttls=None, retry=None,
+                 circuit_breaker=True, rate_limiter=None, timeout=None, codec=None,
+                 metrics=True, hooks=None, coalesce=None, hedge=None,
+                 concurrency_limiter=None):
         """
         Object construction.
 
         :param token: A token generated on the relayr platform for a combination of
             a relayr user and application.
         :type token: string
+        :param session: An HTTP session to be used for all requests, e.g. one
+            shared with other ``Api`` objects (default: a new session created
+            with :py:func:`create_session`).
+        :type session: ``requests.Session``
+        :param pool_size: Maximum number of pooled connections per host
+            (default: ``config.POOL_SIZE``), ignored if ``session`` is given.
+        :type pool_size: integer
+        :param keep_alive: Reuse connections between requests (default:
+            ``config.KEEP_ALIVE``). If ``False`` every connection is closed
+            after its response was read.
+        :type keep_alive: boolean
+        :param check_status: Check if the API is available before returning,
+            see :py:meth:`check_server_status`.
+        :type check_status: boolean
+        :param cache: A storage for caching responses of read-mostly endpoints
+            (default: no caching), see :py:mod:`relayr.cache`.
+        :type cache: :py:class:`relayr.cache.MemoryCache` or
+            :py:class:`relayr.cache.FileCache`
+        :param cache_ttls: Time-to-live in seconds of cached responses per
+            endpoint template, overriding ``relayr.cache.DEFAULT_TTLS``.
+        :type cache_ttls: dict
+        :param retry: The policy for retrying failed requests (default: a
+            policy with ``config.RETRIES`` retries), ``False`` disables retries.
+        :type retry: :py:class:`relayr.retry.RetryPolicy`
+        :param circuit_breaker: Fail fast while an API host is down, using
+            circuit breakers shared by all ``Api`` objects (default: ``True``).
+        :type circuit_breaker: boolean
+        :param rate_limiter: Budgets delaying requests to stay within
+            the rate limits of the API (default: no limits), can be shared
+            with other ``Api`` objects.
+        :type rate_limiter: :py:class:`relayr.ratelimit.RateLimiter`
+        :param timeout: Maximum number of seconds for connecting to the API
+            and for waiting for response data, as a ``(connect, read)`` tuple
+            or one number for both (default: ``(config.CONNECT_TIMEOUT,
+            config.READ_TIMEOUT)``).
+        :type timeout: float or tuple
+        :param codec: The JSON codec for request and response bodies or its
+            name (default: ``config.JSON_CODEC``), see :py:mod:`relayr.codec`.
+        :type codec: string or codec object
+        :param metrics: A registry for recording latencies, status codes and
+            sizes of all calls per endpoint, see :py:mod:`relayr.metrics`
+            (default: ``True`` for the registry shared by all ``Api``
+            objects), ``False`` disables recording.
+        :type metrics: :py:class:`relayr.metrics.MetricsRegistry`
+        :param hooks: Functions to be called at some point of every API call,
+            mapping events to lists of functions, see :py:meth:`add_hook`.
+        :type hooks: dict
+        :param coalesce: Let concurrent identical ``GET`` requests from
+            several threads share one HTTP request (default:
+            ``config.COALESCE_REQUESTS``, which is off), a
+            :py:class:`relayr.concurrency.SingleFlight` object can be
+            passed to share it with other ``Api`` objects. Only the call
+            sending the request runs hooks and records metrics, the
+            calls waiting for it get copies of its result or exception.
+        :type coalesce: boolean or :py:class:`relayr.concurrency.SingleFlight`
+        :param hedge: The policy for sending duplicates of slow ``GET``
+            requests and using the first response (default: no hedging),
+            ``True`` for a default policy, see :py:mod:`relayr.hedge`.
+        :type hedge: :py:class:`relayr.hedge.HedgePolicy`
+        :param concurrency_limiter: The limiter adjusting the number of
+            concurrent calls of :py:meth:`batch` to the load of the API
+            (default: a new limiter with the pool size as maximum),
+            ``False`` for a fixed number of concurrent calls.
+        :type concurrency_limiter: :py:class:`relayr.concurrency.AdaptiveLimiter`
         """
         self.token = token
+        self.keep_alive = config.KEEP_ALIVE if keep_alive is None else keep_alive
+        self.pool_size = config.POOL_SIZE if pool_size is None else pool_size
+        self._own_session = session is None
+        if session is None:
+            session = self._create_session()
+        self.session = session
+        self.cache = None
+        if cache is not None:
+            self.cache = ResponseCache(cache, ttls=cache_ttls)
+        if retry is None:
+            retry = RetryPolicy(total=config.RETRIES)
+        self.retry = retry or None
+        self.circuit_breaker = circuit_breaker and config.CIRCUIT_BREAKER_THRESHOLD > 0
+        self.rate_limiter = rate_limiter
+        if timeout is None:
+            timeout = (config.CONNECT_TIMEOUT, config.READ_TIMEOUT)
+        elif not isinstance(timeout, tuple):
+            timeout = (timeout, timeout)
+        self.timeout = timeout
+        self._local = threading.local()
+        if codec is None or isinstance(codec, string_types):
+            codec = get_codec(codec)
+        self.codec = codec
+        if metrics is True:
+            metrics = get_registry()
+        self.metrics = metrics or None
+        if coalesce is None:
+            coalesce = config.COALESCE_REQUESTS
+        if coalesce is True:
+            coalesce = SingleFlight()
+        self.single_flight = coalesce or None
+        if hedge is True:
+            hedge = HedgePolicy()
+        self.hedge = hedge or None
+        if concurrency_limiter is None:
+            concurrency_limiter = AdaptiveLimiter(max_limit=self.pool_size)
+        self.concurrency_limiter = concurrency_limiter or None
+        self._hedge_executor = None
+        self._hedge_lock = threading.Lock()
+        self.hooks = dict((event, []) for event in HOOK_EVENTS)
+        for event, funcs in (hooks or {}).items():
+            for func in funcs:
+                self.add_hook(event, func)
         self.host = config.relayrAPI
         self.history_host = config.relayrHistoryAPI
         self.useragent = config.userAgent
@@ -114,22 +318,230 @@ class Api(object):
         if self.token:
             self.headers['Authorization'] = 'Bearer {0}'.format(self.token)
 
+        # no logger at all if logging is off, so nothing is ever formatted
+        self.logger = None
         if config.LOG:
-            self.logger = create_logger(self)
-            self.logger.info('started')
+            self.logger = create_logger()
+            self.logger.info('started %s', id(self))
+
+        forksafe.register(self)
+
+        if config.DNS_CACHE_TTL > 0:
+            self._enable_dns_cache(config.DNS_CACHE_TTL)
 
         # check if the API is available
-        try:
-            self.get_server_status()
-        except:
-            raise
+        if check_status:
+            self.check_server_status()
 
     def __del__(self):
         """Object destruction."""
-        if config.LOG:
-            self.logger.info('terminated')
+        if getattr(self, 'logger', None) is not None:
+            self.logger.info('terminated %s', id(self))
+
+    def _create_session(self):
+        "Create the HTTP session used when none was passed to the constructor."
+        return create_session(pool_size=self.pool_size)
+
+    def _enable_dns_cache(self, ttl):
+        "Cache the addresses of the API hosts for ``ttl`` seconds."
+        from relayr.utils.dns import enable_dns_cache
+        enable_dns_cache([self.host, self.history_host], ttl)
+
+    def _after_fork(self):
+        "Replace the connections, threads and locks inherited from the parent process."
+        if self._own_session:
+            self.session = self._create_session()
+        else:
+            reset_session(self.session)
+        self._hedge_executor = None
+        self._hedge_lock = threading.Lock()
+
+    def close(self):
+        """
+        Close all pooled connections of this object.
+
+        A session passed in by the caller is left open since it might be
+        shared with other objects.
+        """
+        if self._own_session:
+            self.session.close()
+        with self._hedge_lock:
+            if self._hedge_executor is not None:
+                self._hedge_executor.shutdown(wait=False)
+                self._hedge_executor = None
+
+    def warm(self, connections=None):
+        """
+        Open pooled connections to the API hosts ahead of time.
+
+        This resolves the host names and sets up TCP and TLS for
+        ``connections`` connections to each of the API and history hosts
+        concurrently, so that the first API calls don't have to. Each
+        connection is opened with a ``HEAD`` request, which doesn't count
+        for retries, circuit breakers, metrics or hooks. Failures are
+        ignored.
+
+        :param connections: The number of connections per host (default: the
+            pool size of this object), more than the pool size are useless.
+        :type connections: integer
+        :rtype: A dict mapping the hosts to the numbers of connections opened.
+        """
+        connections = connections or self.pool_size
+        hosts = [self.host] + [h for h in [self.history_host] if h != self.host]
+        arguments = [host for host in hosts for i in range(connections)]
+        if not self.keep_alive:
+            return dict((host, 0) for host in hosts)
+
+        def connect(host):
+            self.session.request('HEAD', host + '/', timeout=self.timeout)
+
+        res = call_many(connect, arguments, workers=len(arguments))
+        opened = dict((host, 0) for host in hosts)
+        for i, host in enumerate(arguments):
+            if i not in res.errors:
+                opened[host] += 1
+        return opened
+
+    def check_server_status(self, ttl=None):
+        """
+        Check if the API is available, reusing a recent result if possible.
+
+        A successful check is remembered for all ``Api`` objects talking
+        to the same host during ``ttl`` seconds, so that creating many
+        objects within a short time results in a single request only.
+        Only checks of the same host wait for each other.
+
+        :param ttl: Maximum age of a reused result in seconds (default:
+            ``config.STATUS_CHECK_TTL``), 0 forces a new check.
+        :type ttl: float
+        :rtype: A dict with certain fields describing the server status.
+        """
+        ttl = config.STATUS_CHECK_TTL if ttl is None else ttl
+        entry = _server_status_cache.get(self.host)
+        if entry is not None and monotonic() - entry[0] < ttl:
+            return entry[1]
+        with _get_server_status_lock(self.host):
+            # another thread may have checked while this one was waiting
+            entry = _server_status_cache.get(self.host)
+            if entry is not None and monotonic() - entry[0] < ttl:
+                return entry[1]
+            status = self.get_server_status()
+            _server_status_cache[self.host] = (monotonic(), status)
+            return status
+
+    def stats(self):
+        """
+        Return statistics about the requests made, as a dict.
+
+        The ``circuit_breakers`` field maps API hosts to the state of their
+        circuit breakers (``closed``, ``open`` or ``half-open``), their
+        current and total number of failures and the number of rejected
+        requests. If this object has a rate limiter the ``rate_limiter``
+        field maps its budgets to the number of delayed requests and the
+        total delay in seconds. If this object coalesces requests the
+        ``single_flight`` field holds the numbers of requests sent and saved.
+        If this object hedges requests the ``hedging`` field maps endpoints
+        to the numbers of hedges, see :py:meth:`relayr.hedge.HedgePolicy.stats`.
+        If this object records metrics the ``endpoints`` field maps
+        endpoints to their latencies, status codes, sizes, retries and
+        timeouts, see :py:meth:`relayr.metrics.MetricsRegistry.stats`.
+        If this object has a concurrency limiter the ``concurrency`` field
+        holds the current limit of concurrent calls of :py:meth:`batch` and
+        the numbers of its adjustments.
+
+        :rtype: dict
+        """
+        stats = {
+            'circuit_breakers': circuit_breaker_stats(),
+        }
+        if self.metrics is not None:
+            stats['endpoints'] = self.metrics.stats()
+        if self.single_flight is not None:
+            stats['single_flight'] = self.single_flight.stats()
+        if self.hedge is not None:
+            stats['hedging'] = self.hedge.stats()
+        if self.rate_limiter is not None:
+            stats['rate_limiter'] = self.rate_limiter.stats()
+        if self.concurrency_limiter is not None:
+            stats['concurrency'] = self.concurrency_limiter.stats()
+        return stats
+
+    def batch(self, endpoint, arguments, workers=None):
+        """
+        Call an API endpoint concurrently for many sets of arguments.
+
+        Each set of arguments can be a tuple of positional arguments, a dict
+        of keyword arguments or a single value passed as the only argument.
+        Calls raising an exception don't abort the batch, their exceptions
+        are collected in the ``errors`` attribute of the result instead.
+
+        :param endpoint: an endpoint method of this object or its name
+        :type endpoint: callable or string
+        :param arguments: the sets of arguments, one per call
+        :type arguments: iterable
+        :param workers: a fixed number of concurrent calls (default: a
+            number adjusted to the load of the API by the concurrency
+            limiter of this object, up to the size of the connection pool)
+        :type workers: integer
+        :rtype: :py:class:`relayr.concurrency.BatchResult`
+
+        Example:
+
+        .. code-block:: python
+
+            res = api.batch('get_device', deviceIDs)
+            devices = [dev for dev in res if dev is not None]
+            print('%d errors in %.2f s' % (len(res.errors), res.elapsed))
+        """
+        if not callable(endpoint):
+            endpoint = getattr(self, endpoint)
+        if workers or self.concurrency_limiter is None:
+            return call_many(endpoint, arguments, workers or self.pool_size)
+        return call_many(endpoint, arguments, limiter=self.concurrency_limiter)
+
+    @contextlib.contextmanager
+    def deadline(self, seconds):
+        """
+        Limit the total time of all API calls made in a ``with`` block.
+
+        The deadline applies to the calls made by the current thread,
+        including all their retries. Calls not finished in time raise a
+        ``RelayrApiTimeoutException``. Nested deadlines can only shorten
+        the time available.
+
+        :param seconds: the time available for the block
+        :type seconds: float
+
+        Example:
+
+        .. code-block:: python
+
+            with api.deadline(2.5):
+                dev = api.get_device(deviceID)
+                model = api.get_device_model(dev['model']['id'])
+        """
+        outer = getattr(self._local, 'deadline', None)
+        self._local.deadline = self._get_deadline(seconds)
+        try:
+            yield
+        finally:
+            self._local.deadline = outer
+
+    def _get_deadline(self, seconds=None):
+        """
+        Return the deadline for a call in ``relayr.compat.monotonic()`` time.
+
+        This is the earlier of the deadline of the current ``with``
+        block, if any, and the given number of seconds from now, if any.
+        """
+        deadlines = [getattr(self._local, 'deadline', None)]
+        if seconds is not None:
+            deadlines.append(monotonic() + seconds)
+        deadlines = [d for d in deadlines if d is not None]
+        return min(deadlines) if deadlines else None
 
-    def perform_request(self, method, url, data=None, headers=None):
+    def perform_request(self, method, url, data=None, headers=None, timeout=None,
+                        deadline=None, endpoint=None):
         """
         Perform an API call and return a JSON result as Python data structure.
 
@@ -141,52 +553,373 @@ class Api(object):
         :type data: object serializable as JSON
         :param headers: Additional HTTP request headers.
         :type headers: dictionary
+        :param timeout: Timeouts for each attempt in seconds as a
+            ``(connect, read)`` tuple (default: the timeout of this object).
+        :type timeout: tuple
+        :param deadline: Maximum number of seconds for the whole call,
+            including retries.
+        :type deadline: float
+        :param endpoint: The name of the endpoint method making the call,
+            passed to hooks, see :py:meth:`add_hook`.
+        :type endpoint: string
         :rtype: string
 
         Query parameters are expected in the ``url`` parameter.
         For returned status codes other than 2XX a ``RelayrApiException``
         is raised which contains the API call (method and URL) plus
         a ``curl`` command replicating the API call for debugging reuse
-        on the command-line.
-        """
-        if config.LOG:
-            command = build_curl_call(method, url, data, headers)
-            self.logger.info("API request: " + command)
+        on the command-line. A ``RelayrApiTimeoutException`` is raised
+        if the timeout or deadline expires.
+
+        If this object has a response cache, cached responses of ``GET``
+        requests are returned without contacting the server while they
+        are fresh. Concurrent identical ``GET`` requests share one HTTP
+        request, unless disabled with the ``coalesce`` parameter of the
+        constructor.
+        """
+        if self.single_flight is not None and method.upper() == 'GET':
+            key = (url, tuple(sorted((headers or {}).items())))
+            return self.single_flight.call_until(self._get_deadline(deadline),
+                key, self._perform_request, method, url, data, headers,
+                timeout, deadline, endpoint)
+        return self._perform_request(method, url, data, headers, timeout, deadline,
+            endpoint)
+
+    def _perform_request(self, method, url, data, headers, timeout, deadline,
+                         endpoint):
+        "Perform an API call, see :py:meth:`perform_request`."
+        template = endpoint_template(url)
+        ttl, entry = 0, None
+        if self.cache is not None:
+            ttl = self.cache.ttl(method, template)
+            cache_key = self.cache.key(url, headers)
+            if ttl:
+                entry, fresh = self.cache.lookup(cache_key)
+                if fresh:
+                    return entry['status'], entry['data']
+                if entry is not None:
+                    headers = self.cache.conditional_headers(entry, headers)
+
+        if self.logger is not None:
+            self._log_request(method, url, data, headers)
+
+        json_data = self._encode_body(method, data)
+        headers = self._request_headers(headers)
+        info = self._start_call(method, url, template, json_data, endpoint)
+        start = monotonic()
+        try:
+            resp = self._send(method, url, json_data, headers,
+                timeout=timeout, deadline=self._get_deadline(deadline))
+        except Exception as e:
+            if self.metrics is not None:
+                self.metrics.observe(method, template, monotonic() - start,
+                    sent=len(json_data))
+            if info is not None:
+                self._finish_call(info, error=e)
+            raise
+        if self.metrics is not None:
+            self.metrics.observe(method, template, monotonic() - start,
+                resp.status_code, len(json_data), len(resp.content))
 
-        json_data = None if method.lower() == 'get' else "null"
-        if data is not None:
-            json_data = json.dumps(data)
+        if self.logger is not None:
+            self._log_response(resp.status_code, resp.headers, resp.content)
+
+        if entry is not None and resp.status_code == 304:
+            entry = self.cache.refresh(cache_key, ttl, entry)
+            if info is not None:
+                self._finish_call(info, resp.status_code, resp.content)
+            return entry['status'], entry['data']
+
+        try:
+            status, js = self._handle_response(method, url, data, headers,
+                resp.status_code, resp.content)
+        except RelayrApiException as e:
+            if info is not None:
+                self._finish_call(info, resp.status_code, resp.content, e)
+            raise
+        if info is not None:
+            self._finish_call(info, status, resp.content)
+        if ttl:
+            self.cache.store(cache_key, ttl, status, js, resp.headers)
+        elif self.cache is not None and method.upper() != 'GET':
+            self.cache.invalidate(cache_key)
+        return status, js
+
+    def add_hook(self, event, hook):
+        """
+        Register a function to be called at some point of every API call.
+
+        Hooks are called with a :py:class:`relayr.hooks.RequestInfo` object
+        describing the call, the same one for all hooks of a call, so
+        hooks can store data in its ``tags`` dict for later hooks. Hooks
+        are called in the thread making the call, exceptions raised by
+        them are propagated to the caller.
+
+        :param event: ``before_request`` (called before the request is
+            sent), ``after_response`` (called after a successful response
+            was decoded) or ``on_error`` (called when the call fails)
+        :type event: string
+        :param hook: a function taking a ``RequestInfo`` object
+        :type hook: callable
+        """
+        if event not in self.hooks:
+            raise ValueError('Unknown hook event: %r' % event)
+        self.hooks[event].append(hook)
+
+    def remove_hook(self, event, hook):
+        "Unregister a function added with :py:meth:`add_hook`."
+        self.hooks[event].remove(hook)
+
+    def _start_call(self, method, url, template, body, endpoint=None):
+        """
+        Call the ``before_request`` hooks and return the info about the call.
+
+        Return ``None`` if there are no hooks at all.
+        """
+        if not any(self.hooks.values()):
+            return None
+        info = RequestInfo(endpoint, method, url, template)
+        info.request_bytes = len(body)
+        for hook in self.hooks['before_request']:
+            hook(info)
+        info.start = time.time()
+        info._started = monotonic()
+        return info
+
+    def _finish_call(self, info, status=None, content=None, error=None, size=None):
+        """
+        Complete the info about a call and call the hooks of its outcome.
+
+        ``size`` is the number of bytes received for calls without ``content``.
+        """
+        info.duration = monotonic() - info._started
+        info.status = status
+        info.response_bytes = size if content is None else len(content)
+        info.error = error
+        for hook in self.hooks['on_error' if error is not None else 'after_response']:
+            hook(info)
+
+    def _log_request(self, method, url, data, headers):
+        "Log a request, formatting it in the background."
+        from relayr.logs import Lazy
+        headers = dict(headers or {})
+        if random.random() < config.LOG_SAMPLE_RATE:
+            command = Lazy(build_curl_call, method, url, data, headers)
+        else:
+            command = Lazy(build_curl_call, method, url, None, headers)
+        self.logger.info("API request: %s", command)
+
+    def _log_response(self, status, headers, content=None):
+        "Log a response, formatting it in the background."
+        from relayr.logs import Lazy, log_body
+        self.logger.info("API response status: %s", status)
+        self.logger.info("API response headers: %s", Lazy(json.dumps, dict(headers)))
+        log_body(self.logger, "API response content: %s", content)
+
+    def _send(self, method, url, body, headers, timeout=None, deadline=None,
+              stream=False):
+        """
+        Send a request and return the response, retrying failed attempts.
+
+        Requests are retried according to the retry policy of this object.
+        If the circuit breaker of the host is open the request is rejected
+        with a ``RelayrCircuitOpenException`` without sending it. Every
+        attempt waits for the rate limiter of this object, if any, unless
+        that wait would pass the deadline.
+
+        Each attempt is limited by ``timeout``, a ``(connect, read)`` tuple
+        of seconds, and all attempts together by ``deadline``, a point in
+        time as returned by ``relayr.compat.monotonic()``. A
+        ``RelayrApiTimeoutException`` is raised when either one expires.
+
+        With ``stream=True`` the response body is not read yet.
+        """
+        import requests
+        forksafe.check()
+        timeout = timeout or self.timeout
+        breaker = None
+        if self.circuit_breaker:
+            breaker = get_circuit_breaker(url.split('/')[2],
+                config.CIRCUIT_BREAKER_THRESHOLD, config.CIRCUIT_BREAKER_TIMEOUT)
+        attempt = 0
+        while True:
+            attempt_timeout = timeout
+            remaining = None
+            if deadline is not None:
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    self._record_timeout(method, url)
+                    msg = "API request deadline exceeded - {0} {1}"
+                    raise RelayrApiTimeoutException(msg.format(method.upper(), url))
+            if self.rate_limiter is not None:
+                delay = self.rate_limiter.reserve(method, url, remaining)
+                if delay is None:
+                    self._record_timeout(method, url)
+                    msg = "API request deadline exceeded waiting for the rate limit - {0} {1}"
+                    raise RelayrApiTimeoutException(msg.format(method.upper(), url))
+                if delay > 0:
+                    time.sleep(delay)
+                    if deadline is not None:
+                        # the wait was bounded by the time remaining
+                        remaining = max(deadline - monotonic(), 0.001)
+            if deadline is not None:
+                attempt_timeout = (min(timeout[0], remaining), min(timeout[1], remaining))
+            if breaker is not None and not breaker.allow():
+                msg = "API host seems to be down, request rejected - {0} {1}"
+                raise RelayrCircuitOpenException(msg.format(method.upper(), url))
             try:
-                json_data = json_data.encode('utf-8')
-            except (UnicodeDecodeError, AttributeError):
-                # bytes/str - no need to re-encode
-                pass
+                if self.hedge is not None and not stream:
+                    resp = self._hedged_request(method, url, body, headers, attempt_timeout)
+                else:
+                    resp = self.session.request(method.upper(), url,
+                        data=body, headers=headers, timeout=attempt_timeout,
+                        stream=stream)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if breaker is not None:
+                    breaker.record_failure()
+                delay = self._retry_delay(method, attempt, None, deadline)
+                if delay is None:
+                    if isinstance(e, requests.exceptions.Timeout):
+                        self._record_timeout(method, url)
+                        msg = "API request timed out - {0} {1}"
+                        raise RelayrApiTimeoutException(msg.format(method.upper(), url))
+                    raise
+                self._record_retry(method, url)
+                time.sleep(delay)
+                attempt += 1
+                continue
+            except BaseException:
+                # neither success nor failure of the host, e.g. too many redirects
+                if breaker is not None:
+                    breaker.release()
+                raise
+
+            status = resp.status_code
+            if breaker is not None:
+                if status >= 500:
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+            retry_after = parse_retry_after(resp.headers.get('Retry-After'))
+            delay = self._retry_delay(method, attempt, status, deadline, retry_after)
+            if delay is None:
+                return resp
+            resp.close()
+            self._record_retry(method, url)
+            time.sleep(delay)
+            attempt += 1
+
+    def _hedged_request(self, method, url, body, headers, timeout):
+        """
+        Send a request, plus a duplicate if it is slow, and return the first response.
+
+        The hedge policy of this object decides if and when to send the
+        duplicate. The response of the slower request is discarded.
+        """
+        from concurrent.futures import TimeoutError, wait, FIRST_COMPLETED
+        template = endpoint_template(url)
+        delay = self.hedge.delay(method, template, self.metrics)
+        if delay is None:
+            return self.session.request(method.upper(), url,
+                data=body, headers=headers, timeout=timeout)
+
+        executor = self._get_hedge_executor()
+        args = (method.upper(), url)
+        kwargs = dict(data=body, headers=headers, timeout=timeout)
+        first = executor.submit(self.session.request, *args, **kwargs)
+        try:
+            return first.result(timeout=delay)
+        except TimeoutError:
+            pass
+        if not self.hedge.allow(template):
+            return first.result()
+
+        second = executor.submit(self.session.request, *args, **kwargs)
+        pending = set([first, second])
+        while True:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            winners = [f for f in done if f.exception() is None]
+            if winners or not pending:
+                winner = (winners or list(done))[0]
+                for loser in (done | pending) - set([winner]):
+                    if not loser.cancel():
+                        loser.add_done_callback(_discard_response)
+                if winner is second:
+                    self.hedge.record_win(template)
+                return winner.result()
+
+    def _get_hedge_executor(self):
+        "Return the threads sending hedged requests, create them first if needed."
+        with self._hedge_lock:
+            if self._hedge_executor is None:
+                from concurrent.futures import ThreadPoolExecutor
+                self._hedge_executor = ThreadPoolExecutor(max_workers=2 * self.pool_size)
+            return self._hedge_executor
+
+    def _record_retry(self, method, url):
+        "Count a retried attempt in the metrics of this object, if any."
+        if self.metrics is not None:
+            self.metrics.record_retry(method, endpoint_template(url))
+
+    def _record_timeout(self, method, url):
+        "Count a timed out call in the metrics of this object, if any."
+        if self.metrics is not None:
+            self.metrics.record_timeout(method, endpoint_template(url))
+
+    def _retry_delay(self, method, attempt, status, deadline, retry_after=None):
+        """
+        Return the delay in seconds before retrying a failed attempt.
+
+        ``None`` is returned if the request shouldn't be retried, also if
+        the retry would start after the deadline.
+        """
+        if self.retry is None or not self.retry.is_retryable(method, attempt, status):
+            return None
+        delay = self.retry.backoff(attempt, retry_after)
+        if deadline is not None and monotonic() + delay >= deadline:
+            return None
+        return delay
+
+    def _encode_body(self, method, data):
+        "Return the request body for given HTTP method and data as bytes."
+        if data is not None:
+            return self.codec.dumps(data)
+        return b'' if method.lower() == 'get' else b'null'
 
-        func = getattr(requests, method.lower())
-        resp = func(url, data=json_data or '', headers=headers or {})
-        resp.connection.close()
+    def _request_headers(self, headers):
+        "Return the HTTP headers to be sent with a request."
+        headers = headers or {}
+        if not self.keep_alive:
+            headers = dict(headers, Connection='close')
+        return headers
 
-        if config.LOG:
-            hd = dict(resp.headers.items())
-            self.logger.info("API response headers: " + json.dumps(hd))
-            self.logger.info("API response content: " + resp.content)
+    def _handle_response(self, method, url, data, headers, status, content):
+        """
+        Return a ``(status, data)`` tuple for a response or raise an exception.
 
-        status = resp.status_code
+        For status codes other than 2XX a ``RelayrApiException`` is raised.
+        """
         if 200 <= status < 300:
             try:
-                js = resp.json()
+                js = self.codec.loads(content)
             except:
                 js = None
-                # raise ValueError('Invalid JSON code(?): %r' % resp.content)
+                # raise ValueError('Invalid JSON code(?): %r' % content)
                 if config.DEBUG:
-                    warnings.warn("Replaced suspicious API response (invalid JSON?) %r with 'null'!" % resp.content)
+                    warnings.warn("Replaced suspicious API response (invalid JSON?) %r with 'null'!" % content)
             return status, js
         else:
-            args = (resp.json()['message'], method.upper(), url)
+            try:
+                message = self.codec.loads(content)['message']
+            except (ValueError, KeyError, TypeError):
+                message = 'HTTP status {0}'.format(status)
+            args = (message, method.upper(), url)
             msg = "{0} - {1} {2}".format(*args)
             command = build_curl_call(method, url, data, headers)
             msg = "%s - %s" % (msg, command)
-            raise RelayrApiException(msg)
+            exc = RelayrApiException(msg)
+            exc.status = status
+            raise exc
 
 
     # ..............................................................................
@@ -207,7 +940,8 @@ class Api(object):
         """
         # https://api.relayr.io/users/validate?email=<userEmail>
         url = '{0}/users/validate?email={1}'.format(self.host, userEmail)
-        _, data = self.perform_request('GET', url, headers=self.headers)
+        _, data = self.perform_request('GET', url, headers=self.headers,
+                                       endpoint='get_users_validate')
         return data
 
     def get_server_status(self):
@@ -222,7 +956,8 @@ class Api(object):
         """
         # https://api.relayr.io/server-status
         url = '{0}/server-status'.format(self.host)
-        _, data = self.perform_request('GET', url, headers=self.headers)
+        _, data = self.perform_request('GET', url, headers=self.headers,
+                                       endpoint='get_server_status')
         return data
 
     def post_oauth2_token(self, clientID, clientSecret, code, redirectURI):
@@ -249,7 +984,8 @@ class Api(object):
 
         # https://api.relayr.io/oauth2/token
         url = '{0}/oauth2/token'.format(self.host)
-        _, data = self.perform_request('POST', url, data=data, headers=self.headers)
+        _, data = self.perform_request('POST', url, data=data, headers=self.headers,
+                                       endpoint='post_oauth2_token')
         return data
 
     def get_oauth2_appdev_token(self, appID):
@@ -269,7 +1005,8 @@ class Api(object):
         """
         # https://api.relayr.io/oauth2/appdev-token/<appID>
         url = '{0}/oauth2/appdev-token/{1}'.format(self.host, appID)
-        _, data = self.perform_request('GET', url, headers=self.headers)
+        _, data = self.perform_request('GET', url, headers=self.headers,
+                                       endpoint='get_oauth2_appdev_token')
         return data
 
     def post_oauth2_appdev_token(self, appID):
@@ -282,7 +1019,8 @@ class Api(object):
         """
         # https://api.relayr.io/oauth2/appdev-token/<appID>
         url = '{0}/oauth2/appdev-token/{1}'.format(self.host, appID)
-        _, data = self.perform_request('POST', url, headers=self.headers)
+        _, data = self.perform_request('POST', url, headers=self.headers,
+                                       endpoint='post_oauth2_appdev_token')
         return data
 
     def delete_oauth2_appdev_token(self, appID):
@@ -294,7 +1032,8 @@ class Api(object):
         """
         # https://api.relayr.io/oauth2/appdev-token/<appID>
         url = '{0}/oauth2/appdev-token/{1}'.format(self.host, appID)
-        _, data = self.perform_request('DELETE', url, headers=self.headers)
+        _, data = self.perform_request('DELETE', url, headers=self.headers,
+                                       endpoint='delete_oauth2_appdev_token')
         return data
 
     def post_client_log(self, log_messages):
@@ -326,7 +1065,8 @@ class Api(object):
         """
         # https://api.relayr.io/client/log
         url = '{0}/client/log'.format(self.host)
-        _, data = self.perform_request('POST', url, data=log_messages, headers=self.headers)
+        _, data = self.perform_request('POST', url, data=log_messages, headers=self.headers,
+                                       endpoint='post_client_log')
         return data
 
     # ..............................................................................
@@ -349,7 +1089,8 @@ class Api(object):
         """
         # https://api.relayr.io/oauth2/user-info
         url = '{0}/oauth2/user-info'.format(self.host)
-        _, data = self.perform_request('GET', url, headers=self.headers)
+        _, data = self.perform_request('GET', url, headers=self.headers,
+                                       endpoint='get_oauth2_user_info')
         return data
 
     def patch_user(self, userID, name=None, email=None):
@@ -372,7 +1113,8 @@ class Api(object):
 
         # https://api.relayr.io/users/%s
         url = '{0}/users/{1}'.format(self.host, userID)
-        _, data = self.perform_request('PATCH', url, data=data, headers=self.headers)
+        _, data = self.perform_request('PATCH', url, data=data, headers=self.headers,
+                                       endpoint='patch_user')
         return data
 
     def post_user_app(self, userID, appID):
@@ -386,7 +1128,8 @@ class Api(object):
         """
         # https://api.relayr.io/users/%s/apps/%s
         url = '{0}/users/{1}/apps/{2}'.format(self.host, userID, appID)
-        _, data = self.perform_request('POST', url, headers=self.headers)
+        _, data = self.perform_request('POST', url, headers=self.headers,
+                                       endpoint='post_user_app')
         return data
 
     def delete_user_app(self, userID, appID):
@@ -400,7 +1143,8 @@ class Api(object):
         """
         # https://api.relayr.io/users/%s/apps/%s
         url = '{0}/users/{1}/apps/{2}'.format(self.host, userID, appID)
-        _, data = self.perform_request('DELETE', url, headers=self.headers)
+        _, data = self.perform_request('DELETE', url, headers=self.headers,
+                                       endpoint='delete_user_app')
         return data
 
     def get_user_publishers(self, userID):
@@ -413,7 +1157,8 @@ class Api(object):
         """
         # https://api.relayr.io/users/%s/publishers
         url = '{0}/users/{1}/publishers'.format(self.host, userID)
-        _, data = self.perform_request('GET', url, headers=self.headers)
+        _, data = self.perform_request('GET', url, headers=self.headers,
+                                       endpoint='get_user_publishers')
         return data
 
     def get_user_apps(self, userID):
@@ -426,7 +1171,8 @@ class Api(object):
         """
         # https://api.relayr.io/users/%s/apps
         url = '{0}/users/{1}/apps'.format(self.host, userID)
-        _, data = self.perform_request('GET', url, headers=self.headers)
+        _, data = self.perform_request('GET', url, headers=self.headers,
+                                       endpoint='get_user_apps')
         return data
 
     def get_user_transmitters(self, userID):
@@ -439,7 +1185,8 @@ class Api(object):
         """
         # https://api.relayr.io/users/%s/transmitters
         url = '{0}/users/{1}/transmitters'.format(self.host, userID)
-        _, data = self.perform_request('GET', url, headers=self.headers)
+        _, data = self.perform_request('GET', url, headers=self.headers,
+                                       endpoint='get_user_transmitters')
         return data
 
     def get_user_devices(self, userID):
@@ -452,7 +1199,8 @@ class Api(object):
         """
         # https://api.relayr.io/users/%s/devices
         url = '{0}/users/{1}/devices'.format(self.host, userID)
-        _, data = self.perform_request('GET', url, headers=self.headers)
+        _, data = self.perform_request('GET', url, headers=self.headers,
+                                       endpoint='get_user_devices')
         return data
 
     def get_user_devices_filtered(self, userID, meaning):
@@ -467,7 +1215,8 @@ class Api(object):
         """
         # https://api.relayr.io/users/%s/devices?meaning=%s
         url = '{0}/users/{1}/devices?meaning={2}'.format(self.host, userID, meaning)
-        _, data = self.perform_request('GET', url, headers=self.headers)
+        _, data = self.perform_request('GET', url, headers=self.headers,
+                                       endpoint='get_user_devices_filtered')
         return data
 
     def get_user_devices_bookmarks(self, userID):
@@ -490,7 +1239,8 @@ class Api(object):
         """
         # https://api.relayr.io/users/%s/devices/bookmarks
         url = '{0}/users/{1}/devices/bookmarks'.format(self.host, userID)
-        _, data = self.perform_request('GET', url, headers=self.headers)
+        _, data = self.perform_request('GET', url, headers=self.headers,
+                                       endpoint='get_user_devices_bookmarks')
         return data
 
     def post_user_devices_bookmark(self, userID, deviceID):
@@ -511,7 +1261,8 @@ class Api(object):
         """
         # https://api.relayr.io/users/%s/devices/bookmarks
         url = '{0}/users/{1}/devices/{2}/bookmarks'.format(self.host, userID, deviceID)
-        _, data = self.perform_request('POST', url, headers=self.headers)
+        _, data = self.perform_request('POST', url, headers=self.headers,
+                                       endpoint='post_user_devices_bookmark')
         return data
 
     def delete_user_devices_bookmark(self, userID, deviceID):
@@ -526,7 +1277,8 @@ class Api(object):
         """
         # https://api.relayr.io/users/%s/devices/%s/bookmarks
         url = '{0}/users/{1}/devices/{2}/bookmarks'.format(self.host, userID, deviceID)
-        _, data = self.perform_request('DELETE', url, headers=self.headers)
+        _, data = self.perform_request('DELETE', url, headers=self.headers,
+                                       endpoint='delete_user_devices_bookmark')
         return data
 
     def post_user_wunderbar(self, userID):
@@ -574,7 +1326,8 @@ class Api(object):
         """
         # https://api.relayr.io/users/%s/wunderbar
         url = '{0}/users/{1}/wunderbar'.format(self.host, userID)
-        _, data = self.perform_request('POST', url, headers=self.headers)
+        _, data = self.perform_request('POST', url, headers=self.headers,
+                                       endpoint='post_user_wunderbar')
         return data
 
     def delete_wunderbar(self, transmitterID):
@@ -588,7 +1341,8 @@ class Api(object):
         """
         # https://api.relayr.io/wunderbars/%s
         url = '{0}/wunderbars/{1}'.format(self.host, transmitterID)
-        _, data = self.perform_request('DELETE', url, headers=self.headers)
+        _, data = self.perform_request('DELETE', url, headers=self.headers,
+                                       endpoint='delete_wunderbar')
         return data
 
     def post_users_destroy(self, userID):
@@ -600,7 +1354,8 @@ class Api(object):
         """
         # https://api.relayr.io/users/%s/destroy-everything-i-love
         url = '{0}/users/{1}/destroy-everything-i-love'.format(self.host, userID)
-        _, data = self.perform_request('POST', url, headers=self.headers)
+        _, data = self.perform_request('POST', url, headers=self.headers,
+                                       endpoint='post_users_destroy')
         return data
 
     def get_user_device_models(self, userID):
@@ -614,7 +1369,8 @@ class Api(object):
         url = '{0}/users/{1}/device-models'.format(self.host, userID)
         hdrs = self.headers.copy()
         hdrs['Content-Type'] = 'application/hal+json' # only hal+json allowed
-        _, data = self.perform_request('GET', url, headers=hdrs)
+        _, data = self.perform_request('GET', url, headers=hdrs,
+                                       endpoint='get_user_device_models')
         return data
 
     def get_user_device_model(self, userID, modelID):
@@ -630,7 +1386,8 @@ class Api(object):
         url = '{0}/users/{1}/device-models/{2}'.format(self.host, userID, modelID)
         hdrs = self.headers.copy()
         hdrs['Content-Type'] = 'application/hal+json' # only hal+json allowed
-        _, data = self.perform_request('GET', url, headers=hdrs)
+        _, data = self.perform_request('GET', url, headers=hdrs,
+                                       endpoint='get_user_device_model')
         return data
 
     def get_user_device_model_component(self, userID, modelID, component):
@@ -645,7 +1402,8 @@ class Api(object):
         """
         # https://api.relayr.io/groups
         url = '{0}/users/{1}/groups'.format(self.host, userID)
-        _, data = self.perform_request('GET', url, headers=self.headers)
+        _, data = self.perform_request('GET', url, headers=self.headers,
+                                       endpoint='get_user_device_groups')
         return data
 
     def delete_user_device_groups(self, userID):
@@ -654,7 +1412,8 @@ class Api(object):
         """
         # https://api.relayr.io/groups
         url = '{0}/users/{1}/groups'.format(self.host, userID)
-        _, data = self.perform_request('DELETE', url, headers=self.headers)
+        _, data = self.perform_request('DELETE', url, headers=self.headers,
+                                       endpoint='delete_user_device_groups')
         return data
 
     def post_user_device_group(self, name):
@@ -664,7 +1423,8 @@ class Api(object):
         # https://api.relayr.io/groups
         url = '{0}/groups'.format(self.host)
         data = {"name": name}
-        _, data = self.perform_request('POST', url, data=data, headers=self.headers)
+        _, data = self.perform_request('POST', url, data=data, headers=self.headers,
+                                       endpoint='post_user_device_group')
         return data
 
     def get_user_device_group(self, groupID):
@@ -676,7 +1436,8 @@ class Api(object):
         """
         # https://api.relayr.io/groups
         url = '{0}/groups/{1}'.format(self.host, groupID)
-        _, data = self.perform_request('GET', url, headers=self.headers)
+        _, data = self.perform_request('GET', url, headers=self.headers,
+                                       endpoint='get_user_device_group')
         return data
 
     def delete_user_device_group(self, groupID):
@@ -688,7 +1449,8 @@ class Api(object):
         """
         # https://api.relayr.io/groups
         url = '{0}/groups/{1}'.format(self.host, groupID)
-        _, data = self.perform_request('DELETE', url, headers=self.headers)
+        _, data = self.perform_request('DELETE', url, headers=self.headers,
+                                       endpoint='delete_user_device_group')
         return data
 
     def patch_user_device_group(self, groupID, name=None, position=None):
@@ -709,7 +1471,8 @@ class Api(object):
             data.update(name=name)
         if not position is None:
             data.update(position=position)
-        _, data = self.perform_request('PATCH', url, data=data, headers=self.headers)
+        _, data = self.perform_request('PATCH', url, data=data, headers=self.headers,
+                                       endpoint='patch_user_device_group')
         return data
 
     def post_user_device_group_device(self, groupID, deviceIDs=None):
@@ -726,7 +1489,8 @@ class Api(object):
         data = {}
         if not deviceIDs is None:
             data.update(deviceIds=deviceIDs)
-        _, data = self.perform_request('POST', url, data=data, headers=self.headers)
+        _, data = self.perform_request('POST', url, data=data, headers=self.headers,
+                                       endpoint='post_user_device_group_device')
         return data
 
     def delete_user_device_group_device(self, groupID, deviceID):
@@ -735,7 +1499,8 @@ class Api(object):
         """
         # https://api.relayr.io/groups/<id>/devices/<id>
         url = '{0}/groups/{1}/devices/{2}'.format(self.host, groupID, deviceID)
-        _, data = self.perform_request('DELETE', url, headers=self.headers)
+        _, data = self.perform_request('DELETE', url, headers=self.headers,
+                                       endpoint='delete_user_device_group_device')
         return data
 
     def patch_user_device_group_device(self, groupID, deviceID, position):
@@ -745,7 +1510,8 @@ class Api(object):
         # https://api.relayr.io/groups/<id>/devices/<id>
         url = '{0}/groups/{1}/devices/{2}'.format(self.host, groupID, deviceID)
         data = {"position": position}
-        _, data = self.perform_request('PATCH', url, data=data, headers=self.headers)
+        _, data = self.perform_request('PATCH', url, data=data, headers=self.headers,
+                                       endpoint='patch_user_device_group_device')
         return data
 
     # ..............................................................................
@@ -760,7 +1526,8 @@ class Api(object):
         """
         # https://api.relayr.io/apps
         url = '{0}/apps'.format(self.host)
-        _, data = self.perform_request('GET', url, headers=self.headers)
+        _, data = self.perform_request('GET', url, headers=self.headers,
+                                       endpoint='get_public_apps')
         return data
 
     def post_app(self, appName, publisherID, redirectURI, appDescription):
@@ -777,7 +1544,8 @@ class Api(object):
         }
         # https://api.relayr.io/apps
         url = '{0}/apps'.format(self.host)
-        _, data = self.perform_request('POST', url, data=data, headers=self.headers)
+        _, data = self.perform_request('POST', url, data=data, headers=self.headers,
+                                       endpoint='post_app')
         return data
 
     def get_app_info(self, appID):
@@ -798,7 +1566,8 @@ class Api(object):
         """
         # https://api.relayr.io/apps/<appID>
         url = '{0}/apps/{1}'.format(self.host, appID)
-        _, data = self.perform_request('GET', url, headers=self.headers)
+        _, data = self.perform_request('GET', url, headers=self.headers,
+                                       endpoint='get_app_info')
         return data
 
     def get_app_info_extended(self, appID):
@@ -822,7 +1591,8 @@ class Api(object):
         """
         # https://api.relayr.io/apps/<appID>/extended
         url = '{0}/apps/{1}/extended'.format(self.host, appID)
-        _, data = self.perform_request('GET', url, headers=self.headers)
+        _, data = self.perform_request('GET', url, headers=self.headers,
+                                       endpoint='get_app_info_extended')
         return data
 
 
@@ -861,7 +1631,8 @@ class Api(object):
 
         # https://api.relayr.io/apps/<appID>
         url = '{0}/apps/{1}'.format(self.host, appID)
-        _, data = self.perform_request('PATCH', url, data=data, headers=self.headers)
+        _, data = self.perform_request('PATCH', url, data=data, headers=self.headers,
+                                       endpoint='patch_app')
         return data
 
     def delete_app(self, appID):
@@ -873,7 +1644,8 @@ class Api(object):
         """
         # https://api.relayr.io/apps/<appID>
         url = '{0}/apps/{1}'.format(self.host, appID)
-        _, data = self.perform_request('DELETE', url, headers=self.headers)
+        _, data = self.perform_request('DELETE', url, headers=self.headers,
+                                       endpoint='delete_app')
         return data
 
     def get_oauth2_app_info(self):
@@ -890,7 +1662,8 @@ class Api(object):
         """
         # https://api.relayr.io/oauth2/app-info
         url = '{0}/oauth2/app-info'.format(self.host)
-        _, data = self.perform_request('GET', url, headers=self.headers)
+        _, data = self.perform_request('GET', url, headers=self.headers,
+                                       endpoint='get_oauth2_app_info')
         return data
 
 
@@ -906,7 +1679,8 @@ class Api(object):
         """
         # https://api.relayr.io/publishers
         url = '{0}/publishers'.format(self.host)
-        _, data = self.perform_request('GET', url, headers=self.headers)
+        _, data = self.perform_request('GET', url, headers=self.headers,
+                                       endpoint='get_public_publishers')
         return data
 
     def post_publisher(self, userID, name):
@@ -922,7 +1696,8 @@ class Api(object):
         # https://api.relayr.io/publishers
         data = {'owner': userID, 'name': name}
         url = '{0}/publishers'.format(self.host)
-        _, data = self.perform_request('POST', url, data=data, headers=self.headers)
+        _, data = self.perform_request('POST', url, data=data, headers=self.headers,
+                                       endpoint='post_publisher')
         return data
 
     def delete_publisher(self, publisherID):
@@ -935,7 +1710,8 @@ class Api(object):
         """
         # https://api.relayr.io/publishers
         url = '{0}/publishers/{1}'.format(self.host, publisherID)
-        _, data = self.perform_request('DELETE', url, headers=self.headers)
+        _, data = self.perform_request('DELETE', url, headers=self.headers,
+                                       endpoint='delete_publisher')
         return data
 
     def get_publisher_apps(self, publisherID):
@@ -948,7 +1724,8 @@ class Api(object):
         """
         # https://api.relayr.io/publishers/<id>/apps
         url = '{0}/publishers/{1}/apps'.format(self.host, publisherID)
-        _, data = self.perform_request('GET', url, headers=self.headers)
+        _, data = self.perform_request('GET', url, headers=self.headers,
+                                       endpoint='get_publisher_apps')
         return data
 
     def get_publisher_apps_extended(self, publisherID):
@@ -961,7 +1738,8 @@ class Api(object):
         """
         # https://api.relayr.io/publishers/<id>/apps/extended
         url = '{0}/publishers/{1}/apps/extended'.format(self.host, publisherID)
-        _, data = self.perform_request('GET', url, headers=self.headers)
+        _, data = self.perform_request('GET', url, headers=self.headers,
+                                       endpoint='get_publisher_apps_extended')
         return data
 
 
@@ -981,7 +1759,8 @@ class Api(object):
 
         # https://api.relayr.io/publishers/<id>
         url = '{0}/publishers/{1}'.format(self.host, publisherID)
-        _, data = self.perform_request('PATCH', url, data=data, headers=self.headers)
+        _, data = self.perform_request('PATCH', url, data=data, headers=self.headers,
+                                       endpoint='patch_publisher')
         return data
 
     # ..............................................................................
@@ -1022,7 +1801,8 @@ class Api(object):
         """
         # https://api.relayr.io/devices/<deviceID>/firmware
         url = '{0}/devices/{1}/firmware'.format(self.host, deviceID)
-        _, data = self.perform_request('GET', url, headers=self.headers)
+        _, data = self.perform_request('GET', url, headers=self.headers,
+                                       endpoint='get_device_configuration')
         return data
 
     def post_device_configuration(self, deviceID, frequency):
@@ -1037,7 +1817,8 @@ class Api(object):
         data = {'frequency': frequency}
         # https://api.relayr.io/devices/<deviceID>/configuration
         url = '{0}/devices/{1}/configuration'.format(self.host, deviceID)
-        _, data = self.perform_request('POST', url, data=data, headers=self.headers)
+        _, data = self.perform_request('POST', url, data=data, headers=self.headers,
+                                       endpoint='post_device_configuration')
         return data
 
     def get_public_devices(self, meaning=''):
@@ -1052,7 +1833,7 @@ class Api(object):
         url = '{0}/devices/public'.format(self.host)
         if meaning:
             url += '?meaning={0}'.format(meaning)
-        _, data = self.perform_request('GET', url)
+        _, data = self.perform_request('GET', url, endpoint='get_public_devices')
         return data
 
     def post_device(self, name, ownerID, modelID, firmwareVersion):
@@ -1077,7 +1858,8 @@ class Api(object):
         }
         # https://api.relayr.io/devices
         url = '{0}/devices'.format(self.host)
-        _, data = self.perform_request('POST', url, data=data, headers=self.headers)
+        _, data = self.perform_request('POST', url, data=data, headers=self.headers,
+                                       endpoint='post_device')
         return data
 
 
@@ -1106,7 +1888,8 @@ class Api(object):
         }
         # https://api.relayr.io/devices
         url = '{0}/devices'.format(self.host)
-        _, data = self.perform_request('POST', url, data=data, headers=self.headers)
+        _, data = self.perform_request('POST', url, data=data, headers=self.headers,
+                                       endpoint='post_device_wb2')
         return data
 
 
@@ -1123,7 +1906,8 @@ class Api(object):
         """
         # https://api.relayr.io/devices/%s
         url = '{0}/devices/{1}'.format(self.host, deviceID)
-        _, data = self.perform_request('GET', url, headers=self.headers)
+        _, data = self.perform_request('GET', url, headers=self.headers,
+                                       endpoint='get_device')
         return data
 
     def patch_device(self, deviceID, name=None, description=None, modelID=None, public=None):
@@ -1159,7 +1943,8 @@ class Api(object):
         data = data1
         # https://api.relayr.io/devices/%s
         url = '{0}/devices/{1}'.format(self.host, deviceID)
-        _, data = self.perform_request('PATCH', url, data=data, headers=self.headers)
+        _, data = self.perform_request('PATCH', url, data=data, headers=self.headers,
+                                       endpoint='patch_device')
         return data
 
     def delete_device(self, deviceID):
@@ -1172,7 +1957,8 @@ class Api(object):
         """
         # https://api.relayr.io/devices/%s
         url = '{0}/devices/{1}'.format(self.host, deviceID)
-        _, data = self.perform_request('DELETE', url, headers=self.headers)
+        _, data = self.perform_request('DELETE', url, headers=self.headers,
+                                       endpoint='delete_device')
         return data
 
     def get_device_apps(self, deviceID):
@@ -1185,7 +1971,8 @@ class Api(object):
         """
         # https://api.relayr.io/devices/<deviceID>/apps
         url = '{0}/devices/{1}/apps'.format(self.host, deviceID)
-        _, data = self.perform_request('GET', url, headers=self.headers)
+        _, data = self.perform_request('GET', url, headers=self.headers,
+                                       endpoint='get_device_apps')
         return data
 
     def post_channel(self, deviceID, transport):
@@ -1214,7 +2001,8 @@ class Api(object):
         url = '{0}/channels'.format(self.host)
         data = {'deviceId': deviceID, 'transport': transport}
         _, res = self.perform_request('POST', url,
-                                      data=data, headers=self.headers)
+                                      data=data, headers=self.headers,
+                                      endpoint='post_channel')
         return res
 
     def delete_channel_id(self, channelID):
@@ -1228,7 +2016,8 @@ class Api(object):
         Raises ``exceptions.RelayrApiException`` for non-existing channelID.
         """
         url = '{0}/channels/{1}'.format(self.host, channelID)
-        _, res = self.perform_request('DELETE', url, headers=self.headers)
+        _, res = self.perform_request('DELETE', url, headers=self.headers,
+                                      endpoint='delete_channel_id')
         return res
 
     def delete_channels_device_transport(self, deviceID=None, transport=None):
@@ -1248,7 +2037,8 @@ class Api(object):
         if transport is not None:
             data['transport'] = transport
         _, res = self.perform_request('DELETE', url,
-                                      data=data, headers=self.headers)
+                                      data=data, headers=self.headers,
+                                      endpoint='delete_channels_device_transport')
         return res
 
     def get_device_channels(self, deviceID):
@@ -1278,7 +2068,8 @@ class Api(object):
             }
         """
         url = '{0}/devices/{1}/channels'.format(self.host, deviceID)
-        _, res = self.perform_request('GET', url, headers=self.headers)
+        _, res = self.perform_request('GET', url, headers=self.headers,
+                                      endpoint='get_device_channels')
         return res
 
     def post_device_command_led(self, deviceID, data):
@@ -1293,7 +2084,8 @@ class Api(object):
         """
         # https://api.relayr.io/devices/<deviceID>/cmd/led
         url = '{0}/devices/{1}/cmd/led'.format(self.host, deviceID)
-        _, data = self.perform_request('POST', url, data=data, headers=self.headers)
+        _, data = self.perform_request('POST', url, data=data, headers=self.headers,
+                                       endpoint='post_device_command_led')
         return data
 
     def post_device_command(self, deviceID, command):
@@ -1308,7 +2100,8 @@ class Api(object):
         """
         # https://api.relayr.io/devices/<deviceID>/cmd
         url = '{0}/devices/{1}/cmd'.format(self.host, deviceID)
-        _, data = self.perform_request('POST', url, data=command, headers=self.headers)
+        _, data = self.perform_request('POST', url, data=command, headers=self.headers,
+                                       endpoint='post_device_command')
         return data
 
     def post_device_data(self, deviceID, data):
@@ -1323,7 +2116,8 @@ class Api(object):
         """
         # https://api.relayr.io/devices/<device_id>/data
         url = '{0}/devices/{1}/data'.format(self.host, deviceID)
-        _, data = self.perform_request('POST', url, data=data, headers=self.headers)
+        _, data = self.perform_request('POST', url, data=data, headers=self.headers,
+                                       endpoint='post_device_data')
         return data
 
     def post_device_app(self, deviceID, appID):
@@ -1340,7 +2134,8 @@ class Api(object):
         """
         # {{relayrAPI}}/devices/{{deviceID}}/apps/{{appID}}
         url = '{0}/devices/{1}/apps/{2}'.format(self.host, deviceID, appID)
-        _, data = self.perform_request('POST', url, headers=self.headers)
+        _, data = self.perform_request('POST', url, headers=self.headers,
+                                       endpoint='post_device_app')
         return data
 
     def delete_device_app(self, deviceID, appID):
@@ -1354,7 +2149,8 @@ class Api(object):
         """
         # {{relayrAPI}}/devices/{{deviceID}}/apps/{{appID}}
         url = '{0}/devices/{1}/apps/{2}'.format(self.host, deviceID, appID)
-        _, data = self.perform_request('DELETE', url, headers=self.headers)
+        _, data = self.perform_request('DELETE', url, headers=self.headers,
+                                       endpoint='delete_device_app')
         return data
 
     # "History API"
@@ -1370,6 +2166,8 @@ class Api(object):
         :type start: long
         :param end: unit datetime in ms
         :type end: long
+        :param sample: sampling parameter
+        :type sample: string
         :param meaning: meaning filter
         :type meaning: string
         :param path: path filter
@@ -1380,17 +2178,128 @@ class Api(object):
         :type limit: integer
         :rtype: history response with pagination info
         """
-        # https://data.relayr.io/history/devices/<deviceID>?start=<..>
-        base_url = '{0}/history/devices/{1}'.format(self.history_host, deviceID)
+        url = self._history_devices_url(deviceID, start=start, end=end,
+            sample=sample, meaning=meaning, path=path, offset=offset, limit=limit)
+        _, data = self.perform_request('GET', url, headers=self.headers,
+                                       endpoint='get_history_devices')
+        return data
+
+    def iter_history_devices(self, deviceID, start=None, end=None, sample=None,
+                             meaning=None, path=None, offset=None, limit=None,
+                             chunk_size=None, field='data'):
+        """
+        Yield past data for a specific device while it is being received.
 
-        params = {'start': start}
-        for p in 'end meaning path offset limit'.split():
-            params[p] = locals()[p]
-        params = {k:v for (k, v) in params.items() if v is not None}
+        This is a streaming variant of :py:meth:`get_history_devices`:
+        the response is parsed incrementally and the items of its ``data``
+        array are yielded one at a time (or in lists of ``chunk_size``
+        items) as they arrive, so memory use doesn't grow with ``limit``.
+        The other fields of the response (pagination info) are skipped.
+        The request is sent when the first item is requested.
 
-        url = base_url + '?%s' % urllib.urlencode(params)
-        _, data = self.perform_request('GET', url, headers=self.headers)
-        return data
+        :param deviceID: the device UUID
+        :type deviceID: string
+        :param chunk_size: yield lists of up to this many items instead of
+            single items
+        :type chunk_size: integer
+        :param field: the name of the array field in the response
+        :type field: string
+        :rtype: generator
+
+        See :py:meth:`get_history_devices` for the other parameters.
+
+        Example:
+
+        .. code-block:: python
+
+            for reading in api.iter_history_devices(deviceID, start=start, limit=10000):
+                print(reading)
+        """
+        url = self._history_devices_url(deviceID, start=start, end=end,
+            sample=sample, meaning=meaning, path=path, offset=offset, limit=limit)
+        template = endpoint_template(url)
+        headers = self._request_headers(self.headers)
+        deadline = self._get_deadline()
+        if self.logger is not None:
+            self._log_request('GET', url, None, headers)
+        info = self._start_call('GET', url, template, b'', 'iter_history_devices')
+        start = monotonic()
+        resp, status, error, received = None, None, None, [0]
+        try:
+            resp = self._send('GET', url, b'', headers, deadline=deadline, stream=True)
+            status = resp.status_code
+            if self.logger is not None:
+                self._log_response(status, resp.headers)
+            if not 200 <= status < 300:
+                received[0] = len(resp.content)
+                self._handle_response('GET', url, None, headers, status, resp.content)
+            chunks = self._iter_content(resp, url, deadline, received)
+            items = iter_array_items(chunks, field)
+            if chunk_size:
+                items = iter_chunked(items, chunk_size)
+            while True:
+                try:
+                    item = next(items)
+                except StopIteration:
+                    break
+                except ValueError as e:
+                    # a malformed body or one cut short by the server
+                    msg = "API response malformed or truncated - GET {0}: {1}"
+                    raise RelayrApiException(msg.format(url, e))
+                yield item
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            # also reached when the caller stops iterating early
+            if resp is not None:
+                resp.close()
+            if self.metrics is not None:
+                self.metrics.observe('GET', template, monotonic() - start,
+                    status, 0, received[0])
+            if info is not None:
+                self._finish_call(info, status, error=error,
+                    size=None if resp is None else received[0])
+
+    def _iter_content(self, resp, url, deadline, received):
+        """
+        Yield the body of a streamed response in chunks.
+
+        A ``RelayrApiTimeoutException`` is raised when the deadline passes
+        between two chunks or reading a chunk times out, a
+        ``RelayrApiException`` when the connection breaks. The size of every
+        chunk is added to ``received[0]``.
+        """
+        import requests
+        from requests.packages.urllib3.exceptions import ReadTimeoutError
+        chunks = resp.iter_content(chunk_size=2**16)
+        while True:
+            if deadline is not None and monotonic() >= deadline:
+                self._record_timeout('GET', url)
+                msg = "API response deadline exceeded - GET {0}"
+                raise RelayrApiTimeoutException(msg.format(url))
+            try:
+                chunk = next(chunks)
+            except StopIteration:
+                return
+            except requests.exceptions.RequestException as e:
+                # requests wraps read timeouts while streaming in a ConnectionError
+                if isinstance(e, requests.exceptions.Timeout) or \
+                        (e.args and isinstance(e.args[0], ReadTimeoutError)):
+                    self._record_timeout('GET', url)
+                    msg = "API response timed out - GET {0}"
+                    raise RelayrApiTimeoutException(msg.format(url))
+                msg = "API response interrupted - GET {0}: {1}"
+                raise RelayrApiException(msg.format(url, e))
+            received[0] += len(chunk)
+            yield chunk
+
+    def _history_devices_url(self, deviceID, **params):
+        "Return the URL for past data of a device with non-``None`` query parameters."
+        # https://data.relayr.io/history/devices/<deviceID>?start=<..>
+        base_url = '{0}/history/devices/{1}'.format(self.history_host, deviceID)
+        params = dict((k, v) for (k, v) in params.items() if v is not None)
+        return base_url + '?%s' % urlencode(sorted(params.items()))
 
 
     # ..............................................................................
@@ -1407,7 +2316,8 @@ class Api(object):
         """
         # https://api.relayr.io/device-models
         url = '{0}/device-models'.format(self.host)
-        _, data = self.perform_request('GET', url, headers=headers)
+        _, data = self.perform_request('GET', url, headers=headers,
+                                       endpoint='get_public_device_models')
         return data
 
     def get_device_model(self, devicemodelID):
@@ -1420,7 +2330,8 @@ class Api(object):
         """
         # https://api.relayr.io/device-models/<id>
         url = '{0}/device-models/{1}'.format(self.host, devicemodelID)
-        _, data = self.perform_request('GET', url, headers=self.headers)
+        _, data = self.perform_request('GET', url, headers=self.headers,
+                                       endpoint='get_device_model')
         return data
 
     def get_public_device_model_meanings(self):
@@ -1431,7 +2342,8 @@ class Api(object):
         """
         # https://api.relayr.io/device-models/meanings
         url = '{0}/device-models/meanings'.format(self.host)
-        _, data = self.perform_request('GET', url)
+        _, data = self.perform_request('GET', url,
+                                       endpoint='get_public_device_model_meanings')
         return data
 
     # ..............................................................................
@@ -1448,7 +2360,8 @@ class Api(object):
         """
         # https://api.relayr.io/transmitters/<id>
         url = '{0}/transmitters/{1}'.format(self.host, transmitterID)
-        _, data = self.perform_request('GET', url, headers=self.headers)
+        _, data = self.perform_request('GET', url, headers=self.headers,
+                                       endpoint='get_transmitter')
         return data
 
     def post_transmitter(self, ownerID=None, name=None, integrationType=None):
@@ -1473,7 +2386,8 @@ class Api(object):
 
         # https://api.relayr.io/transmitters/<id>
         url = '{0}/transmitters/'.format(self.host)
-        _, data = self.perform_request('POST', url, data=data, headers=self.headers)
+        _, data = self.perform_request('POST', url, data=data, headers=self.headers,
+                                       endpoint='post_transmitter')
         return data
 
     def patch_transmitter(self, transmitterID, name=None):
@@ -1492,7 +2406,8 @@ class Api(object):
 
         # https://api.relayr.io/transmitters/<id>
         url = '{0}/transmitters/{1}'.format(self.host, transmitterID)
-        _, data = self.perform_request('PATCH', url, data=data, headers=self.headers)
+        _, data = self.perform_request('PATCH', url, data=data, headers=self.headers,
+                                       endpoint='patch_transmitter')
         return data
 
     def delete_transmitter(self, transmitterID):
@@ -1505,7 +2420,8 @@ class Api(object):
         """
         # https://api.relayr.io/transmitters/<id>
         url = '{0}/transmitters/{1}'.format(self.host, transmitterID)
-        _, data = self.perform_request('DELETE', url, headers=self.headers)
+        _, data = self.perform_request('DELETE', url, headers=self.headers,
+                                       endpoint='delete_transmitter')
         return data
 
     def post_transmitter_device(self, transmitterID, deviceID):
@@ -1520,7 +2436,8 @@ class Api(object):
         """
         # https://api.relayr.io/transmitters/<transmitterID>/devices/<deviceID>
         url = '{0}/transmitters/{1}/devices/{2}'.format(self.host, transmitterID, deviceID)
-        _, data = self.perform_request('POST', url, headers=self.headers)
+        _, data = self.perform_request('POST', url, headers=self.headers,
+                                       endpoint='post_transmitter_device')
         return data
 
     def get_transmitter_devices(self, transmitterID):
@@ -1533,7 +2450,8 @@ class Api(object):
         """
         # https://api.relayr.io/transmitters/<transmitterID>/devices
         url = '{0}/transmitters/{1}/devices'.format(self.host, transmitterID)
-        _, data = self.perform_request('GET', url, headers=self.headers)
+        _, data = self.perform_request('GET', url, headers=self.headers,
+                                       endpoint='get_transmitter_devices')
         return data
 
     def delete_transmitter_device(self, transmitterID, deviceID):
@@ -1548,5 +2466,6 @@ class Api(object):
         """
         # https://api.relayr.io/transmitters/<transmitterID>/devices/<deviceID>
         url = '{0}/transmitters/{1}/devices/{2}'.format(self.host, transmitterID, deviceID)
-        _, data = self.perform_request('DELETE', url, headers=self.headers)
+        _, data = self.perform_request('DELETE', url, headers=self.headers,
+                                       endpoint='delete_transmitter_device')
         return data
@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+
+"""
+Caching of API responses.
+
+This module contains a cache layer for responses of read-mostly API
+endpoints like device models, which hardly ever change. It consists of a
+:py:class:`ResponseCache` deciding what is cached and for how long, plus
+two storage backends, :py:class:`MemoryCache` and :py:class:`FileCache`.
+Any object with the same ``get``, ``set``, ``delete`` and ``clear``
+methods can be used as a backend, too.
+
+Example:
+
+.. code-block:: python
+
+    from relayr.api import Api
+    from relayr.cache import MemoryCache
+
+    a = Api(token='...', cache=MemoryCache(maxsize=1000),
+            cache_ttls={'/devices/{id}': 10})
+"""
+
+import os
+import copy
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+from relayr import config
+from relayr import forksafe
+
+
+# Default time-to-live in seconds of cached responses per endpoint template,
+# see relayr.api.endpoint_template().
+DEFAULT_TTLS = {
+    '/device-models': 3600,
+    '/device-models/meanings': 3600,
+    '/device-models/{id}': 3600,
+    '/apps/{id}': 300,
+    '/transmitters/{id}': 300,
+}
+
+
+class MemoryCache(object):
+    """
+    A thread-safe in-memory cache evicting least recently used entries.
+
+    Entries are copied when stored and when returned, so callers changing
+    a cached response don't change it for others.
+    """
+
+    def __init__(self, maxsize=1024):
+        """
+        :param maxsize: the maximum number of entries
+        :type maxsize: integer
+        """
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        forksafe.register(self)
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        "Return the entry for a key or ``None``."
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._entries[key] = entry
+        return copy.deepcopy(entry)
+
+    def set(self, key, entry):
+        "Store an entry for a key."
+        entry = copy.deepcopy(entry)
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = entry
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        "Remove the entry for a key, if any."
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        "Remove all entries."
+        with self._lock:
+            self._entries.clear()
+
+
+class FileCache(object):
+    """
+    A cache storing entries as JSON files in a directory.
+
+    Entries survive the process, so they can be shared by many short-lived
+    processes on the same machine. The least recently used files are
+    removed when there are more than ``maxsize`` entries.
+    """
+
+    def __init__(self, directory=None, maxsize=4096):
+        """
+        :param directory: the cache directory (default: the folder ``cache``
+            inside ``config.RELAYR_FOLDER``)
+        :type directory: string
+        :param maxsize: the maximum number of entries
+        :type maxsize: integer
+        """
+        self.directory = directory or os.path.join(config.RELAYR_FOLDER, 'cache')
+        self.maxsize = maxsize
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        self._count = len(self._files())
+        self._lock = threading.Lock()
+        forksafe.register(self)
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._files())
+
+    def _files(self):
+        return [os.path.join(self.directory, name)
+            for name in os.listdir(self.directory) if name.endswith('.json')]
+
+    def _path(self, key):
+        name = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, name + '.json')
+
+    def get(self, key):
+        "Return the entry for a key or ``None``."
+        path = self._path(key)
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+            # mark as recently used
+            os.utime(path, None)
+        except (IOError, OSError, ValueError):
+            return None
+        return entry
+
+    def set(self, key, entry):
+        "Store an entry for a key."
+        path = self._path(key)
+        tmp_path = '{0}.{1}.{2}.tmp'.format(path, os.getpid(), threading.current_thread().ident)
+        with open(tmp_path, 'w') as f:
+            json.dump(entry, f)
+        existed = os.path.exists(path)
+        getattr(os, 'replace', os.rename)(tmp_path, path)
+        if not existed:
+            with self._lock:
+                self._count += 1
+                if self._count > self.maxsize:
+                    self._evict()
+
+    def _evict(self):
+        "Remove the least recently used files exceeding the maximum size."
+        files = []
+        for path in self._files():
+            try:
+                files.append((os.path.getmtime(path), path))
+            except OSError:
+                pass
+        files.sort()
+        for mtime, path in files[:max(0, len(files) - self.maxsize)]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self._count = min(len(files), self.maxsize)
+
+    def delete(self, key):
+        "Remove the entry for a key, if any."
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def clear(self):
+        "Remove all entries."
+        for path in self._files():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        with self._lock:
+            self._count = 0
+
+
+class ResponseCache(object):
+    """
+    A policy for caching responses of ``GET`` requests in a backend.
+
+    Responses are cached only for endpoints with a time-to-live (TTL).
+    Stale responses the server sent an ``ETag`` or ``Last-Modified``
+    header for are revalidated with a conditional request, which costs
+    no response body if they have not changed. Successful requests with
+    other methods remove the cached response for the same URL.
+
+    Cache keys include the ``Authorization`` header, so different users
+    never see each other's responses.
+    """
+
+    def __init__(self, backend, ttls=None):
+        """
+        :param backend: the storage for cached responses
+        :type backend: :py:class:`MemoryCache`, :py:class:`FileCache` or similar
+        :param ttls: TTLs in seconds per endpoint template, merged with
+            ``DEFAULT_TTLS`` (use 0 to disable caching for an endpoint)
+        :type ttls: dict
+        """
+        self.backend = backend
+        self.ttls = dict(DEFAULT_TTLS)
+        self.ttls.update(ttls or {})
+
+    def key(self, url, headers):
+        "Return the cache key for a URL and the request headers."
+        return '{0} {1}'.format(url, (headers or {}).get('Authorization', ''))
+
+    def ttl(self, method, template):
+        "Return the TTL for an endpoint, 0 if it is not cached."
+        if method.upper() != 'GET':
+            return 0
+        return self.ttls.get(template, 0)
+
+    def lookup(self, key):
+        """
+        Return a ``(entry, fresh)`` tuple for a key.
+
+        ``entry`` is ``None`` if nothing usable is cached, ``fresh`` tells
+        if the entry can be used without asking the server.
+        """
+        entry = self.backend.get(key)
+        if entry is None:
+            return None, False
+        if entry['expires'] > time.time():
+            return entry, True
+        if entry.get('etag') or entry.get('last_modified'):
+            return entry, False
+        self.backend.delete(key)
+        return None, False
+
+    def conditional_headers(self, entry, headers):
+        "Return request headers for revalidating a stale entry."
+        headers = dict(headers or {})
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def store(self, key, ttl, status, data, response_headers):
+        "Store a response."
+        entry = {
+            'status': status,
+            'data': data,
+            'expires': time.time() + ttl,
+            'etag': response_headers.get('ETag'),
+            'last_modified': response_headers.get('Last-Modified'),
+        }
+        self.backend.set(key, entry)
+
+    def refresh(self, key, ttl, entry):
+        "Extend the lifetime of an entry confirmed by the server."
+        entry = dict(entry, expires=time.time() + ttl)
+        self.backend.set(key, entry)
+        return entry
+
+    def invalidate(self, key):
+        "Remove a cached response."
+        self.backend.delete(key)
+
+    def clear(self):
+        "Remove all cached responses."
+        self.backend.clear()
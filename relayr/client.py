@@ -9,7 +9,7 @@ from relayr.api import Api
 from relayr.version import __version__
 from relayr.exceptions import RelayrApiException
 from relayr.resources import User, App, Device, DeviceModel, Transmitter, Publisher,\
-    Group
+    Group, DeviceModelRegistry, IdentityMap, _expand
 
 
 class Client(object):
@@ -27,14 +27,43 @@ class Client(object):
         d = next(devs)
         apps = usr.get_apps()
     """
-    def __init__(self, token=None):
+    def __init__(self, token=None, identity_map=None, **kwargs):
         """
         :arg token: A token generated on the relayr site for the combination of
             a user and an application.
         :type token: A string.
+        :arg identity_map: ``True`` or an
+            :py:class:`relayr.resources.IdentityMap` for returning the same
+            object for the same resource everywhere (default: ``None``).
+        :type identity_map: A boolean or :py:class:`relayr.resources.IdentityMap`.
+
+        Additional keyword arguments like ``session``, ``pool_size`` or
+        ``check_status`` are passed on to the underlying
+        :py:class:`relayr.api.Api` object.
+
+        The device models of all devices created by the client are kept in
+        ``device_models``, a :py:class:`relayr.resources.DeviceModelRegistry`.
+        """
+
+        self.api = Api(token=token, **kwargs)
+        self.device_models = DeviceModelRegistry(self)
+        if identity_map is True:
+            identity_map = IdentityMap()
+        elif identity_map is False:
+            identity_map = None
+        self.identity_map = identity_map
+
+    def warm(self, connections=None):
         """
+        Opens pooled connections to the relayr hosts ahead of time.
 
-        self.api = Api(token=token)
+        See :py:meth:`relayr.api.Api.warm`.
+
+        :arg connections: the number of connections per host
+        :type connections: integer
+        :rtype: A dict mapping the hosts to the numbers of connections opened.
+        """
+        return self.api.warm(connections)
 
     def get_public_apps(self):
         """
@@ -55,9 +84,7 @@ class Client(object):
         """
 
         for app in self.api.get_public_apps():
-            a = App(app['id'], client=self)
-            a.get_info()
-            yield a
+            yield App._create(self, **app)
 
     def get_public_publishers(self):
         """
@@ -71,13 +98,9 @@ class Client(object):
         """
 
         for pub in self.api.get_public_publishers():
-            p = Publisher(pub['id'], client=self)
-            for k in pub:
-                setattr(p, k, pub[k])
-            # p.get_info()
-            yield p
+            yield Publisher._create(self, **pub)
 
-    def get_public_devices(self, meaning=''):
+    def get_public_devices(self, meaning='', expand=None):
         """
         Returns a generator for all devices on the relayr platform.
 
@@ -87,12 +110,15 @@ class Client(object):
 
         :arg meaning: The *meaning* (type) of the desired devices.
         :type meaning: string
+        :arg expand: Nested resources to fetch, e.g. ``['model']``.
+        :type expand: list of strings
         :rtype: A generator for :py:class:`relayr.resources.Device` objects.
         """
 
-        for dev in self.api.get_public_devices(meaning=meaning):
-            d = Device(dev['id'], client=self)
-            d.get_info()
+        devices = [Device._create(self, **dev)
+            for dev in self.api.get_public_devices(meaning=meaning)]
+        _expand(devices, expand)
+        for d in devices:
             yield d
 
     def get_public_device_models(self):
@@ -107,9 +133,9 @@ class Client(object):
         """
 
         for dm in self.api.get_public_device_models():
-            d = DeviceModel(dm['id'], client=self)
-            d.get_info()
-            yield d
+            model = self.device_models.get(dm['id'])
+            model._set_info(dm)
+            yield model
 
     def get_public_device_model_meanings(self):
         """
@@ -139,10 +165,7 @@ class Client(object):
         :rtype: A :py:class:`relayr.resources.User` object.
         """
         info = self.api.get_oauth2_user_info()
-        usr = User(info['id'], client=self)
-        for k in info:
-            setattr(usr, k, info[k])
-        return usr
+        return User._create(self, **info)
 
     def get_app(self):
         """
@@ -151,7 +174,7 @@ class Client(object):
         :rtype: A :py:class:`relayr.resources.App` object.
         """
         info = self.api.get_oauth2_app_info()
-        app = App(info['id'], client=self)
+        app = App._create(self, id=info['id'])
         app.get_info()
         return app
 
@@ -163,7 +186,57 @@ class Client(object):
         :type id: string
         :rtype: A :py:class:`relayr.resources.Device` object.
         """
-        return Device(id=id, client=self)
+        return Device._create(self, id=id)
+
+    def get_devices(self, ids):
+        """
+        Returns the devices with the specified IDs, retrieving their info concurrently.
+
+        The number of concurrent API calls adapts to the load of the API,
+        see :py:meth:`relayr.api.Api.batch`.
+
+        :arg ids: the unique IDs of the desired devices
+        :type ids: iterable
+        :rtype: A :py:class:`relayr.concurrency.BatchResult` with
+            :py:class:`relayr.resources.Device` objects in the order of
+            the IDs (``None`` for devices whose info couldn't be retrieved).
+        """
+        devices = [Device._create(self, id=id) for id in ids]
+        return self.api.batch(Device.get_info, devices)
+
+    def send_commands(self, devices, command):
+        """
+        Sends the same command to many devices concurrently.
+
+        :arg devices: the devices or their IDs
+        :type devices: iterable
+        :arg command: the command to be sent (containing three key strings:
+            'path', 'command' and 'value')
+        :type command: dict
+        :rtype: A :py:class:`relayr.concurrency.BatchResult` with the
+            API results in the order of the devices.
+        """
+        arguments = [(getattr(d, 'id', d), command) for d in devices]
+        return self.api.batch('post_device_command', arguments)
+
+    def get_devices_data(self, devices, start=None, end=None, duration=None,
+                         meaning=None, sample=None, offset=None, limit=None):
+        """
+        Gets historical data of many devices concurrently, e.g. for a backfill.
+
+        See :py:meth:`relayr.resources.Device.get_data` for the parameters
+        other than ``devices``.
+
+        :arg devices: the devices or their IDs
+        :type devices: iterable
+        :rtype: A :py:class:`relayr.concurrency.BatchResult` with dicts of
+            historical data in the order of the devices.
+        """
+        kwargs = dict(start=start, end=end, duration=duration, meaning=meaning,
+            sample=sample, offset=offset, limit=limit)
+        devices = [d if isinstance(d, Device) else Device._create(self, id=d)
+            for d in devices]
+        return self.api.batch(lambda d: d.get_data(**kwargs), devices)
 
     def get_device_groups(self):
         """
@@ -179,6 +252,6 @@ class Client(object):
         """
         info = self.api.get_oauth2_user_info()
         for g in self.api.get_user_device_groups():
-            group = Group(id=g['id'], client=self)
+            group = Group._create(self, id=g['id'])
             group.get_info()
             yield group
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+"""
+Encoding and decoding of JSON request and response bodies.
+
+This module contains interchangeable JSON codecs based on different
+libraries. By default :py:func:`get_codec` picks the fastest one
+installed, trying ``orjson`` and ``ujson`` before falling back to the
+``json`` module of the standard library. All codecs encode Python data
+to UTF-8 encoded bytes and decode such bytes to Python data.
+
+The codec can be selected by name with the ``RELAYR_JSON_CODEC``
+environment variable or per :py:class:`relayr.api.Api` object.
+"""
+
+import json
+
+from relayr import config
+
+
+class JsonCodec(object):
+    "A codec based on the ``json`` module of the standard library."
+
+    name = 'json'
+
+    def dumps(self, obj):
+        "Encode Python data as JSON bytes."
+        return json.dumps(obj).encode('utf-8')
+
+    def loads(self, data):
+        "Decode JSON bytes to Python data."
+        return json.loads(data.decode('utf-8'))
+
+
+class OrjsonCodec(JsonCodec):
+    "A codec based on ``orjson``, encoding directly to bytes."
+
+    name = 'orjson'
+
+    def __init__(self):
+        import orjson
+        self._orjson = orjson
+
+    def dumps(self, obj):
+        "Encode Python data as JSON bytes."
+        try:
+            return self._orjson.dumps(obj)
+        except TypeError:
+            # e.g. non-string dict keys or very large integers
+            return super(OrjsonCodec, self).dumps(obj)
+
+    def loads(self, data):
+        "Decode JSON bytes to Python data."
+        return self._orjson.loads(data)
+
+
+class UjsonCodec(JsonCodec):
+    "A codec based on ``ujson``."
+
+    name = 'ujson'
+
+    def __init__(self):
+        import ujson
+        self._ujson = ujson
+
+    def dumps(self, obj):
+        "Encode Python data as JSON bytes."
+        return self._ujson.dumps(obj, ensure_ascii=False).encode('utf-8')
+
+    def loads(self, data):
+        "Decode JSON bytes to Python data."
+        return self._ujson.loads(data)
+
+
+CODECS = {
+    'orjson': OrjsonCodec,
+    'ujson': UjsonCodec,
+    'json': JsonCodec,
+}
+
+
+def get_codec(name=None):
+    """
+    Return a JSON codec by name.
+
+    :param name: one of ``orjson``, ``ujson``, ``json`` or ``auto`` for
+        the fastest one installed (default: ``config.JSON_CODEC``)
+    :type name: string
+    :rtype: a codec object with ``dumps`` and ``loads`` methods
+    """
+    name = name or config.JSON_CODEC
+    if name != 'auto':
+        return CODECS[name]()
+    for cls in (OrjsonCodec, UjsonCodec):
+        try:
+            return cls()
+        except ImportError:
+            pass
+    return JsonCodec()
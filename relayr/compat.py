@@ -3,6 +3,7 @@ Compatibility helpers for Python 2 and 3.
 """
 
 import sys
+import time
 
 
 PY2 = sys.version_info[0] == 2
@@ -13,7 +14,32 @@ if PY2:
     from urllib import urlopen
     from urllib import urlencode
     from urllib2 import URLError
-else:
-    from urllib.request import urlopen
+    import Queue as queue
+elif sys.version_info < (3, 7):
+    # no module __getattr__ before Python 3.7
     from urllib.parse import urlencode
+    from urllib.request import urlopen
     from urllib.error import URLError
+    import queue
+else:
+    from urllib.parse import urlencode
+    import queue
+
+    def __getattr__(name):
+        # urllib.request is slow to import and rarely needed
+        if name == 'urlopen':
+            from urllib.request import urlopen
+            return urlopen
+        if name == 'URLError':
+            from urllib.error import URLError
+            return URLError
+        raise AttributeError("module %r has no attribute %r" % (__name__, name))
+
+# the types of text, including unicode on Python 2
+try:
+    string_types = (basestring,)
+except NameError:
+    string_types = (str,)
+
+# a clock which can't go backwards, where available
+monotonic = getattr(time, 'monotonic', time.time)
@@ -0,0 +1,391 @@
+# -*- coding: utf-8 -*-
+
+"""
+Helpers for running many API calls concurrently.
+
+This module contains the machinery behind :py:meth:`relayr.api.Api.batch`
+which calls one API endpoint for many sets of arguments using a pool
+of worker threads, an :py:class:`AdaptiveLimiter` adjusting the number
+of concurrent calls to the load of the API, and :py:class:`SingleFlight`
+which lets concurrent identical calls share one execution.
+"""
+
+import copy
+import threading
+
+from relayr import config
+from relayr import forksafe
+from relayr.compat import monotonic
+from relayr.exceptions import RelayrApiException, RelayrApiTimeoutException
+
+
+# marks threads making a call within the limit of an AdaptiveLimiter
+_local = threading.local()
+
+
+class BatchResult(object):
+    """
+    The results of calling a function for many sets of arguments.
+
+    Iterating over a batch result yields the results in the order of the
+    arguments, with ``None`` for calls that raised an exception.
+
+    :ivar results: the results in the order of the arguments
+    :ivar errors: a dict mapping the indices of failed calls to the
+        exceptions they raised
+    :ivar elapsed: the duration of the whole batch in seconds
+    """
+
+    def __init__(self, results, errors, elapsed):
+        self.results = results
+        self.errors = errors
+        self.elapsed = elapsed
+
+    def __repr__(self):
+        args = (self.__class__.__name__, len(self.results), len(self.errors), self.elapsed)
+        return "%s(results=%d, errors=%d, elapsed=%.3f)" % args
+
+    def __len__(self):
+        return len(self.results)
+
+    def __iter__(self):
+        return iter(self.results)
+
+    def __getitem__(self, index):
+        return self.results[index]
+
+    @property
+    def ok(self):
+        "``True`` if no call raised an exception."
+        return not self.errors
+
+
+def call_args(func, args):
+    """
+    Call a function with one set of arguments.
+
+    A tuple is passed as positional arguments, a dict as keyword arguments
+    and everything else as a single positional argument.
+    """
+    if isinstance(args, tuple):
+        return func(*args)
+    elif isinstance(args, dict):
+        return func(**args)
+    else:
+        return func(args)
+
+
+def call_many(func, arguments, workers=None, limiter=None):
+    """
+    Call a function concurrently for many sets of arguments.
+
+    Exceptions raised by single calls are collected instead of aborting
+    the whole batch.
+
+    :param func: the function to be called
+    :type func: callable
+    :param arguments: sets of arguments as accepted by :py:func:`call_args`
+    :type arguments: iterable
+    :param workers: the number of worker threads
+    :type workers: integer
+    :param limiter: a limiter adjusting the number of concurrent calls,
+        used instead of a fixed number of ``workers``
+    :type limiter: :py:class:`AdaptiveLimiter`
+    :rtype: :py:class:`BatchResult`
+    """
+    arguments = list(arguments)
+    results = [None] * len(arguments)
+    errors = {}
+    start = monotonic()
+    if limiter is not None and getattr(_local, 'limited', False):
+        # nested in a call of another batch holding a slot, the workers of
+        # this batch waiting for slots could wait forever
+        workers, limiter = limiter.max_limit, None
+    if limiter is not None:
+        workers = limiter.max_limit
+        key = endpoint_key(func)
+        call = lambda func, args: limiter._call(key, call_args, func, args)
+    else:
+        call = call_args
+    if arguments:
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            futures = [executor.submit(call, func, args) for args in arguments]
+            for i, future in enumerate(futures):
+                try:
+                    results[i] = future.result()
+                except Exception as e:
+                    errors[i] = e
+    return BatchResult(results, errors, monotonic() - start)
+
+
+def endpoint_key(func):
+    """
+    Return a key for the endpoint called by a function, for keeping latency
+    baselines per endpoint.
+
+    Functions and methods are identified by their qualified names, so
+    calls of the same method of different API objects or of the same
+    ``lambda`` share a key. Other callables get the key ``None``.
+    """
+    name = getattr(func, '__qualname__', None) or getattr(func, '__name__', None)
+    if name is None:
+        return None
+    return (getattr(func, '__module__', None), name)
+
+
+def is_overload(error):
+    """
+    Return if an exception of an API call indicates that the API is overloaded.
+
+    These are timeouts, connection errors, rejections by an open circuit
+    breaker and responses with status 429 or 5XX.
+    """
+    if isinstance(error, RelayrApiException):
+        return error.status is None or error.status == 429 or error.status >= 500
+    return isinstance(error, EnvironmentError)
+
+
+class AdaptiveLimiter(object):
+    """
+    A limit for the number of concurrent calls, adapting to the load of the API.
+
+    The limit is adjusted with the AIMD method known from TCP congestion
+    control: each successful call increases it additively, by one per
+    ``limit`` calls, and a call indicating overload cuts it by the factor
+    ``backoff``. Overload is indicated by errors like timeouts or status
+    429 (see :py:func:`is_overload`) and by latencies exceeding
+    ``tolerance`` times the lowest latency seen recently for the same
+    endpoint (see :py:func:`endpoint_key`), so slow endpoints aren't taken
+    for overloaded fast ones. The limit is cut at most once per such
+    latency, so a burst of failures counts once.
+
+    A limiter is thread-safe and can be shared by many batches, so it
+    keeps what it has learned between them. Calls made within a call
+    holding a slot, e.g. batches nested in a batch, don't take slots of
+    their own, since waiting for them could block forever.
+    """
+
+    def __init__(self, initial=None, min_limit=1, max_limit=None, backoff=0.5,
+                 tolerance=2.0):
+        """
+        :param initial: the initial limit (default: half of ``max_limit``)
+        :type initial: integer
+        :param min_limit: the lowest limit
+        :type min_limit: integer
+        :param max_limit: the highest limit (default: ``config.POOL_SIZE``)
+        :type max_limit: integer
+        :param backoff: the factor the limit is multiplied with on overload
+        :type backoff: float
+        :param tolerance: the factor by which latencies may exceed the
+            lowest recent latency before they indicate overload
+        :type tolerance: float
+        """
+        self.min_limit = min_limit
+        self.max_limit = max_limit or config.POOL_SIZE
+        if initial is None:
+            initial = self.max_limit // 2
+        self.limit = float(min(self.max_limit, max(min_limit, initial)))
+        self.backoff = backoff
+        self.tolerance = tolerance
+        self.in_flight = 0
+        self.increases = 0
+        self.decreases = 0
+        self._baselines = {}
+        self._last_decrease = None
+        self._cond = threading.Condition()
+        forksafe.register(self)
+
+    def _after_fork(self):
+        # calls running in other threads of the parent don't exist here
+        self.in_flight = 0
+        self._cond = threading.Condition()
+
+    def __repr__(self):
+        return "%s(limit=%d, in_flight=%d)" % (self.__class__.__name__,
+            self.limit, self.in_flight)
+
+    def acquire(self):
+        """
+        Wait until a call may start and return its start time.
+
+        :rtype: float
+        """
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+        return monotonic()
+
+    def release(self, start, error=None, key=None):
+        """
+        Adjust the limit for a finished call and let waiting calls start.
+
+        :param start: the start time returned by :py:meth:`acquire`
+        :type start: float
+        :param error: the exception raised by the call, if any
+        :type error: Exception
+        :param key: the endpoint called, see :py:func:`endpoint_key`
+        """
+        now = monotonic()
+        latency = now - start
+        with self._cond:
+            self.in_flight -= 1
+            overload = error is not None and is_overload(error)
+            if error is None:
+                baseline = self._baselines.get(key)
+                if baseline is None or latency < baseline:
+                    baseline = latency
+                else:
+                    # let the baseline follow slowly if the API gets slower
+                    baseline += (latency - baseline) * 0.01
+                self._baselines[key] = baseline
+                overload = 0 < self.tolerance * baseline < latency
+            if overload:
+                if self._last_decrease is None or now - self._last_decrease > latency:
+                    self.limit = max(self.min_limit, self.limit * self.backoff)
+                    self.decreases += 1
+                    self._last_decrease = now
+            elif error is None and self.limit < self.max_limit:
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+                self.increases += 1
+            self._cond.notify_all()
+
+    def call(self, func, *args, **kwargs):
+        "Call a function within the limit and adjust the limit afterwards."
+        return self._call(endpoint_key(func), func, *args, **kwargs)
+
+    def _call(self, key, func, *args, **kwargs):
+        if getattr(_local, 'limited', False):
+            # nested in a call holding a slot already, don't wait for another
+            return func(*args, **kwargs)
+        start = self.acquire()
+        _local.limited = True
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            self.release(start, e, key)
+            raise
+        finally:
+            _local.limited = False
+        self.release(start, key=key)
+        return result
+
+    def stats(self):
+        "Return a dict with the current limit and the numbers of adjustments."
+        with self._cond:
+            return {
+                'limit': int(self.limit),
+                'in_flight': self.in_flight,
+                'increases': self.increases,
+                'decreases': self.decreases,
+            }
+
+
+def _copy_error(error):
+    "Return a copy of an exception without its traceback, or the exception itself."
+    try:
+        return copy.copy(error)
+    except Exception:
+        return error
+
+
+class _Flight(object):
+    "A call in progress, waited for by the callers sharing it."
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+    """
+    Coalesce concurrent calls with the same key into one execution.
+
+    While a call with some key is running, further calls with the same key
+    don't execute their function but wait for the running call and return
+    its result (or raise a copy of its exception). Waiting callers get deep
+    copies of the result, so they can't see each other's changes of it,
+    and exceptions of their own, so their tracebacks don't mix. Calls made
+    after the running one has finished execute their function again, so no
+    results are cached.
+
+    A ``SingleFlight`` object is thread-safe and can be shared by many API
+    objects.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.coalesced = 0
+        self._flights = {}
+        self._lock = threading.Lock()
+        forksafe.register(self)
+
+    def _after_fork(self):
+        # calls running in other threads of the parent don't exist here
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def call(self, key, func, *args, **kwargs):
+        """
+        Call a function, unless a call with the same key is running already.
+
+        :param key: the key identifying identical calls
+        :type key: hashable
+        :param func: the function to be called
+        :type func: callable
+        :rtype: the result of the function
+        """
+        return self.call_until(None, key, func, *args, **kwargs)
+
+    def call_until(self, deadline, key, func, *args, **kwargs):
+        """
+        Like :py:meth:`call`, but wait for a running call only until a deadline.
+
+        A caller whose deadline expires while waiting raises a
+        ``RelayrApiTimeoutException``, the running call goes on.
+
+        :param deadline: the point in time as returned by
+            ``relayr.compat.monotonic()`` or ``None`` for no deadline
+        :type deadline: float
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.calls += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            timeout = None if deadline is None else max(0, deadline - monotonic())
+            if not flight.done.wait(timeout):
+                msg = "API request deadline exceeded waiting for an identical request"
+                raise RelayrApiTimeoutException(msg)
+            if flight.error is not None:
+                raise _copy_error(flight.error)
+            return copy.deepcopy(flight.result)
+
+        try:
+            flight.result = func(*args, **kwargs)
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.result
+
+    def stats(self):
+        """
+        Return a dict with the numbers of executed and coalesced calls.
+
+        The number of ``coalesced`` calls is the number of calls saved.
+        """
+        return {
+            'calls': self.calls,
+            'coalesced': self.coalesced,
+        }
@@ -9,7 +9,7 @@ the relayr client.
 """
 
 import os
-import platform
+import sys
 
 from .version import __version__
 
@@ -23,9 +23,26 @@ userAgentString += '({platform}; {arch}; {python_implementation}-{python_version
 DEBUG = False
 LOG = False
 LOG_DIR = os.getcwd()
+LOG_SAMPLE_RATE = 1.0
+LOG_MAX_BYTES = 10 * 2**20
+LOG_BACKUP_COUNT = 5
 RELAYR_FOLDER = os.path.expanduser('~/.relayr')
 RELAYR_MQTT_HOST = 'mqtt.relayr.io'
 RELAYR_MQTT_PORT = 8883
+POOL_SIZE = 10
+KEEP_ALIVE = True
+STATUS_CHECK_TTL = 60
+RETRIES = 3
+CIRCUIT_BREAKER_THRESHOLD = 5
+CIRCUIT_BREAKER_TIMEOUT = 30
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 30
+JSON_CODEC = 'auto'
+COALESCE_REQUESTS = False
+DNS_CACHE_TTL = 0
+DEVICE_MODEL_TTL = 3600
+IDENTITY_MAP_SIZE = 1000
+IDENTITY_MAP_TTL = 0
 
 # overwrite with environment variables if given
 relayrAPI = os.environ.get('RELAYR_API', relayrAPI)
@@ -35,18 +52,51 @@ userAgentString = os.environ.get('RELAYR_DATAHUB', userAgentString)
 DEBUG = True if os.environ.get('RELAYR_DEBUG', 'False') == 'True' else False
 LOG = True if os.environ.get('RELAYR_LOG', 'False') == 'True' else False
 LOG_DIR = os.environ.get('RELAYR_LOG_DIR', LOG_DIR)
+LOG_SAMPLE_RATE = float(os.environ.get('RELAYR_LOG_SAMPLE_RATE', LOG_SAMPLE_RATE))
+LOG_MAX_BYTES = int(os.environ.get('RELAYR_LOG_MAX_BYTES', LOG_MAX_BYTES))
+LOG_BACKUP_COUNT = int(os.environ.get('RELAYR_LOG_BACKUP_COUNT', LOG_BACKUP_COUNT))
 RELAYR_FOLDER = os.environ.get('RELAYR_FOLDER', RELAYR_FOLDER)
 RELAYR_MQTT_HOST = os.environ.get('RELAYR_MQTT_HOST', RELAYR_MQTT_HOST)
 RELAYR_MQTT_PORT = int(os.environ.get('RELAYR_MQTT_PORT', RELAYR_MQTT_PORT))
+POOL_SIZE = int(os.environ.get('RELAYR_POOL_SIZE', POOL_SIZE))
+KEEP_ALIVE = False if os.environ.get('RELAYR_KEEP_ALIVE', 'True') == 'False' else True
+STATUS_CHECK_TTL = float(os.environ.get('RELAYR_STATUS_CHECK_TTL', STATUS_CHECK_TTL))
+RETRIES = int(os.environ.get('RELAYR_RETRIES', RETRIES))
+CIRCUIT_BREAKER_THRESHOLD = int(os.environ.get('RELAYR_CIRCUIT_BREAKER_THRESHOLD', CIRCUIT_BREAKER_THRESHOLD))
+CIRCUIT_BREAKER_TIMEOUT = float(os.environ.get('RELAYR_CIRCUIT_BREAKER_TIMEOUT', CIRCUIT_BREAKER_TIMEOUT))
+CONNECT_TIMEOUT = float(os.environ.get('RELAYR_CONNECT_TIMEOUT', CONNECT_TIMEOUT))
+READ_TIMEOUT = float(os.environ.get('RELAYR_READ_TIMEOUT', READ_TIMEOUT))
+JSON_CODEC = os.environ.get('RELAYR_JSON_CODEC', JSON_CODEC)
+COALESCE_REQUESTS = os.environ.get('RELAYR_COALESCE_REQUESTS', 'False') == 'True'
+DNS_CACHE_TTL = float(os.environ.get('RELAYR_DNS_CACHE_TTL', DNS_CACHE_TTL))
+DEVICE_MODEL_TTL = float(os.environ.get('RELAYR_DEVICE_MODEL_TTL', DEVICE_MODEL_TTL))
+IDENTITY_MAP_SIZE = int(os.environ.get('RELAYR_IDENTITY_MAP_SIZE', IDENTITY_MAP_SIZE))
+IDENTITY_MAP_TTL = float(os.environ.get('RELAYR_IDENTITY_MAP_TTL', IDENTITY_MAP_TTL))
 
-# derived variable, HTTP user-agent string
-userAgent = userAgentString.format(
-	client_name=clientName,
-	client_version=__version__,
-	platform=platform.system() + '-' + platform.release(),
-	arch=platform.machine() + '-' + platform.architecture()[0],
-	python_implementation=platform.python_implementation(),
-	python_version=platform.python_version(),
-)
-
-del os, platform
+# derived variable, HTTP user-agent string, computed on first use since
+# querying the platform is slow
+def _user_agent():
+    import struct
+    import platform
+    return userAgentString.format(
+        client_name=clientName,
+        client_version=__version__,
+        platform=platform.system() + '-' + platform.release(),
+        # like platform.architecture()[0], without running a subprocess
+        arch=platform.machine() + '-%dbit' % (struct.calcsize('P') * 8),
+        python_implementation=platform.python_implementation(),
+        python_version=platform.python_version(),
+    )
+
+def __getattr__(name):
+    global userAgent
+    if name == 'userAgent':
+        userAgent = _user_agent()
+        return userAgent
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
+
+if sys.version_info < (3, 7):
+    # no lazy module attributes
+    userAgent = _user_agent()
+
+del os
@@ -16,6 +16,7 @@ import certifi
 import paho.mqtt.client as mqtt
 
 from relayr import config
+from relayr import forksafe
 from relayr.compat import PY2, PY3
 
 from collections import namedtuple
@@ -52,6 +53,17 @@ class MqttStream(threading.Thread):
         self.mqtt_queue = queue.Queue()
 
         self.setDaemon(True)
+        forksafe.register(self)
+
+    def _after_fork(self):
+        """
+        Detach a copy of the stream in a forked process from the connection.
+
+        The connection belongs to the parent process and must not be used
+        or closed here, a forked process needs to open a stream of its own.
+        """
+        self.client = None
+        self._stop_event.set()
 
     def run(self):
         """
@@ -80,6 +92,10 @@ class MqttStream(threading.Thread):
         """
         Mark the connection/thread for being stopped.
         """
+        if getattr(self, 'client', None) is None:
+            # never connected or inherited from a parent process
+            self._stop_event.set()
+            return
         if not self._stop_event.is_set():
             for t in self.topics:
                 if PY2:
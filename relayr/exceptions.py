@@ -5,9 +5,13 @@ This module contains exceptions raised when an operation on the
 relayr API or the relayr platform fails due to, 
 for example: missing credentials, invalid UIDs, etc.
 
-At the moment two exception classes are provided: 
+At the moment these exception classes are provided: 
 
 - ``RelayrApiException``: raised for exceptions caused by API calls
+- ``RelayrCircuitOpenException``: raised for API calls rejected while
+  the API host seems to be down (a subclass of ``RelayrApiException``)
+- ``RelayrApiTimeoutException``: raised for API calls not finished within
+  their timeout or deadline (a subclass of ``RelayrApiException``)
 - ``RelayrException``: raised for other exceptions
 """
 
@@ -15,6 +19,20 @@ At the moment two exception classes are provided:
 class RelayrApiException(Exception):
     """
     RelayrApiException
+
+    The ``status`` attribute holds the HTTP status code of the response
+    to the failed call, if any.
+    """
+    status = None
+
+class RelayrCircuitOpenException(RelayrApiException):
+    """
+    RelayrCircuitOpenException
+    """
+
+class RelayrApiTimeoutException(RelayrApiException):
+    """
+    RelayrApiTimeoutException
     """
 
 class RelayrException(Exception):
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+
+"""
+Support for forking processes using the relayr client.
+
+Pre-fork servers like gunicorn and the ``multiprocessing`` module copy a
+process including its pooled connections, locks and threads. Connections
+shared between processes get corrupted when both use them, locks held by
+other threads at the time of the fork stay locked forever and threads
+don't exist at all in the child process.
+
+Objects holding such resources register themselves here and are given a
+chance to replace them in the child process, before it does anything
+else, via ``os.register_at_fork`` (Python 3.7 and higher). On older
+Python versions the same happens on the next API call in the child,
+which compares the process ID with the one seen before.
+
+Registered objects implement an ``_after_fork()`` method. Connections of
+the parent must not be closed properly there, since that would close
+them for the parent, too, they are just dropped.
+"""
+
+import os
+import weakref
+
+
+_pid = os.getpid()
+_objects = weakref.WeakSet()
+_hooks = []
+
+
+def register(obj):
+    "Call ``obj._after_fork()`` in child processes, while the object exists."
+    _objects.add(obj)
+
+
+def register_hook(func):
+    "Call a function in child processes, e.g. to replace module-level locks."
+    _hooks.append(func)
+
+
+def after_fork():
+    "Replace inherited resources in a child process."
+    global _pid
+    _pid = os.getpid()
+    for func in list(_hooks):
+        func()
+    for obj in list(_objects):
+        obj._after_fork()
+
+
+def check():
+    "Replace inherited resources if this process was forked unnoticed."
+    if os.getpid() != _pid:
+        after_fork()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=after_fork)
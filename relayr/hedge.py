@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+
+"""
+Hedged requests, cutting the tail latency of idempotent reads.
+
+If the response of a hedged request doesn't arrive within a delay, a
+duplicate request is sent and whichever response arrives first is used.
+The delay is a high percentile of the latencies of the same endpoint
+seen so far, so only the slowest requests are duplicated.
+
+Since every duplicate adds load to the API, each endpoint has a budget:
+every request earns it a fraction of a hedge, and hedging stops when
+the budget is used up.
+
+Example:
+
+.. code-block:: python
+
+    from relayr.api import Api
+    from relayr.hedge import HedgePolicy
+
+    hedge = HedgePolicy(quantile=0.95, budget=0.05,
+        budgets={'/history/devices/{id}': 0.2})
+    a = Api(token='...', hedge=hedge)
+"""
+
+import threading
+
+from relayr import forksafe
+
+
+class HedgePolicy(object):
+    """
+    A policy deciding when to hedge requests and keeping their budgets.
+
+    Policies are thread-safe and can be shared by many API objects.
+    """
+
+    def __init__(self, quantile=0.95, min_samples=20, default_delay=0.5,
+                 min_delay=0.01, max_delay=5.0, budget=0.05, burst=10, budgets=None):
+        """
+        :param quantile: the latency quantile of an endpoint used as delay
+        :type quantile: float
+        :param min_samples: the number of calls of an endpoint needed before
+            its latencies are used
+        :type min_samples: integer
+        :param default_delay: the delay in seconds for endpoints without
+            enough latency samples
+        :type default_delay: float
+        :param min_delay: the minimum delay in seconds
+        :type min_delay: float
+        :param max_delay: the maximum delay in seconds
+        :type max_delay: float
+        :param budget: the number of hedges earned per request, i.e. the
+            maximum fraction of requests hedged in the long run
+        :type budget: float
+        :param burst: the maximum number of hedges saved up per endpoint
+        :type burst: float
+        :param budgets: budgets per endpoint template overriding ``budget``,
+            0 disables hedging of an endpoint
+        :type budgets: dict
+        """
+        self.quantile = quantile
+        self.min_samples = min_samples
+        self.default_delay = default_delay
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.budget = budget
+        self.burst = burst
+        self.budgets = budgets or {}
+        self._tokens = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+        forksafe.register(self)
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+
+    def _budget(self, template):
+        return self.budgets.get(template, self.budget)
+
+    def delay(self, method, template, metrics=None):
+        """
+        Return the number of seconds to wait before hedging a request.
+
+        Return ``None`` if requests of the endpoint are not hedged at all.
+        This also adds the share of the request to the endpoint's budget.
+
+        :param method: the HTTP method
+        :type method: string
+        :param template: the endpoint template
+        :type template: string
+        :param metrics: the metrics with the latencies of the endpoint
+        :type metrics: :py:class:`relayr.metrics.MetricsRegistry`
+        :rtype: float
+        """
+        budget = self._budget(template)
+        if method.upper() != 'GET' or budget <= 0:
+            return None
+        with self._lock:
+            tokens = self._tokens.get(template, self.burst)
+            self._tokens[template] = min(self.burst, tokens + budget)
+        delay = None
+        if metrics is not None:
+            delay = metrics.quantile(method, template, self.quantile,
+                min_count=self.min_samples)
+        if delay is None:
+            delay = self.default_delay
+        return min(self.max_delay, max(self.min_delay, delay))
+
+    def allow(self, template):
+        "Take one hedge from the budget of an endpoint, return ``False`` if empty."
+        with self._lock:
+            stats = self._stats.setdefault(template, {'hedged': 0, 'won': 0, 'denied': 0})
+            tokens = self._tokens.get(template, self.burst)
+            if tokens < 1:
+                stats['denied'] += 1
+                return False
+            self._tokens[template] = tokens - 1
+            stats['hedged'] += 1
+            return True
+
+    def record_win(self, template):
+        "Count a hedge which answered before the original request."
+        with self._lock:
+            self._stats[template]['won'] += 1
+
+    def stats(self):
+        """
+        Return a dict mapping endpoint templates to hedging statistics.
+
+        These are the numbers of hedges sent (``hedged``), of hedges
+        answering first (``won``) and of hedges not sent for lack of
+        budget (``denied``).
+        """
+        with self._lock:
+            return dict((t, dict(s)) for (t, s) in self._stats.items())
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+
+"""
+Hooks into the lifecycle of API calls, for tracing and profiling.
+
+Functions registered with :py:meth:`relayr.api.Api.add_hook` are called
+before each request is sent (``before_request``), after a successful
+response was decoded (``after_response``) and when a call fails
+(``on_error``). They receive a :py:class:`RequestInfo` object describing
+the call, e.g. to start and finish tracing spans or to trigger a
+sampling profiler for slow endpoints.
+
+The :py:class:`JsonLinesExporter` writes one span per API call to a
+local file, for analyzing where the time of long jobs goes offline
+without any tracing infrastructure.
+
+Example:
+
+.. code-block:: python
+
+    from relayr.api import Api
+    from relayr.hooks import JsonLinesExporter
+
+    a = Api(token='...')
+    JsonLinesExporter('spans.jsonl').install(a)
+    a.get_public_devices()
+"""
+
+import os
+import json
+import binascii
+import threading
+
+from relayr import forksafe
+
+
+HOOK_EVENTS = ('before_request', 'after_response', 'on_error')
+
+
+def _random_id(size=8):
+    "Return a random hexadecimal ID of ``size`` bytes."
+    return binascii.hexlify(os.urandom(size)).decode('ascii')
+
+
+class RequestInfo(object):
+    """
+    A description of an API call passed to hooks.
+
+    The attributes ``endpoint`` (the name of the ``Api`` method called,
+    e.g. ``get_device``, or ``None`` for direct calls of ``perform_request``
+    without an ``endpoint``), ``method``, ``url``, ``template`` (see
+    :py:func:`relayr.api.endpoint_template`), ``request_bytes`` and
+    ``span_id`` are set for all hooks. The
+    attributes ``start`` (as returned by ``time.time()``), ``duration``
+    in seconds, ``status``, ``response_bytes`` and ``error`` (the
+    exception raised, if any) are set for ``after_response`` and
+    ``on_error`` hooks. Hooks can use the ``tags`` dict to store data of
+    their own.
+    """
+
+    def __init__(self, endpoint, method, url, template):
+        self.endpoint = endpoint
+        self.method = method.upper()
+        self.url = url
+        self.template = template
+        self.span_id = _random_id()
+        self.request_bytes = 0
+        self.start = None
+        self.duration = None
+        self.status = None
+        self.response_bytes = None
+        self.error = None
+        self.tags = {}
+
+    def __repr__(self):
+        return "%s(%s %s)" % (self.__class__.__name__, self.method, self.url)
+
+    def to_dict(self):
+        "Return the description as a dict of JSON serializable values."
+        return {
+            'span_id': self.span_id,
+            'endpoint': self.endpoint,
+            'method': self.method,
+            'url': self.url,
+            'template': self.template,
+            'start': self.start,
+            'duration': self.duration,
+            'status': self.status,
+            'request_bytes': self.request_bytes,
+            'response_bytes': self.response_bytes,
+            'error': None if self.error is None else repr(self.error),
+            'tags': dict((k, str(v)) for (k, v) in self.tags.items()),
+        }
+
+
+class JsonLinesExporter(object):
+    """
+    A hook writing a span for each finished API call to a JSON-lines file.
+
+    Each line is the JSON object returned by :py:meth:`RequestInfo.to_dict`
+    plus the ID of the process and the name of the thread making the call.
+    The exporter can be shared by many API objects and threads.
+    """
+
+    def __init__(self, path):
+        """
+        :param path: the file to append spans to
+        :type path: string
+        """
+        self.path = path
+        self._file = open(path, 'a')
+        self._lock = threading.Lock()
+        forksafe.register(self)
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+
+    def __call__(self, info):
+        span = info.to_dict()
+        span['pid'] = os.getpid()
+        span['thread'] = threading.current_thread().name
+        line = json.dumps(span, sort_keys=True) + '\n'
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+    def install(self, api):
+        """
+        Register this exporter as ``after_response`` and ``on_error`` hook.
+
+        :param api: the API object
+        :type api: :py:class:`relayr.api.Api`
+        """
+        api.add_hook('after_response', self)
+        api.add_hook('on_error', self)
+
+    def close(self):
+        "Close the file."
+        with self._lock:
+            self._file.close()
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+
+"""
+Logging of API requests and responses.
+
+If ``config.LOG`` is set, all API objects log their requests and
+responses to one shared logger named ``Relayr API Client``. Records are
+put on a queue by the calling thread and formatted and written to a
+rotating log file in ``config.LOG_DIR`` by a background thread, so
+logging doesn't slow down API calls. Expensive message arguments like
+``curl`` commands are wrapped in :py:class:`Lazy` objects and only built
+in the background thread, too.
+
+Request and response bodies can be large, so only a fraction of them,
+given by ``config.LOG_SAMPLE_RATE``, is logged.
+
+If ``config.LOG`` is not set, API objects have no logger and nothing
+at all is done for logging.
+"""
+
+import os
+import time
+import atexit
+import random
+import logging
+import threading
+from logging.handlers import RotatingFileHandler
+
+from relayr import config
+from relayr import forksafe
+from relayr.compat import queue
+
+try:
+    from logging.handlers import QueueHandler, QueueListener
+except ImportError:
+    # Python 2 has no queue handlers, these minimal versions do what we need
+
+    class QueueHandler(logging.Handler):
+        "A handler putting records on a queue."
+
+        def __init__(self, queue):
+            logging.Handler.__init__(self)
+            self.queue = queue
+
+        def prepare(self, record):
+            return record
+
+        def emit(self, record):
+            try:
+                self.queue.put_nowait(self.prepare(record))
+            except Exception:
+                self.handleError(record)
+
+    class QueueListener(object):
+        "A background thread passing records from a queue to handlers."
+
+        def __init__(self, queue, *handlers):
+            self.queue = queue
+            self.handlers = handlers
+            self._thread = None
+
+        def start(self):
+            self._thread = threading.Thread(target=self._monitor)
+            self._thread.daemon = True
+            self._thread.start()
+
+        def _monitor(self):
+            while True:
+                record = self.queue.get()
+                if record is None:
+                    break
+                for handler in self.handlers:
+                    if record.levelno >= handler.level:
+                        handler.handle(record)
+
+        def stop(self):
+            self.queue.put_nowait(None)
+            self._thread.join()
+            self._thread = None
+
+
+LOGGER_NAME = 'Relayr API Client'
+
+_listener = None
+_lock = threading.Lock()
+
+
+class Lazy(object):
+    """
+    A log message argument computed only when the message is formatted.
+
+    ``Lazy(func, *args)`` is formatted as ``str(func(*args))``.
+    """
+
+    __slots__ = ('func', 'args')
+
+    def __init__(self, func, *args):
+        self.func = func
+        self.args = args
+
+    def __str__(self):
+        return str(self.func(*self.args))
+
+
+class _QueueHandler(QueueHandler):
+    "A queue handler leaving the formatting of records to the listener thread."
+
+    def prepare(self, record):
+        return record
+
+
+def _decode(content):
+    "Return a body of bytes as text for logging."
+    if isinstance(content, bytes):
+        return content.decode('utf-8', 'replace')
+    return content
+
+
+def log_body(logger, msg, content):
+    """
+    Log a request or response body, if it is part of the sample.
+
+    :param logger: the logger
+    :type logger: ``logging.Logger``
+    :param msg: the message, containing one ``%s`` for the body
+    :type msg: string
+    :param content: the body
+    :type content: bytes or string
+    """
+    if content is not None and random.random() < config.LOG_SAMPLE_RATE:
+        logger.info(msg, Lazy(_decode, content))
+
+
+def create_logger(sender=None):
+    """
+    Return the shared logger for API requests, setting it up on first use.
+
+    The logger writes to ``relayr-api.log`` in ``config.LOG_DIR`` through a
+    queue and a background thread. The file is rotated after
+    ``config.LOG_MAX_BYTES`` bytes, keeping ``config.LOG_BACKUP_COUNT``
+    old files.
+
+    :param sender: ignored, kept for backwards compatibility
+    :rtype: ``logging.Logger``
+    """
+    global _listener
+    logger = logging.getLogger(LOGGER_NAME)
+    with _lock:
+        if _listener is None:
+            logfile = os.path.join(config.LOG_DIR, 'relayr-api.log')
+            h = RotatingFileHandler(logfile, maxBytes=config.LOG_MAX_BYTES,
+                backupCount=config.LOG_BACKUP_COUNT)
+            fmt = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+            formatter = logging.Formatter(fmt)
+            formatter.converter = time.gmtime
+            h.setFormatter(formatter)
+
+            records = queue.Queue()
+            _listener = QueueListener(records, h)
+            _listener.start()
+            atexit.register(stop)
+
+            logger.setLevel(logging.DEBUG)
+            logger.addHandler(_QueueHandler(records))
+    return logger
+
+
+def _after_fork():
+    # the background thread of the parent doesn't exist here, start a new one
+    global _listener, _lock
+    _lock = threading.Lock()
+    if _listener is not None:
+        logger = logging.getLogger(LOGGER_NAME)
+        for h in list(logger.handlers):
+            if isinstance(h, _QueueHandler):
+                logger.removeHandler(h)
+        _listener = None
+        create_logger()
+
+forksafe.register_hook(_after_fork)
+
+
+def stop():
+    """
+    Write all queued records and stop the background thread.
+
+    Logging continues with a new thread on the next call of
+    :py:func:`create_logger`.
+    """
+    global _listener
+    logger = logging.getLogger(LOGGER_NAME)
+    with _lock:
+        if _listener is None:
+            return
+        _listener.stop()
+        for h in _listener.handlers:
+            h.close()
+        for h in list(logger.handlers):
+            if isinstance(h, _QueueHandler):
+                logger.removeHandler(h)
+        _listener = None
@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+
+"""
+Latency and throughput metrics of API calls.
+
+This module contains a :py:class:`MetricsRegistry` collecting metrics of
+API calls per HTTP method and endpoint template (see
+:py:func:`relayr.api.endpoint_template`): a latency histogram, the number
+of responses per status code, the number of bytes sent and received and
+the number of retries and timeouts.
+
+By default all API objects record their calls in one registry shared by
+the whole process, returned by :py:func:`get_registry`. The metrics can
+be read as Python data with :py:meth:`MetricsRegistry.stats` or exported
+in the text format of Prometheus with :py:meth:`MetricsRegistry.to_prometheus`.
+
+Example:
+
+.. code-block:: python
+
+    from relayr.api import Api
+    from relayr.metrics import get_registry
+
+    a = Api(token='...')
+    a.get_public_devices()
+    print(a.stats()['endpoints']['GET /devices/public']['p99'])
+    print(get_registry().to_prometheus())
+"""
+
+import bisect
+import threading
+
+from relayr import forksafe
+
+
+# latency histogram buckets in seconds, the default ones of Prometheus
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram(object):
+    """
+    A histogram of observed values with fixed buckets.
+
+    The histogram isn't thread-safe by itself, :py:class:`MetricsRegistry`
+    takes care of locking.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        """
+        :param buckets: the upper bounds of the buckets in ascending order,
+            a last bucket for all larger values is added
+        :type buckets: tuple
+        """
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        "Add a value to the histogram."
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """
+        Return an estimate of a quantile of the observed values.
+
+        Like Prometheus this interpolates linearly inside the bucket holding
+        the quantile, values in the last bucket are estimated as the upper
+        bound of the largest finite bucket.
+
+        :param q: the quantile, between 0 and 1
+        :type q: float
+        :rtype: float or ``None`` if nothing was observed
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+
+class EndpointMetrics(object):
+    "The metrics of one HTTP method and endpoint template."
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.latency = Histogram(buckets)
+        self.statuses = {}
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.retries = 0
+        self.timeouts = 0
+
+    def stats(self):
+        "Return a dict with the metrics."
+        return {
+            'count': self.latency.count,
+            'seconds': self.latency.sum,
+            'p50': self.latency.quantile(0.5),
+            'p90': self.latency.quantile(0.9),
+            'p99': self.latency.quantile(0.99),
+            'statuses': dict(self.statuses),
+            'bytes_sent': self.bytes_sent,
+            'bytes_received': self.bytes_received,
+            'retries': self.retries,
+            'timeouts': self.timeouts,
+        }
+
+
+def _label(value):
+    "Escape a label value for the Prometheus text format."
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+class MetricsRegistry(object):
+    """
+    A thread-safe collection of metrics of API calls per endpoint.
+
+    Calls failing without a response, e.g. because of connection errors,
+    are counted with the status ``error``.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        """
+        :param buckets: the upper bounds of the latency histogram buckets
+            in seconds
+        :type buckets: tuple
+        """
+        self.buckets = tuple(buckets)
+        self._endpoints = {}
+        self._lock = threading.Lock()
+        forksafe.register(self)
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+
+    def _get(self, method, template):
+        # to be called with the lock held
+        key = (method.upper(), template)
+        metrics = self._endpoints.get(key)
+        if metrics is None:
+            metrics = self._endpoints[key] = EndpointMetrics(self.buckets)
+        return metrics
+
+    def observe(self, method, template, seconds, status=None, sent=0, received=0):
+        """
+        Record a finished API call.
+
+        :param method: the HTTP method
+        :type method: string
+        :param template: the endpoint template
+        :type template: string
+        :param seconds: the duration of the call, including retries
+        :type seconds: float
+        :param status: the status code of the response, ``None`` if there
+            was none
+        :type status: integer
+        :param sent: the number of bytes in the request body
+        :type sent: integer
+        :param received: the number of bytes in the response body
+        :type received: integer
+        """
+        status = 'error' if status is None else status
+        with self._lock:
+            metrics = self._get(method, template)
+            metrics.latency.observe(seconds)
+            metrics.statuses[status] = metrics.statuses.get(status, 0) + 1
+            metrics.bytes_sent += sent
+            metrics.bytes_received += received
+
+    def record_retry(self, method, template):
+        "Count a retried attempt of an API call."
+        with self._lock:
+            self._get(method, template).retries += 1
+
+    def record_timeout(self, method, template):
+        "Count an API call which timed out."
+        with self._lock:
+            self._get(method, template).timeouts += 1
+
+    def quantile(self, method, template, q, min_count=1):
+        """
+        Return an estimate of a latency quantile of an endpoint in seconds.
+
+        :rtype: float or ``None`` if the endpoint was called less than
+            ``min_count`` times
+        """
+        with self._lock:
+            metrics = self._endpoints.get((method.upper(), template))
+            if metrics is None or metrics.latency.count < max(1, min_count):
+                return None
+            return metrics.latency.quantile(q)
+
+    def stats(self):
+        """
+        Return a dict mapping ``"METHOD template"`` to the metrics of an endpoint.
+
+        The metrics of an endpoint are the number of calls (``count``),
+        their total duration (``seconds``), estimates of latency quantiles
+        in seconds (``p50``, ``p90``, ``p99``), a dict mapping status codes
+        to numbers of responses (``statuses``), the numbers of bytes sent
+        and received and the numbers of retries and timeouts.
+
+        :rtype: dict
+        """
+        with self._lock:
+            return dict(('%s %s' % key, metrics.stats())
+                for (key, metrics) in self._endpoints.items())
+
+    def reset(self):
+        "Forget all recorded metrics."
+        with self._lock:
+            self._endpoints.clear()
+
+    def to_prometheus(self, prefix='relayr_api'):
+        """
+        Return all metrics in the text exposition format of Prometheus.
+
+        :param prefix: the prefix of all metric names
+        :type prefix: string
+        :rtype: string
+        """
+        with self._lock:
+            items = sorted(self._endpoints.items())
+            lines = []
+
+            name = prefix + '_request_duration_seconds'
+            lines.append('# HELP %s Duration of API calls including retries.' % name)
+            lines.append('# TYPE %s histogram' % name)
+            for (method, template), metrics in items:
+                labels = 'method="%s",endpoint="%s"' % (_label(method), _label(template))
+                hist = metrics.latency
+                total = 0
+                for bound, count in zip(hist.buckets + ('+Inf',), hist.counts):
+                    total += count
+                    lines.append('%s_bucket{%s,le="%s"} %d' % (name, labels, bound, total))
+                lines.append('%s_sum{%s} %r' % (name, labels, hist.sum))
+                lines.append('%s_count{%s} %d' % (name, labels, hist.count))
+
+            name = prefix + '_responses_total'
+            lines.append('# HELP %s Number of API calls per response status.' % name)
+            lines.append('# TYPE %s counter' % name)
+            for (method, template), metrics in items:
+                labels = 'method="%s",endpoint="%s"' % (_label(method), _label(template))
+                for status, count in sorted(metrics.statuses.items(), key=str):
+                    lines.append('%s{%s,status="%s"} %d' % (name, labels, status, count))
+
+            counters = [
+                ('request_bytes_total', 'Number of bytes sent in request bodies.', 'bytes_sent'),
+                ('response_bytes_total', 'Number of bytes received in response bodies.', 'bytes_received'),
+                ('retries_total', 'Number of retried attempts of API calls.', 'retries'),
+                ('timeouts_total', 'Number of API calls which timed out.', 'timeouts'),
+            ]
+            for suffix, help, attr in counters:
+                name = prefix + '_' + suffix
+                lines.append('# HELP %s %s' % (name, help))
+                lines.append('# TYPE %s counter' % name)
+                for (method, template), metrics in items:
+                    labels = 'method="%s",endpoint="%s"' % (_label(method), _label(template))
+                    lines.append('%s{%s} %d' % (name, labels, getattr(metrics, attr)))
+
+        return '\n'.join(lines) + '\n'
+
+
+# The registry shared by all API objects by default.
+_default_registry = MetricsRegistry()
+
+
+def get_registry():
+    "Return the metrics registry shared by all API objects by default."
+    return _default_registry
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+
+"""
+Client-side rate limiting of API calls.
+
+This module contains a :py:class:`RateLimiter` holding token buckets for
+different groups of requests, e.g. one per API host plus one for sending
+commands to devices. Callers exceeding a budget are not rejected, but
+delayed just long enough to stay within it, in the order they arrived.
+
+Limiters are thread-safe and can be shared by many API objects. They can
+be used with ``asyncio`` as well, since the waiting time is computed
+separately from the waiting itself, see :py:meth:`RateLimiter.reserve`.
+
+Example:
+
+.. code-block:: python
+
+    from relayr import config
+    from relayr.api import Api
+    from relayr.ratelimit import RateLimiter
+
+    limiter = RateLimiter({config.relayrAPI: 20, config.relayrHistoryAPI: (5, 10)})
+    limiter.add_limit('commands', rate=2, match=lambda method, url: url.endswith('/cmd'))
+    a = Api(token='...', rate_limiter=limiter)
+"""
+
+import time
+import threading
+
+from relayr import forksafe
+from relayr.compat import monotonic
+
+
+class TokenBucket(object):
+    """
+    A thread-safe token bucket.
+
+    The bucket holds up to ``burst`` tokens and is refilled with ``rate``
+    tokens per second. Taking tokens never fails: if the bucket is empty
+    the tokens are reserved ahead and the caller is told how long to wait
+    for them, so that callers queue up smoothly.
+    """
+
+    def __init__(self, rate, burst=None):
+        """
+        :param rate: the number of tokens added per second
+        :type rate: float
+        :param burst: the capacity of the bucket (default: ``rate``, but at
+            least 1)
+        :type burst: float
+        """
+        self.rate = float(rate)
+        self.burst = float(burst or max(rate, 1))
+        self.waits = 0
+        self.waited = 0.0
+        self._tokens = self.burst
+        self._updated = monotonic()
+        self._lock = threading.Lock()
+        forksafe.register(self)
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return "%s(rate=%r, burst=%r)" % (self.__class__.__name__, self.rate, self.burst)
+
+    def reserve(self, tokens=1, max_delay=None):
+        """
+        Take tokens and return the number of seconds to wait before using them.
+
+        :param tokens: the number of tokens to take
+        :type tokens: float
+        :param max_delay: the longest acceptable wait, if the wait would be
+            longer no tokens are taken and ``None`` is returned
+        :type max_delay: float
+        :rtype: float
+        """
+        with self._lock:
+            now = monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            delay = (tokens - self._tokens) / self.rate
+            if max_delay is not None and delay > max_delay:
+                return None
+            self._tokens -= tokens
+            self.waits += 1
+            self.waited += delay
+            return delay
+
+    def refund(self, tokens=1, delay=0.0):
+        "Give back tokens taken with :py:meth:`reserve` but not used."
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + tokens)
+            if delay > 0:
+                self.waits -= 1
+                self.waited -= delay
+
+    def acquire(self, tokens=1):
+        "Take tokens, waiting until they are available."
+        delay = self.reserve(tokens)
+        if delay > 0:
+            time.sleep(delay)
+
+    def stats(self):
+        "Return a dict with the settings and waiting statistics of the bucket."
+        return {
+            'rate': self.rate,
+            'burst': self.burst,
+            'waits': self.waits,
+            'waited': self.waited,
+        }
+
+
+class RateLimiter(object):
+    """
+    A set of named token buckets for budgets of different groups of requests.
+
+    By default a limit applies to all requests with URLs starting with its
+    name, so naming a limit after an API host creates a budget for that
+    host. Requests matching several limits take a token from each one.
+    """
+
+    def __init__(self, limits=None):
+        """
+        :param limits: budgets mapping URL prefixes to rates (requests per
+            second) or ``(rate, burst)`` tuples
+        :type limits: dict
+        """
+        self._limits = []
+        for name, limit in (limits or {}).items():
+            rate, burst = limit if isinstance(limit, tuple) else (limit, None)
+            self.add_limit(name, rate, burst)
+
+    def add_limit(self, name, rate, burst=None, match=None):
+        """
+        Add a budget for a group of requests.
+
+        :param name: the name of the group, used as URL prefix if ``match``
+            is not given
+        :type name: string
+        :param rate: the number of requests per second
+        :type rate: float
+        :param burst: the number of requests which may be sent at once
+            after some idle time (default: ``rate``)
+        :type burst: float
+        :param match: a callable taking the HTTP method and URL of a
+            request and returning if the request belongs to the group
+        :type match: callable
+        """
+        if match is None:
+            prefix = name
+            match = lambda method, url: url.startswith(prefix)
+        self._limits.append((name, match, TokenBucket(rate, burst)))
+
+    def reserve(self, method, url, max_delay=None):
+        """
+        Take tokens for a request and return the number of seconds to wait.
+
+        With ``asyncio`` call this method and then ``await
+        asyncio.sleep(delay)`` instead of calling :py:meth:`acquire`.
+
+        :param method: the HTTP method of the request
+        :type method: string
+        :param url: the URL of the request
+        :type url: string
+        :param max_delay: the longest acceptable wait, e.g. the time left
+            until a deadline, if the wait would be longer no tokens are
+            taken and ``None`` is returned
+        :type max_delay: float
+        :rtype: float
+        """
+        delay = 0.0
+        taken = []
+        for name, match, bucket in self._limits:
+            if match(method, url):
+                bucket_delay = bucket.reserve(max_delay=max_delay)
+                if bucket_delay is None:
+                    for bucket, bucket_delay in taken:
+                        bucket.refund(delay=bucket_delay)
+                    return None
+                taken.append((bucket, bucket_delay))
+                delay = max(delay, bucket_delay)
+        return delay
+
+    def acquire(self, method, url):
+        "Take tokens for a request, waiting until they are available."
+        delay = self.reserve(method, url)
+        if delay > 0:
+            time.sleep(delay)
+
+    def stats(self):
+        "Return a dict mapping group names to the stats of their budgets."
+        return dict((name, bucket.stats()) for (name, match, bucket) in self._limits)
@@ -5,63 +5,316 @@ This module contains abstractions for relayr API resources.
 
 Resources may be entities such as users, publishers, applications, 
 devices, device models and transmitters.
+
+Resource objects are lazy: they are created from the fields already
+known, e.g. from a list returned by the API, and fetch the remaining
+ones with ``get_info()`` only when one of them is accessed for the first
+time. Use ``refresh()`` to fetch fresh data explicitly.
+
+Methods returning devices take an ``expand`` parameter listing nested
+resources to fetch right away, e.g. ``expand=['model']`` for the models
+of the devices.
+
+Device models are shared by many devices, so each client holds one
+:py:class:`DeviceModelRegistry` with a single instance per model ID.
+
+To keep large numbers of resources small in memory, the known fields of
+each resource class are stored in ``__slots__``. Unknown fields, e.g. new
+ones of the API, are kept in an extra dict created only when needed, and
+can be accessed like the known ones.
+
+Clients created with ``identity_map=True`` keep their resources in an
+:py:class:`IdentityMap`, returning the same object for the same resource
+type and ID everywhere, so it is fetched only once and shared.
 """
 
-import warnings
+import sys
+import weakref
+import threading
+import collections
 
-from relayr import exceptions
-from relayr.dataconnection import MqttStream as Connection
+from relayr import config
+from relayr import forksafe
+from relayr.compat import monotonic
 from relayr.utils.misc import get_start_end, datetime_to_millis
 
 
-class User(object):
-    "A Relayr user."
+def __getattr__(name):
+    # import the MQTT machinery only when it is used
+    if name == 'Connection':
+        from relayr.dataconnection import MqttStream
+        return MqttStream
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
 
-    def __init__(self, id=None, client=None):
+if sys.version_info < (3, 7):
+    # no lazy module attributes
+    from relayr.dataconnection import MqttStream as Connection
+
+
+# the names of the fields in the slots of resource classes
+_field_names = {}
+
+
+class Resource(object):
+    """
+    Base class of relayr API resources.
+
+    Accessing an attribute which is not set yet fetches all fields of the
+    resource once with ``get_info()``, if the resource has an ID, a client
+    and a ``get_info()`` method. Objects whose other fields are never used
+    thus cost no request at all.
+
+    Subclasses list their known fields in ``__slots__``.
+    """
+
+    __slots__ = ('id', 'client', '_loaded', '_fetched', '_extra', '__weakref__')
+
+    def __init__(self, id=None, client=None, **fields):
+        """
+        :param id: the UUID of the resource
+        :type id: string
+        :param client: the client used for fetching more fields
+        :type client: :py:class:`relayr.client.Client`
+        :param fields: fields of the resource already known
+        """
         self.id = id
         self.client = client
+        self._loaded = False
+        self._fetched = None
+        self._extra = None
+        self._update(fields)
+
+    @classmethod
+    def _create(cls, client, **fields):
+        """
+        Return a resource with some fields, from the client's identity map
+        if it has one.
+        """
+        identity_map = getattr(client, 'identity_map', None)
+        if identity_map is None or fields.get('id') is None:
+            return cls(client=client, **fields)
+        return identity_map.resolve(cls, client, fields)
 
     def __repr__(self):
         return "%s(id=%r)" % (self.__class__.__name__, self.id)
 
+    def __setattr__(self, name, value):
+        try:
+            object.__setattr__(self, name, value)
+        except AttributeError:
+            # a field without a slot
+            if self._extra is None:
+                object.__setattr__(self, '_extra', {})
+            self._extra[name] = value
+
+    def __getattr__(self, name):
+        # only called for attributes which are not set
+        if not name.startswith('_'):
+            extra = self._extra
+            if extra is not None and name in extra:
+                return extra[name]
+            if self._can_fetch():
+                self.refresh()
+                return getattr(self, name)
+        raise AttributeError("%r object has no attribute %r" %
+            (self.__class__.__name__, name))
+
+    def __delattr__(self, name):
+        try:
+            object.__delattr__(self, name)
+        except AttributeError:
+            if self._extra is None or name not in self._extra:
+                raise
+            del self._extra[name]
+
+    def _field(self, name):
+        "Return a field or ``None`` if it is not set, without fetching it."
+        try:
+            return object.__getattribute__(self, name)
+        except AttributeError:
+            return (self._extra or {}).get(name)
+
+    def _can_fetch(self):
+        "Return whether the resource has fields not fetched yet."
+        return (not self._loaded and self.id is not None
+            and self.client is not None and hasattr(type(self), 'get_info'))
+
+    def _fields(self):
+        "Return a dict with all fields of the resource which are set."
+        cls = type(self)
+        names = _field_names.get(cls)
+        if names is None:
+            names = _field_names[cls] = [name for c in cls.__mro__
+                for name in c.__dict__.get('__slots__', ())
+                if not name.startswith('_') and name != 'client']
+        fields = {}
+        for name in names:
+            try:
+                fields[name] = object.__getattribute__(self, name)
+            except AttributeError:
+                pass
+        if self._extra:
+            fields.update(self._extra)
+        return fields
+
+    def _update(self, fields):
+        "Store fields received from the API as instance attributes."
+        for k, v in fields.items():
+            setattr(self, k, v)
+
+    def _set_info(self, fields):
+        "Store all fields of the resource received from ``get_info()``."
+        self._update(fields)
+        self._loaded = True
+        self._fetched = monotonic()
+
+    def _set_updated(self, fields):
+        "Store the fields returned by an update, dropping all others."
+        self._invalidate()
+        self._update(fields or {})
+
+    def _invalidate(self):
+        "Drop all fields but the ID, so they are fetched again when used."
+        for name in self._fields():
+            if name != 'id':
+                delattr(self, name)
+        self._loaded = False
+        self._fetched = None
+
+    def _forget(self):
+        "Remove the resource from the client's identity map, e.g. when deleted."
+        identity_map = getattr(self.client, 'identity_map', None)
+        if identity_map is not None:
+            identity_map.discard(self)
+
+    def _is_fresh(self):
+        "Return whether fetching the resource again can be skipped."
+        return False
+
+    def refresh(self):
+        """
+        Fetches all fields of the resource again.
+
+        :rtype: self
+        """
+        self._loaded = True
+        try:
+            self.get_info()
+        except Exception:
+            self._loaded = False
+            raise
+        return self
+
+
+def _fetch(resources, workers=None):
+    """
+    Fetches resources concurrently with ``Api.batch()``.
+
+    If fetching any resource fails, the first exception is raised after
+    all others are done.
+
+    :param resources: the resources
+    :type resources: list
+    :param workers: the number of concurrent requests (default: adjusted
+        to the load of the API, up to the size of the connection pool)
+    :type workers: integer
+    """
+    api = getattr(resources[0].client, 'api', None) if resources else None
+    if len(resources) < 2 or api is None:
+        for obj in resources:
+            obj.refresh()
+        return
+    res = api.batch(Resource.refresh, resources, workers)
+    if res.errors:
+        raise res.errors[min(res.errors)]
+
+
+def _expand(resources, paths, workers=None):
+    """
+    Fetches nested resources of some resources, e.g. the models of devices.
+
+    Each path names an attribute holding a resource or a list of resources,
+    nested attributes are separated by dots, e.g. ``'devices.model'`` for
+    the models of the devices of groups. Only the resources at the end of
+    a path are fetched, each distinct one only once, no matter how many
+    resources refer to it, and concurrently. Resources on the way lacking
+    the next attribute are fetched first, concurrently, too.
+
+    :param resources: the resources
+    :type resources: list
+    :param paths: the attribute paths of the nested resources to fetch
+    :type paths: list of strings
+    :param workers: the number of concurrent requests
+    :type workers: integer
+    """
+    for path in paths or ():
+        objects = resources
+        for name in path.split('.'):
+            unfetched = collections.OrderedDict((id(obj), obj) for obj in objects
+                if obj._field(name) is None and obj._can_fetch())
+            _fetch(list(unfetched.values()), workers)
+            nested = []
+            for obj in objects:
+                value = obj._field(name)
+                if isinstance(value, Resource):
+                    nested.append(value)
+                elif isinstance(value, list):
+                    nested.extend(v for v in value if isinstance(v, Resource))
+            objects = nested
+        distinct = collections.OrderedDict()
+        for obj in objects:
+            if not obj._is_fresh():
+                distinct.setdefault((type(obj), obj.id), []).append(obj)
+        _fetch([same[0] for same in distinct.values()], workers)
+        for same in distinct.values():
+            fields = same[0]._fields()
+            # a position belongs to the list a resource appears in, e.g. a group
+            fields.pop('position', None)
+            for obj in same[1:]:
+                if obj is not same[0]:
+                    obj._set_info(fields)
+
+
+class User(Resource):
+    "A Relayr user."
+
+    __slots__ = ('name', 'email')
+
     def get_publishers(self):
         "Return a generator of the publishers of the user."
 
         for pub_json in self.client.api.get_user_publishers(self.id):
-            p = Publisher(pub_json['id'], client=self.client)
-            for k in pub_json:
-                setattr(p, k, pub_json[k])
-            yield p
+            yield Publisher._create(self.client, **pub_json)
 
     def get_apps(self):
         "Returns a generator of the apps of the user."
 
         for app_json in self.client.api.get_user_apps(self.id):
             ## TODO: change 'app' field to 'id' in API?
-            app = App(app_json['app'], client=self.client)
-            app.get_info()
-            yield app
+            yield App._create(self.client, id=app_json['app'])
 
     def get_transmitters(self):
         "Returns a generator of the transmitters of the user."
 
         for trans_json in self.client.api.get_user_transmitters(self.id):
-            trans = Transmitter(trans_json['id'], client=self.client)
-            trans.get_info()
-            yield trans
+            yield Transmitter._create(self.client, **trans_json)
 
-    def get_devices(self):
-        "Returns a generator of the devices of the user."
+    def get_devices(self, expand=None):
+        """
+        Returns a generator of the devices of the user.
 
-        for dev_json in self.client.api.get_user_devices(self.id):
-            dev = Device(dev_json['id'], client=self.client)
-            dev.get_info()
+        :param expand: nested resources to fetch, e.g. ``['model']``
+        :type expand: list of strings
+        """
+        devices = [Device._create(self.client, **dev_json)
+            for dev_json in self.client.api.get_user_devices(self.id)]
+        _expand(devices, expand)
+        for dev in devices:
             yield dev
 
     def update(self, name=None, email=None):
         res = self.client.api.patch_user(self.id, name=name, email=email)
-        for k in res:
-            setattr(self, k, res[k])
+        self._set_updated(res)
         return self
 
     ## TODO: rename to 'registered_wunderbar_devices'?
@@ -74,12 +327,9 @@ class User(object):
         res = self.client.api.post_user_wunderbar(self.id)
         for k, v in res.items():
             if 'model' in v:
-                item = Device(res[k]['id'], client=self.client)
-                item.get_info()
+                yield Device._create(self.client, **v)
             else:
-                item = Transmitter(res[k]['id'], client=self.client)
-                item.get_info()
-            yield item
+                yield Transmitter._create(self.client, **v)
 
     def remove_wunderbar(self):
         """
@@ -88,18 +338,18 @@ class User(object):
         res = self.client.api.post_users_destroy(self.id)
         return res
 
-    def get_bookmarked_devices(self):
+    def get_bookmarked_devices(self, expand=None):
         """
         Retrieves a list of bookmarked devices.
 
+        :param expand: nested resources to fetch, e.g. ``['model']``
+        :type expand: list of strings
         :rtype: list of device objects
         """
         res = self.client.api.get_user_devices_bookmarks(self.id)
-        for dev in res:
-            d = Device(dev['id'], client=self.client)
-            for k, v in dev.items():
-                setattr(d, k, v)
-            d.get_info()
+        devices = [Device._create(self.client, **dev) for dev in res]
+        _expand(devices, expand)
+        for d in devices:
             yield d
 
     def bookmark_device(self, device):
@@ -110,7 +360,7 @@ class User(object):
         return res
 
 
-class Publisher(object):
+class Publisher(Resource):
     """
     A relayr publisher.
 
@@ -119,12 +369,7 @@ class Publisher(object):
     applications it has published on the relayr platform.
     """
 
-    def __init__(self, id=None, client=None):
-        self.id = id
-        self.client = client
-
-    def __repr__(self):
-        return "%s(id=%r)" % (self.__class__.__name__, self.id)
+    __slots__ = ('name', 'owner')
 
     def get_apps(self, extended=False):
         """
@@ -146,9 +391,7 @@ class Publisher(object):
             func = self.client.api.get_publisher_apps_extended
         res = func(self.id)
         for a in res:
-            app = App(a['id'], client=self.client)
-            app.get_info(extended=extended)
-            yield app
+            yield App._create(self.client, **a)
 
 
     def update(self, name=None):
@@ -158,9 +401,8 @@ class Publisher(object):
         :param name: the user email to be set
         :type name: string
         """
-        res = self.api.patch_publisher(self.id, name=name)
-        for k in res:
-            setattr(self, k, res[k])
+        res = self.client.api.patch_publisher(self.id, name=name)
+        self._set_updated(res)
         return self
 
     def register(self, name, id, publisher):
@@ -178,10 +420,11 @@ class Publisher(object):
         """
         Deletes the publisher from the relayr platform.
         """
-        res = self.api.delete_publisher(self.id)
+        res = self.client.api.delete_publisher(self.id)
+        self._forget()
 
 
-class App(object):
+class App(Resource):
     """
     A relayr application.
     
@@ -189,14 +432,10 @@ class App(object):
     registered to and deleted from the relayr platform. it can be connected 
     to and disconnected from devices.
     """
-    
-    def __init__(self, id=None, client=None):
-        self.id = id
-        self.client = client
-
-    def __repr__(self):
-        return "%s(id=%r)" % (self.__class__.__name__, self.id)
 
+    __slots__ = ('name', 'description', 'publisher', 'clientId', 'clientSecret',
+        'redirectUri')
+    
     def get_info(self, extended=False):
         """
         Get application info.
@@ -216,8 +455,7 @@ class App(object):
         if extended:
             func = self.client.api.get_app_info_extended
         res = func(self.id)
-        for k in res:
-            setattr(self, k, res[k])
+        self._set_info(res)
         return self
 
     def update(self, description=None, name=None, redirectUri=None):
@@ -233,15 +471,15 @@ class App(object):
         """
         res = self.client.api.patch_app(self.id, description=description,
             name=name, redirectUri=redirectUri)
-        for k in res:
-            setattr(self, k, res[k])
+        self._set_updated(res)
         return self
 
     def delete(self):
         """
         Deletes the app from the relayr platform.
         """
-        res = self.api.delete_publisher(self.id)
+        res = self.client.api.delete_app(self.id)
+        self._forget()
 
     def register(self, name, publisher):
         """
@@ -255,16 +493,21 @@ class App(object):
         raise NotImplementedError
 
 
-class Group(object):
+class Group(Resource):
     """
     A relayr device group.
 
     A device group is simply an ordered list of devices with its own ID,
     name and owner. The position of the group is the one where it appears
     when asking for the list of all groups. This position can be changed.
+
+    The positions of the devices in the group are kept in ``positions``,
+    a dict mapping device IDs to positions.
     """
 
-    def __init__(self, id=None, client=None):
+    __slots__ = ('name', 'owner', 'position', 'devices', 'positions')
+
+    def __init__(self, id=None, client=None, **fields):
         """
         Instantiate new device group with given UUID and API client.
 
@@ -274,12 +517,9 @@ class Group(object):
         :type client: :py:class:`relayr.client.Client`
         :rtype: self
         """
-        self.id = id
         self.devices = []
-        self.client = client
-
-    def __repr__(self):
-        return "%s(id=%r)" % (self.__class__.__name__, self.id)
+        self.positions = {}
+        super(Group, self).__init__(id=id, client=client, **fields)
 
     def create(self, name, owner=None):
         """
@@ -297,27 +537,43 @@ class Group(object):
             self.id = res['id']
         return self
 
-    def get_info(self):
+    def get_info(self, expand=None, workers=None):
         """
         Retrieves device group info and stores it as instance attributes.
 
+        The devices of the group are created from the group info in their
+        order and replace the ones of earlier calls. Their positions in the
+        group are stored in ``positions``, and also in the ``position``
+        field of the devices unless the client has an identity map, which
+        shares devices between groups. Use ``expand`` for fetching
+        more, e.g. ``['devices', 'devices.model']`` for all fields of the
+        devices and their models, which are fetched concurrently.
+
+        :param expand: nested resources to fetch
+        :type expand: list of strings
+        :param workers: the number of concurrent requests for ``expand``
+            (default: adjusted to the load of the API)
+        :type workers: integer
         :rtype: self.
         """
 
         res = self.client.api.get_user_device_group(self.id)
-        for k in res:
-            if k == 'devices':
-                for res2 in res[k]:
-                    d = Device(res2['id'], client=self.client)
-                    d.get_info()
-                    # add position field used in a group context
-                    if 'position' in res2:
-                        d.position = res2['position']
-                    self.devices.append(d)
-            else:
-                setattr(self, k, res[k])
+        self._set_info(res)
+        _expand([self], expand, workers)
         return self
 
+    def _update(self, fields):
+        for k, v in fields.items():
+            if k == 'devices':
+                self.positions = dict((d['id'], d['position'])
+                    for d in v if 'position' in d)
+                if getattr(self.client, 'identity_map', None) is not None:
+                    # the position belongs to this group, not the shared device
+                    v = [dict((k2, v2) for (k2, v2) in d.items() if k2 != 'position')
+                        for d in v]
+                v = [Device._create(self.client, **d) for d in v]
+            setattr(self, k, v)
+
     def update(self, name=None, position=None):
         """
         Updates position of this group in the list of all groups.
@@ -329,8 +585,9 @@ class Group(object):
         :rtype: self
         """
 
-        # returns None
+        # returns None, so the changed fields are fetched again when used
         self.client.api.patch_user_device_group(self.id, name=name, position=position)
+        self._invalidate()
         return self
 
     def delete(self):
@@ -341,6 +598,7 @@ class Group(object):
         """
 
         res = self.client.api.delete_user_device_group(self.id)
+        self._forget()
         return self
 
     def add_device(self, device):
@@ -382,34 +640,39 @@ class Group(object):
         return self
 
 
-class Device(object):
+class Device(Resource):
     """
     A relayr device.
     """
 
-    def __init__(self, id=None, client=None):
-        self.id = id
-        self.client = client
-
-    def __repr__(self):
-        return "%s(id=%r)" % (self.__class__.__name__, self.id)
+    __slots__ = ('name', 'description', 'owner', 'model', 'public', 'secret',
+        'firmwareVersion', 'integrationType', 'position')
 
-    def get_info(self):
+    def get_info(self, expand=None):
         """
         Retrieves device info and stores it as instance attributes.
 
+        :param expand: nested resources to fetch, e.g. ``['model']``
+        :type expand: list of strings
         :rtype: self.
         """
 
         res = self.client.api.get_device(self.id)
-        for k in res:
-            if k == 'model':
-                self.model = DeviceModel(res[k]['id'], client=self.client)
-                self.model.get_info()
-            else:
-                setattr(self, k, res[k])
+        self._set_info(res)
+        _expand([self], expand)
         return self
 
+    def _update(self, fields):
+        for k, v in fields.items():
+            if k == 'model' and isinstance(v, dict):
+                # the model fetches its remaining fields when needed
+                registry = getattr(self.client, 'device_models', None)
+                if registry is not None:
+                    v = registry.get(**v)
+                else:
+                    v = DeviceModel(client=self.client, **v)
+            setattr(self, k, v)
+
     def update(self, description=None, name=None, modelID=None, public=None):
         """
         Updates certain fields in the device information.
@@ -427,8 +690,7 @@ class Device(object):
 
         res = self.client.api.patch_device(self.id, description=description,
             name=name, modelID=modelID, public=public)
-        for k in res:
-            setattr(self, k, res[k])
+        self._set_updated(res)
         return self
 
     def get_connected_apps(self):
@@ -438,9 +700,7 @@ class Device(object):
         :rtype: A list of apps.
         """
         for app_json in self.client.api.get_device_apps(self.id):
-            app = App(id=app_json['id'], client=self.client)
-            app.get_info()
-            yield app
+            yield App._create(self.client, **app_json)
 
     def send_command(self, command):
         """
@@ -486,6 +746,7 @@ class Device(object):
         """
         
         res = self.client.api.delete_device(self.id)
+        self._forget()
         return self
 
     def switch_led_on(self, bool=True):
@@ -523,6 +784,25 @@ class Device(object):
             start=start, end=end, meaning=meaning, sample=sample, offset=offset, limit=limit)
         return res
 
+    def iter_data(self, start=None, end=None, duration=None, meaning=None, sample=None, offset=None, limit=None, chunk_size=None):
+        """
+        Iterate over a chunk of historical data recorded in the past for this device.
+
+        This works like :py:meth:`get_data`, but yields the data points
+        one at a time (or in lists of up to ``chunk_size`` points) while
+        they are being received, without loading the whole page into memory.
+
+        :param chunk_size: yield lists of up to this many data points
+        :type chunk_size: integer
+        :rtype: a generator of data points
+        """
+        start, end = get_start_end(start=start, end=end, duration=duration)
+        start = datetime_to_millis(start)
+        end = datetime_to_millis(end)
+        return self.client.api.iter_history_devices(self.id,
+            start=start, end=end, meaning=meaning, sample=sample, offset=offset,
+            limit=limit, chunk_size=chunk_size)
+
     # new methods for transport channels
 
     def create_channel(self, transport):
@@ -544,18 +824,14 @@ class Device(object):
         return res
 
 
-class DeviceModel(object):
+class DeviceModel(Resource):
     """
     relayr device model.
     """
-    
-    def __init__(self, id=None, client=None):
-        self.id = id
-        self.client = client
-
-    def __repr__(self):
-        return "%s(id=%r)" % (self.__class__.__name__, self.id)
 
+    __slots__ = ('name', 'description', 'manufacturer', 'readings', 'commands',
+        'configurations', 'firmwareVersions')
+    
     def get_info(self):
         """
         Returns device model info and stores it as instance attributes.
@@ -563,29 +839,130 @@ class DeviceModel(object):
         :rtype: self.
         """
         res = self.client.api.get_device_model(self.id)
-        for k, v in res.items():
-            setattr(self, k, v)
+        self._set_info(res)
         return self
 
+    def _is_fresh(self):
+        registry = getattr(self.client, 'device_models', None)
+        return registry is not None and registry.is_fresh(self)
 
-class Transmitter(object):
-    "A relayr transmitter, The Master Module, for example."
-    
-    def __init__(self, id=None, client=None):
-        self.id = id
+
+class DeviceModelRegistry(object):
+    """
+    The device models of a client, with one instance per model ID.
+
+    Thousands of devices usually share a handful of device models. Devices
+    created by the client take their models from this registry, so each
+    model exists only once in memory and is fetched only once, until its
+    data is older than ``ttl`` seconds. Such a stale model drops its fields
+    when it is looked up again, e.g. when listing devices, so they are
+    fetched again on their next use. :py:meth:`preload` fetches all
+    public device models with a single request.
+
+    Example:
+
+    .. code-block:: python
+
+        c = Client(token='...')
+        c.device_models.preload()
+        for d in c.get_user().get_devices(expand=['model']):
+            print(d.model.name)
+    """
+
+    def __init__(self, client, ttl=None):
+        """
+        :param client: the client fetching the device models
+        :type client: :py:class:`relayr.client.Client`
+        :param ttl: the number of seconds fetched models are considered fresh
+            (default: ``config.DEVICE_MODEL_TTL``)
+        :type ttl: float
+        """
         self.client = client
+        self.ttl = config.DEVICE_MODEL_TTL if ttl is None else ttl
+        self._models = {}
+        self._lock = threading.Lock()
+        forksafe.register(self)
 
-    def __repr__(self):
-        args = (self.__class__.__name__, self.id)
-        return "%s(id=%r)" % args
+    def _after_fork(self):
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._models)
 
+    def __contains__(self, id):
+        return id in self._models
+
+    def get(self, id, **fields):
+        """
+        Returns the device model with some ID, without fetching it.
+
+        A new model is created from the given fields, an existing one gets
+        those fields it doesn't have yet, after dropping all of them if it
+        was fetched more than ``ttl`` seconds ago.
+
+        :param id: the UUID of the device model
+        :type id: string
+        :rtype: :py:class:`DeviceModel`
+        """
+        with self._lock:
+            model = self._models.get(id)
+            if model is None:
+                model = self._models[id] = DeviceModel(id, client=self.client, **fields)
+                return model
+        if model._fetched is not None and not self.is_fresh(model):
+            model._invalidate()
+        known = model._fields()
+        model._update(dict((k, v) for (k, v) in fields.items()
+            if k not in known))
+        return model
+
+    def is_fresh(self, model):
+        "Return whether a model of this registry was fetched less than ``ttl`` seconds ago."
+        fetched = model._fetched
+        return (self._models.get(model.id) is model and fetched is not None
+            and monotonic() - fetched < self.ttl)
+
+    def load(self, id):
+        """
+        Returns the device model with some ID, fetching it if it isn't fresh.
+
+        :param id: the UUID of the device model
+        :type id: string
+        :rtype: :py:class:`DeviceModel`
+        """
+        model = self.get(id)
+        if not self.is_fresh(model):
+            model.refresh()
+        return model
+
+    def preload(self):
+        """
+        Fetches all public device models with a single request.
+
+        :rtype: the number of device models
+        """
+        res = self.client.api.get_public_device_models()
+        for dm in res:
+            self.get(dm['id'])._set_info(dm)
+        return len(res)
+
+    def clear(self):
+        "Forgets all device models."
+        with self._lock:
+            self._models.clear()
+
+
+class Transmitter(Resource):
+    "A relayr transmitter, The Master Module, for example."
+
+    __slots__ = ('name', 'owner', 'secret', 'integrationType', 'credentials')
+    
     def get_info(self):
         """
         Retrieves transmitter info.
         """
         res = self.client.api.get_transmitter(self.id)
-        for k, v in res.items():
-            setattr(self, k, v)
+        self._set_info(res)
         return self
 
     def delete(self):
@@ -596,6 +973,7 @@ class Transmitter(object):
         """
         
         res = self.client.api.delete_transmitter(self.id)
+        self._forget()
         return self
 
     def update(self, name=None):
@@ -603,18 +981,146 @@ class Transmitter(object):
         Updates transmitter info.
         """
         res = self.client.api.patch_transmitter(self.id, name=name)
-        for k, v in res.items():
-            setattr(self, k, v)
+        self._set_updated(res)
         return self
 
-    def get_connected_devices(self):
+    def get_connected_devices(self, expand=None, workers=None):
         """
         Returns a list of devices connected to the specific transmitter.
         
+        :param expand: nested resources to fetch, e.g. ``['model']``
+        :type expand: list of strings
+        :param workers: the number of concurrent requests for ``expand``
+            (default: adjusted to the load of the API)
+        :type workers: integer
         :rtype: A list of devices.
         """
         res = self.client.api.get_transmitter_devices(self.id)
-        for d in res:
-            dev = Device(d['id'], client=self.client)
-            dev.get_info()
+        devices = [Device._create(self.client, **d) for d in res]
+        _expand(devices, expand, workers)
+        for dev in devices:
             yield dev
+
+
+class IdentityMap(object):
+    """
+    The resources of a client, with one object per resource type and ID.
+
+    Resources are kept while they are used anywhere else, and the ``size``
+    most recently used ones also while they aren't. Resources whose data
+    is older than ``ttl`` seconds (if ``ttl`` is not 0) drop all fields
+    when they are looked up again, so these are fetched again when used.
+    Deleted resources are removed from the map.
+
+    Example:
+
+    .. code-block:: python
+
+        c = Client(token='...', identity_map=True)
+        d = c.get_device('...')
+        assert d is c.get_device(d.id)
+    """
+
+    def __init__(self, size=None, ttl=None):
+        """
+        :param size: the number of recently used resources kept even if not
+            used elsewhere (default: ``config.IDENTITY_MAP_SIZE``)
+        :type size: integer
+        :param ttl: the number of seconds after which the data of resources
+            is stale, 0 for never (default: ``config.IDENTITY_MAP_TTL``)
+        :type ttl: float
+        """
+        self.size = config.IDENTITY_MAP_SIZE if size is None else size
+        self.ttl = config.IDENTITY_MAP_TTL if ttl is None else ttl
+        self.hits = 0
+        self.misses = 0
+        self._objects = weakref.WeakValueDictionary()
+        self._recent = collections.OrderedDict()
+        self._lock = threading.Lock()
+        forksafe.register(self)
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._objects)
+
+    def _touch(self, key, obj):
+        # to be called with the lock held
+        self._recent.pop(key, None)
+        self._recent[key] = obj
+        while len(self._recent) > self.size:
+            self._recent.popitem(last=False)
+
+    def get(self, cls, id):
+        """
+        Returns the resource of some type and ID if it is in the map.
+
+        :param cls: the resource class, e.g. :py:class:`Device`
+        :type cls: class
+        :param id: the UUID of the resource
+        :type id: string
+        :rtype: the resource or ``None``
+        """
+        with self._lock:
+            obj = self._objects.get((cls, id))
+            if obj is not None:
+                self._touch((cls, id), obj)
+            return obj
+
+    def resolve(self, cls, client, fields):
+        """
+        Returns the resource with some fields, creating it if needed.
+
+        An existing resource is updated with the given fields.
+
+        :param cls: the resource class, e.g. :py:class:`Device`
+        :type cls: class
+        :param client: the client of a new resource
+        :type client: :py:class:`relayr.client.Client`
+        :param fields: the fields received from the API, including ``id``
+        :type fields: dict
+        :rtype: the resource
+        """
+        now = monotonic()
+        key = (cls, fields['id'])
+        obj = self.get(cls, fields['id'])
+        if obj is None:
+            # create it outside the lock, it may create nested resources
+            new = cls(client=client, **fields)
+            with self._lock:
+                obj = self._objects.setdefault(key, new)
+                self._touch(key, obj)
+                if obj is new:
+                    self.misses += 1
+                else:
+                    self.hits += 1
+        else:
+            with self._lock:
+                self.hits += 1
+            new = None
+        if obj is not new:
+            if self.ttl and obj._fetched is not None and now - obj._fetched > self.ttl:
+                obj._invalidate()
+            obj._update(fields)
+        if len(fields) > 1:
+            obj._fetched = now
+        return obj
+
+    def discard(self, obj):
+        "Removes a resource from the map."
+        key = (type(obj), obj.id)
+        with self._lock:
+            if self._objects.get(key) is obj:
+                del self._objects[key]
+                self._recent.pop(key, None)
+
+    def clear(self):
+        "Forgets all resources."
+        with self._lock:
+            self._objects.clear()
+            self._recent.clear()
+
+    def stats(self):
+        "Return a dict with the numbers of resources, hits and misses."
+        return {'size': len(self._objects), 'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+
+"""
+Retrying failed API calls and failing fast while the API is down.
+
+This module contains a :py:class:`RetryPolicy` deciding which failed
+requests are repeated and how long to wait before, plus a
+:py:class:`CircuitBreaker` rejecting requests to a host after a series
+of failures until the host has had some time to recover. Circuit
+breakers are shared by all API objects in a process, one per host.
+"""
+
+import time
+import random
+import threading
+
+from relayr import forksafe
+from relayr.compat import monotonic
+
+
+def parse_retry_after(value):
+    """
+    Return the delay in seconds given in a ``Retry-After`` header or ``None``.
+
+    The header value can be a number of seconds or an HTTP date.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    # only needed for dates, which are rarely used
+    from email.utils import parsedate_tz, mktime_tz
+    date = parsedate_tz(value)
+    if date is None:
+        return None
+    return max(0.0, mktime_tz(date) - time.time())
+
+
+class RetryPolicy(object):
+    """
+    A policy for retrying failed requests with exponential backoff.
+
+    By default only requests with idempotent methods are retried, after
+    connection errors or responses with a status code indicating a
+    temporary problem, like ``429 Too Many Requests`` or ``503 Service
+    Unavailable``. The delay before retry number ``n`` (counting from 0)
+    is a random value up to ``backoff_factor * 2 ** n`` seconds ("full
+    jitter") or the delay requested by the server in a ``Retry-After``
+    header, both limited to ``max_backoff`` seconds.
+    """
+
+    def __init__(self, total=3, backoff_factor=0.5, max_backoff=30.0, jitter=True,
+                 statuses=(429, 502, 503, 504),
+                 methods=('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE')):
+        """
+        :param total: the maximum number of retries per request
+        :type total: integer
+        :param backoff_factor: the base delay in seconds
+        :type backoff_factor: float
+        :param max_backoff: the maximum delay in seconds
+        :type max_backoff: float
+        :param jitter: randomize delays to avoid many clients retrying in sync
+        :type jitter: boolean
+        :param statuses: HTTP status codes of responses to be retried
+        :type statuses: sequence of integers
+        :param methods: HTTP methods of requests which may be retried
+        :type methods: sequence of strings
+        """
+        self.total = total
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.statuses = frozenset(statuses)
+        self.methods = frozenset(m.upper() for m in methods)
+
+    def __repr__(self):
+        return "%s(total=%r)" % (self.__class__.__name__, self.total)
+
+    def is_retryable(self, method, attempt, status=None):
+        """
+        Return if a request should be retried.
+
+        :param method: the HTTP method of the request
+        :type method: string
+        :param attempt: the number of retries done so far
+        :type attempt: integer
+        :param status: the response status code or ``None`` for a
+            connection error
+        :type status: integer
+        :rtype: boolean
+        """
+        if attempt >= self.total or method.upper() not in self.methods:
+            return False
+        return status is None or status in self.statuses
+
+    def backoff(self, attempt, retry_after=None):
+        """
+        Return the delay in seconds before a retry.
+
+        :param attempt: the number of retries done so far
+        :type attempt: integer
+        :param retry_after: the delay requested by the server, if any
+        :type retry_after: float
+        :rtype: float
+        """
+        if retry_after is not None:
+            return min(retry_after, self.max_backoff)
+        delay = min(self.backoff_factor * 2 ** attempt, self.max_backoff)
+        if self.jitter:
+            delay = random.uniform(0, delay)
+        return delay
+
+
+class CircuitBreaker(object):
+    """
+    A circuit breaker for the requests to one host.
+
+    The breaker is *closed* while requests succeed. After
+    ``failure_threshold`` consecutive failures (connection errors or
+    server errors) it *opens* and rejects all requests for
+    ``recovery_timeout`` seconds. Then it becomes *half-open* and lets a
+    single trial request pass: if that one succeeds the breaker closes
+    again, otherwise it opens again.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, failure_threshold=5, recovery_timeout=30.0):
+        """
+        :param failure_threshold: the number of consecutive failures opening
+            the breaker
+        :type failure_threshold: integer
+        :param recovery_timeout: the number of seconds before a trial request
+            is allowed on an open breaker
+        :type recovery_timeout: float
+        """
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.total_failures = 0
+        self.rejected = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return "%s(state=%r)" % (self.__class__.__name__, self.state)
+
+    def allow(self):
+        "Return if a request may be sent now."
+        with self._lock:
+            if self.state == self.OPEN:
+                if monotonic() - self.opened_at < self.recovery_timeout:
+                    self.rejected += 1
+                    return False
+                self.state = self.HALF_OPEN
+                self._trial = False
+            if self.state == self.HALF_OPEN:
+                if self._trial:
+                    self.rejected += 1
+                    return False
+                self._trial = True
+            return True
+
+    def release(self):
+        """
+        Give up the permission of :py:meth:`allow` for a request which got
+        no result to record, e.g. because it was aborted.
+        """
+        with self._lock:
+            self._trial = False
+
+    def record_success(self):
+        "Record a request which got a response from the host."
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._trial = False
+
+    def record_failure(self):
+        "Record a request which failed because of the host."
+        with self._lock:
+            self.failures += 1
+            self.total_failures += 1
+            self._trial = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = monotonic()
+
+    def stats(self):
+        "Return a dict describing the state of the breaker."
+        with self._lock:
+            return {
+                'state': self.state,
+                'failures': self.failures,
+                'total_failures': self.total_failures,
+                'rejected': self.rejected,
+            }
+
+
+# circuit breakers shared by all API objects, one per host
+_circuit_breakers = {}
+_circuit_breakers_lock = threading.Lock()
+
+
+def _reset_circuit_breaker_locks():
+    global _circuit_breakers_lock
+    _circuit_breakers_lock = threading.Lock()
+    for breaker in _circuit_breakers.values():
+        breaker._lock = threading.Lock()
+
+forksafe.register_hook(_reset_circuit_breaker_locks)
+
+
+def get_circuit_breaker(host, failure_threshold=5, recovery_timeout=30.0):
+    """
+    Return the circuit breaker for a host, create it first if needed.
+
+    The parameters are used only when creating a new breaker.
+
+    :param host: the host name, optionally with port
+    :type host: string
+    :rtype: :py:class:`CircuitBreaker`
+    """
+    with _circuit_breakers_lock:
+        breaker = _circuit_breakers.get(host)
+        if breaker is None:
+            breaker = CircuitBreaker(failure_threshold, recovery_timeout)
+            _circuit_breakers[host] = breaker
+        return breaker
+
+
+def circuit_breaker_stats():
+    "Return a dict mapping hosts to the stats of their circuit breakers."
+    with _circuit_breakers_lock:
+        breakers = dict(_circuit_breakers)
+    return dict((host, b.stats()) for (host, b) in breakers.items())
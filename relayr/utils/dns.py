@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+
+"""
+A small DNS cache for the relayr API hosts.
+
+Python resolves host names anew for every connection it opens, so a
+pool opening many connections, e.g. when warming up, asks the resolver
+many times for the same few names. With :py:func:`enable_dns_cache` the
+addresses of the relayr hosts are kept for a limited time instead, all
+other host names are resolved as usual.
+
+The cache works by wrapping ``socket.getaddrinfo`` for the whole
+process, so it is only enabled on request, e.g. by setting the
+``RELAYR_DNS_CACHE_TTL`` environment variable to a number of seconds.
+"""
+
+import socket
+import threading
+
+from relayr import forksafe
+from relayr.compat import monotonic
+
+
+class DnsCache(object):
+    """
+    A thread-safe cache of ``socket.getaddrinfo`` results for some hosts.
+
+    Failed lookups are not cached.
+    """
+
+    def __init__(self, hosts, ttl=60, getaddrinfo=None):
+        """
+        :param hosts: the host names whose addresses are cached
+        :type hosts: iterable
+        :param ttl: the number of seconds addresses are kept
+        :type ttl: float
+        :param getaddrinfo: the function doing the actual lookups (default:
+            ``socket.getaddrinfo``)
+        :type getaddrinfo: callable
+        """
+        self.hosts = set(hosts)
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._getaddrinfo = getaddrinfo or socket.getaddrinfo
+        self._entries = {}
+        self._lock = threading.Lock()
+        forksafe.register(self)
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+
+    def getaddrinfo(self, host, port, *args, **kwargs):
+        "Like ``socket.getaddrinfo``, but return cached results for known hosts."
+        if host not in self.hosts:
+            return self._getaddrinfo(host, port, *args, **kwargs)
+        key = (host, port, args, tuple(sorted(kwargs.items())))
+        now = monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self.hits += 1
+                return list(entry[1])
+            self.misses += 1
+        result = self._getaddrinfo(host, port, *args, **kwargs)
+        with self._lock:
+            self._entries[key] = (now + self.ttl, result)
+        return list(result)
+
+    def clear(self):
+        "Forget all cached addresses."
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        "Return a dict with the numbers of cache hits and misses."
+        return {'hits': self.hits, 'misses': self.misses}
+
+
+_cache = None
+_lock = threading.Lock()
+
+
+def _reset_lock():
+    global _lock
+    _lock = threading.Lock()
+
+forksafe.register_hook(_reset_lock)
+
+
+def host_name(url):
+    "Return the host name of a URL like ``https://api.relayr.io``."
+    return url.split('://', 1)[-1].split('/', 1)[0].split(':', 1)[0]
+
+
+def enable_dns_cache(hosts, ttl=60):
+    """
+    Cache the addresses of some hosts for all connections of this process.
+
+    Calling this again adds more hosts and sets a new TTL for all of them.
+
+    :param hosts: host names or URLs of the hosts
+    :type hosts: iterable
+    :param ttl: the number of seconds addresses are kept
+    :type ttl: float
+    :rtype: :py:class:`DnsCache`
+    """
+    global _cache
+    hosts = [host_name(h) for h in hosts]
+    with _lock:
+        if _cache is None:
+            _cache = DnsCache(hosts, ttl)
+            socket.getaddrinfo = _cache.getaddrinfo
+        else:
+            _cache.hosts.update(hosts)
+            _cache.ttl = ttl
+        return _cache
+
+
+def disable_dns_cache():
+    "Stop caching addresses and restore ``socket.getaddrinfo``."
+    global _cache
+    with _lock:
+        if _cache is not None:
+            socket.getaddrinfo = _cache._getaddrinfo
+            _cache = None
+
+
+def get_dns_cache():
+    "Return the DNS cache in use or ``None``."
+    return _cache
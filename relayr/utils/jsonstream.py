@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+
+"""
+Incremental parsing of large JSON documents.
+
+This module parses a JSON object arriving in chunks of bytes, e.g. from
+an HTTP response, and yields the items of one of its array fields as
+soon as each of them is complete, so the whole document never needs to
+be in memory at once.
+"""
+
+import json
+import codecs
+
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = ' \t\n\r'
+
+
+# returned by ``ArrayItemParser._value()`` for values not complete yet
+_INCOMPLETE = object()
+
+
+class ArrayItemParser(object):
+    """
+    Parse the items of an array field of a JSON object fed in chunks.
+
+    This is the push counterpart of :py:func:`iter_array_items` for input
+    arriving asynchronously: every call of :py:meth:`feed` returns the
+    items completed by the given chunk, :py:meth:`close` those completed
+    at the end of the input. A ``ValueError`` is raised for malformed or
+    truncated input.
+
+    :param field: the name of the array field at the top level of the object
+    :type field: string
+    """
+
+    def __init__(self, field):
+        self.field = field
+        self.done = False
+        self._decode = codecs.getincrementaldecoder('utf-8')().decode
+        self._text = ''
+        self._pos = 0
+        self._eof = False
+        # one of 'start', 'key', 'colon', 'open', 'value', 'items'
+        self._state = 'start'
+        self._key = None
+
+    def feed(self, chunk):
+        "Parse a chunk of UTF-8 encoded bytes, return a list of the items completed."
+        # drop the text consumed so far
+        self._text = self._text[self._pos:] + self._decode(chunk)
+        self._pos = 0
+        return self._parse()
+
+    def close(self):
+        "Parse the rest of the input, return a list of the items completed."
+        self._text = self._text[self._pos:] + self._decode(b'', True)
+        self._pos = 0
+        self._eof = True
+        items = self._parse()
+        if not self.done:
+            raise ValueError('Unexpected end of JSON stream')
+        return items
+
+    def _parse(self):
+        "Consume as much of the text as possible, return the items completed."
+        items = []
+        while not self.done:
+            char = self._peek()
+            if not char:
+                break
+            state = self._state
+            if state == 'start':
+                self._expect(char, '{')
+                self._state = 'key'
+            elif state == 'key':
+                if char == '}':
+                    self.done = True
+                elif char == ',':
+                    self._pos += 1
+                else:
+                    key = self._value()
+                    if key is _INCOMPLETE:
+                        break
+                    self._key = key
+                    self._state = 'colon'
+            elif state == 'colon':
+                self._expect(char, ':')
+                self._state = 'open' if self._key == self.field else 'value'
+            elif state == 'open':
+                self._expect(char, '[')
+                self._state = 'items'
+            elif state == 'value':
+                if self._value() is _INCOMPLETE:
+                    break
+                self._state = 'key'
+            elif char == ']':
+                self._pos += 1
+                self._state = 'key'
+            elif char == ',':
+                self._pos += 1
+            else:
+                item = self._value()
+                if item is _INCOMPLETE:
+                    break
+                items.append(item)
+        return items
+
+    def _peek(self):
+        "Return the next character after any whitespace, or ``''`` at the end."
+        text, pos = self._text, self._pos
+        while pos < len(text) and text[pos] in _WHITESPACE:
+            pos += 1
+        self._pos = pos
+        return text[pos] if pos < len(text) else ''
+
+    def _expect(self, found, char):
+        "Consume the next character ``found``, which must be ``char``."
+        if found != char:
+            raise ValueError('Expected %r but found %r in JSON stream' % (char, found))
+        self._pos += 1
+
+    def _value(self):
+        "Consume and return the next JSON value, or ``_INCOMPLETE`` if it isn't complete."
+        try:
+            obj, end = _decoder.raw_decode(self._text, self._pos)
+        except ValueError:
+            if self._eof:
+                raise
+            return _INCOMPLETE
+        # a number at the end of the text might continue in the next chunk
+        if not self._eof and (end == len(self._text) or self._text[end] in '.eE+-'):
+            return _INCOMPLETE
+        self._pos = end
+        return obj
+
+
+def iter_array_items(chunks, field):
+    """
+    Yield the items of an array field of a JSON object given in chunks.
+
+    Other fields of the object are parsed and skipped. Nothing is yielded
+    if the field is missing. A ``ValueError`` is raised for malformed or
+    truncated input.
+
+    :param chunks: the JSON document in chunks of UTF-8 encoded bytes
+    :type chunks: iterable
+    :param field: the name of the array field at the top level of the object
+    :type field: string
+    :rtype: generator
+    """
+    parser = ArrayItemParser(field)
+    for chunk in chunks:
+        for item in parser.feed(chunk):
+            yield item
+        if parser.done:
+            return
+    for item in parser.close():
+        yield item
+
+
+def iter_chunked(items, size):
+    """
+    Yield lists of up to ``size`` consecutive items from an iterable.
+
+    :param items: the items
+    :type items: iterable
+    :param size: the maximum number of items per list
+    :type size: integer
+    :rtype: generator
+    """
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
@@ -7,8 +7,6 @@ Misc. helpers...
 
 import datetime
 
-import isodate
-
 from relayr.compat import PY3
 
 
@@ -57,6 +55,7 @@ def get_start_end(start=None, end=None, duration=None):
         assert [start, end].count(None) == 1
 
     # convert iso datetime and duration values to datetime or timedelta
+    import isodate
     if type(start) in (str, unicode):
         start = isodate.parse_datetime(start)
     if type(end) in (str, unicode):
@@ -51,6 +51,13 @@ tests_require = [
     # 'requests>=1.0.0, <3.0.0',
 ]
 
+extras_require = {
+    # asynchronous API in relayr.aio (Python 3.7+)
+    'async': ['aiohttp'],
+    # faster JSON encoding and decoding in relayr.codec
+    'fastjson': ['orjson'],
+}
+
 
 setup(
     name = "relayr",
@@ -84,6 +91,7 @@ setup(
     ],
     install_requires = install_requires,
     tests_require = tests_require,
+    extras_require = extras_require,
     cmdclass = {'test': PyTest},
     zip_safe = False
 )
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+
+"""
+This module contains tests keeping the startup of the relayr package fast.
+
+Importing the package must not import heavy third-party modules like
+``requests`` or ``paho.mqtt`` before they are needed. See
+``benchmarks/import_time.py`` for measuring the import time.
+"""
+
+import os
+import sys
+import subprocess
+
+
+# the directory containing the relayr package, for new interpreters
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# modules which must not be imported by ``from relayr import Client``
+HEAVY_MODULES = ('requests', 'paho.mqtt.client', 'isodate', 'ssl',
+    'urllib.request', 'concurrent.futures', 'logging.handlers', 'email.utils')
+
+
+def imported_modules(code):
+    "Return the names of all modules imported after running code in a new interpreter."
+    code += "; import sys; print(' '.join(sorted(sys.modules)))"
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([ROOT] + [p for p in
+        env.get('PYTHONPATH', '').split(os.pathsep) if p])
+    out = subprocess.check_output([sys.executable, '-c', code], cwd=ROOT, env=env)
+    return set(out.decode('ascii').split())
+
+
+class TestImport(object):
+    "Test importing the relayr package."
+
+    def test_lazy_imports(self):
+        "Test deferring the import of heavy modules."
+        if sys.version_info < (3, 7):
+            return
+        preloaded = imported_modules('pass')
+        modules = imported_modules('from relayr import Client')
+        assert 'relayr.client' in modules
+        heavy = [m for m in HEAVY_MODULES if m in modules and m not in preloaded]
+        assert heavy == []
+
+    def test_lazy_attributes(self):
+        "Test the lazily computed and imported module attributes."
+        import relayr
+        from relayr import config, resources
+        from relayr.client import Client
+        from relayr.dataconnection import MqttStream
+        assert relayr.Client is Client
+        assert resources.Connection is MqttStream
+        assert config.userAgent.startswith(config.clientName)
@@ -0,0 +1,369 @@
+# -*- coding: utf-8 -*-
+
+"""
+This module contains tests of the resource classes of the client.
+
+Like the transport tests these ones don't need any network access, they
+use a client with a fake HTTP session returning canned responses.
+"""
+
+import pytest
+
+from tests.test_transport import FakeResponse, FakeSession
+
+
+def api_requests(session):
+    "Return the paths of all API requests of a fake session but status checks."
+    return [url.split('relayr.io', 1)[1].split('?')[0]
+        for (method, url, kwargs) in session.requests
+        if not url.endswith('/server-status')]
+
+
+class TestLazyResources(object):
+    "Test resources fetching their fields on first access."
+
+    def test_lazy_attribute(self):
+        "Test fetching missing fields once on first access."
+        from relayr.client import Client
+        from relayr.resources import Device
+        session = FakeSession({
+            '/devices/1': FakeResponse(200, {'id': '1', 'name': 'a', 'public': False}),
+        })
+        c = Client(session=session)
+        d = Device('1', client=c)
+        assert api_requests(session) == []
+        assert d.name == 'a'
+        assert d.public is False
+        assert api_requests(session) == ['/devices/1']
+        with pytest.raises(AttributeError):
+            d.missing
+        assert not hasattr(d, '_private')
+        assert api_requests(session) == ['/devices/1']
+
+    def test_refresh(self):
+        "Test fetching fresh data explicitly."
+        from relayr.client import Client
+        from relayr.resources import Transmitter
+        names = iter(['a', 'b'])
+        session = FakeSession({
+            '/transmitters/1': lambda: FakeResponse(200, {'id': '1', 'name': next(names)}),
+        })
+        c = Client(session=session)
+        t = Transmitter('1', client=c, name='old')
+        assert t.name == 'old'
+        assert t.refresh() is t
+        assert t.name == 'a'
+        t.refresh()
+        assert t.name == 'b'
+
+    def test_failed_fetch(self):
+        "Test a failed fetch raising the API error and being retried."
+        from relayr.client import Client
+        from relayr.resources import App
+        from relayr.exceptions import RelayrApiException
+        session = FakeSession()
+        c = Client(session=session)
+        a = App('1', client=c)
+        with pytest.raises(RelayrApiException):
+            a.name
+        session.responses['/apps/1'] = FakeResponse(200, {'id': '1', 'name': 'x'})
+        assert a.name == 'x'
+
+    def test_generators_without_requests(self):
+        "Test listing resources without fetching each one."
+        from relayr.client import Client
+        from relayr.resources import User, DeviceModel
+        session = FakeSession({
+            '/users/u/devices': FakeResponse(200, [
+                {'id': '1', 'name': 'a', 'model': {'id': 'm'}},
+                {'id': '2', 'name': 'b', 'model': {'id': 'm'}},
+            ]),
+            '/device-models/m': FakeResponse(200, {'id': 'm', 'name': 'Model'}),
+        })
+        c = Client(session=session)
+        devs = list(User('u', client=c).get_devices())
+        assert [(d.id, d.name) for d in devs] == [('1', 'a'), ('2', 'b')]
+        assert api_requests(session) == ['/users/u/devices']
+        assert isinstance(devs[0].model, DeviceModel)
+        assert devs[0].model.name == 'Model'
+        assert api_requests(session) == ['/users/u/devices', '/device-models/m']
+
+
+class TestHydration(object):
+    "Test creating resources from list payloads and expanding them."
+
+    def test_expand_models(self):
+        "Test fetching each distinct device model once."
+        from relayr.client import Client
+        from relayr.resources import User
+        session = FakeSession({
+            '/users/u/devices': FakeResponse(200, [
+                {'id': str(i), 'model': {'id': 'm%d' % (i % 2)}} for i in range(6)
+            ]),
+            '/device-models/m0': FakeResponse(200, {'id': 'm0', 'name': 'Zero'}),
+            '/device-models/m1': FakeResponse(200, {'id': 'm1', 'name': 'One'}),
+        })
+        c = Client(session=session)
+        devs = list(User('u', client=c).get_devices(expand=['model']))
+        assert sorted(api_requests(session)) == [
+            '/device-models/m0', '/device-models/m1', '/users/u/devices']
+        assert [d.model.name for d in devs] == ['Zero', 'One'] * 3
+        assert len(api_requests(session)) == 3
+
+    def test_group_devices(self):
+        "Test creating the devices of a group from the group info."
+        from relayr.client import Client
+        from relayr.resources import Group, Device
+        session = FakeSession({
+            '/groups/g': FakeResponse(200, {'id': 'g', 'name': 'G', 'devices': [
+                {'id': '1', 'position': 0}, {'id': '2', 'position': 1}]}),
+            '/devices/1': FakeResponse(200, {'id': '1', 'name': 'a', 'model': {'id': 'm'}}),
+            '/devices/2': FakeResponse(200, {'id': '2', 'name': 'b', 'model': {'id': 'm'}}),
+            '/device-models/m': FakeResponse(200, {'id': 'm', 'name': 'Model'}),
+        })
+        c = Client(session=session)
+        g = Group('g', client=c).get_info()
+        assert [(d.id, d.position) for d in g.devices] == [('1', 0), ('2', 1)]
+        assert all(isinstance(d, Device) for d in g.devices)
+        assert api_requests(session) == ['/groups/g']
+
+        g.get_info(expand=['devices', 'devices.model'])
+        assert len(g.devices) == 2
+        assert [d.name for d in g.devices] == ['a', 'b']
+        assert [d.model.name for d in g.devices] == ['Model', 'Model']
+        assert sorted(api_requests(session)[1:]) == [
+            '/device-models/m', '/devices/1', '/devices/2', '/groups/g']
+
+    def test_expand_shared_devices(self):
+        "Test devices in several groups keeping their positions when expanded."
+        from relayr.client import Client
+        from relayr.resources import Group, _expand
+        session = FakeSession({
+            '/groups/g1': FakeResponse(200, {'id': 'g1', 'devices': [{'id': '1', 'position': 0}]}),
+            '/groups/g2': FakeResponse(200, {'id': 'g2', 'devices': [{'id': '1', 'position': 5}]}),
+            '/devices/1': FakeResponse(200, {'id': '1', 'name': 'a'}),
+        })
+        c = Client(session=session)
+        groups = [Group('g1', client=c).get_info(), Group('g2', client=c).get_info()]
+        _expand(groups, ['devices'])
+        assert [g.devices[0].name for g in groups] == ['a', 'a']
+        assert [g.devices[0].position for g in groups] == [0, 5]
+        assert api_requests(session).count('/devices/1') == 1
+
+    def test_concurrent_group_devices(self):
+        "Test fetching the devices of a group concurrently and in order."
+        import time
+        from relayr.client import Client
+        from relayr.resources import Group
+        from relayr.exceptions import RelayrApiException
+
+        def device(i):
+            def response():
+                time.sleep(0.1)
+                return FakeResponse(200, {'id': str(i), 'name': 'd%d' % i})
+            return response
+
+        members = [{'id': str(i), 'position': 9 - i} for i in range(10)]
+        responses = dict(('/devices/%d' % i, device(i)) for i in range(10))
+        responses['/groups/g'] = FakeResponse(200, {'id': 'g', 'devices': members})
+        session = FakeSession(responses)
+        c = Client(session=session, metrics=False)
+        g = Group('g', client=c)
+        start = time.time()
+        g.get_info(expand=['devices'], workers=10)
+        assert time.time() - start < 0.5
+        assert [(d.name, d.position) for d in g.devices] == [
+            ('d%d' % i, 9 - i) for i in range(10)]
+
+        start = time.time()
+        g.get_info(expand=['devices.model'], workers=10)
+        assert time.time() - start < 0.5
+
+        del session.responses['/devices/3']
+        with pytest.raises(RelayrApiException):
+            g.get_info(expand=['devices'], workers=10)
+        assert len(g.devices) == 10
+
+    def test_expand_in_batch(self):
+        "Test expanding groups fetched concurrently themselves."
+        import threading
+        from relayr.client import Client
+        from relayr.resources import Group
+        responses = dict(('/devices/%d' % i,
+            FakeResponse(200, {'id': str(i), 'name': 'd%d' % i})) for i in range(4))
+        for i in range(6):
+            responses['/groups/g%d' % i] = FakeResponse(200, {'id': 'g%d' % i,
+                'devices': [{'id': str(j), 'position': j} for j in range(4)]})
+        c = Client(session=FakeSession(responses), pool_size=2)
+        groups = [Group('g%d' % i, client=c) for i in range(6)]
+        results = []
+        t = threading.Thread(target=lambda: results.append(
+            c.api.batch(lambda g: g.get_info(expand=['devices']), groups)))
+        t.daemon = True
+        t.start()
+        t.join(10)
+        assert not t.is_alive()
+        assert results[0].ok
+        assert [d.name for d in groups[5].devices] == ['d0', 'd1', 'd2', 'd3']
+
+
+class TestDeviceModelRegistry(object):
+    "Test sharing device models between devices."
+
+    def test_shared_models(self):
+        "Test devices sharing one model instance fetched once."
+        from relayr.client import Client
+        from relayr.resources import User
+        session = FakeSession({
+            '/users/u/devices': FakeResponse(200, [
+                {'id': str(i), 'model': {'id': 'm'}} for i in range(5)
+            ]),
+            '/device-models/m': FakeResponse(200, {'id': 'm', 'name': 'Model'}),
+        })
+        c = Client(session=session)
+        user = User('u', client=c)
+        devs = list(user.get_devices(expand=['model']))
+        assert len(set(id(d.model) for d in devs)) == 1
+        assert len(c.device_models) == 1 and 'm' in c.device_models
+        list(user.get_devices(expand=['model']))
+        assert api_requests(session).count('/device-models/m') == 1
+
+        c.device_models.ttl = 0
+        assert c.device_models.load('m').name == 'Model'
+        assert api_requests(session).count('/device-models/m') == 2
+
+    def test_preload(self):
+        "Test loading all public device models with one request."
+        from relayr.client import Client
+        session = FakeSession({
+            '/device-models': FakeResponse(200, [
+                {'id': 'm1', 'name': 'One'}, {'id': 'm2', 'name': 'Two'}]),
+            '/devices/1': FakeResponse(200, {'id': '1', 'model': {'id': 'm2'}}),
+        })
+        c = Client(session=session)
+        assert c.device_models.preload() == 2
+        d = c.get_device('1')
+        d.get_info(expand=['model'])
+        assert d.model is c.device_models.get('m2')
+        assert d.model.name == 'Two'
+        assert api_requests(session) == ['/device-models', '/devices/1']
+
+        assert [m.name for m in c.get_public_device_models()] == ['One', 'Two']
+        assert d.model is c.device_models.get('m2')
+
+    def test_stale_models(self):
+        "Test stale models dropping their fields when looked up again."
+        from relayr.client import Client
+        from relayr.resources import User
+        names = iter(['Old', 'New'])
+        session = FakeSession({
+            '/users/u/devices': FakeResponse(200, [{'id': '1', 'model': {'id': 'm'}}]),
+            '/device-models/m': lambda: FakeResponse(200, {'id': 'm', 'name': next(names)}),
+        })
+        c = Client(session=session)
+        user = User('u', client=c)
+        model = next(user.get_devices()).model
+        assert model.name == 'Old'
+        next(user.get_devices())
+        assert model.name == 'Old'
+        c.device_models.ttl = 0
+        assert next(user.get_devices()).model is model
+        assert model.name == 'New'
+        assert api_requests(session).count('/device-models/m') == 2
+
+
+class TestCompactResources(object):
+    "Test resources storing their fields in slots."
+
+    def test_slots_and_extra_fields(self):
+        "Test known fields in slots and unknown ones in an extra dict."
+        import weakref
+        from relayr.resources import Device
+        d = Device('1', name='a', color='red')
+        assert not hasattr(d, '__dict__')
+        assert d.name == 'a' and d.color == 'red'
+        d.size = 3
+        del d.color
+        assert d._fields() == {'id': '1', 'name': 'a', 'size': 3}
+        with pytest.raises(AttributeError):
+            d.color
+        assert weakref.ref(d)() is d
+
+
+class TestIdentityMap(object):
+    "Test sharing one object per resource between all uses of a client."
+
+    def test_same_objects(self):
+        "Test getting the same object for the same resource."
+        from relayr.client import Client
+        from relayr.resources import User
+        session = FakeSession({
+            '/users/u/devices': FakeResponse(200, [{'id': '1', 'name': 'a'}]),
+            '/devices/1': FakeResponse(200, {'id': '1', 'name': 'a', 'public': True}),
+        })
+        c = Client(session=session, identity_map=True)
+        d = c.get_device('1')
+        assert d is c.get_device('1')
+        assert d.public is True
+        devs = list(User('u', client=c).get_devices())
+        assert devs[0] is d
+        assert api_requests(session) == ['/devices/1', '/users/u/devices']
+        assert c.identity_map.stats()['hits'] == 2
+        assert Client(session=session).get_device('1') is not d
+
+    def test_update_and_delete(self):
+        "Test updated resources dropping stale fields and deleted ones being removed."
+        from relayr.client import Client
+        session = FakeSession({
+            '/devices/1': lambda: FakeResponse(200, {'id': '1', 'name': 'b'})
+                if session.requests[-1][0] == 'PATCH'
+                else FakeResponse(200, {'id': '1', 'name': 'a', 'public': False}),
+        })
+        c = Client(session=session, identity_map=True)
+        d = c.get_device('1')
+        assert d.name == 'a'
+        d.update(name='b')
+        assert d.name == 'b'
+        assert d.public is False
+        assert api_requests(session) == ['/devices/1'] * 3
+        session.responses['/devices/1'] = FakeResponse(200, {})
+        d.delete()
+        assert c.get_device('1') is not d
+
+    def test_group_positions(self):
+        "Test devices in several groups keeping their position per group."
+        from relayr.client import Client
+        from relayr.resources import Group
+        session = FakeSession({
+            '/groups/g1': FakeResponse(200, {'id': 'g1', 'devices': [{'id': '1', 'position': 0}]}),
+            '/groups/g2': FakeResponse(200, {'id': 'g2', 'devices': [{'id': '1', 'position': 5}]}),
+        })
+        c = Client(session=session, identity_map=True)
+        g1 = Group('g1', client=c).get_info()
+        g2 = Group('g2', client=c).get_info()
+        assert g1.devices[0] is g2.devices[0]
+        assert g1.positions == {'1': 0}
+        assert g2.positions == {'1': 5}
+
+    def test_staleness_and_eviction(self):
+        "Test stale resources being fetched again and unused ones evicted."
+        import gc
+        import time
+        from relayr.client import Client
+        from relayr.resources import IdentityMap, Device
+        names = iter(['a', 'b'])
+        session = FakeSession({
+            '/devices/1': lambda: FakeResponse(200, {'id': '1', 'name': next(names)}),
+        })
+        c = Client(session=session, identity_map=IdentityMap(size=1, ttl=0.01))
+        d = c.get_device('1')
+        assert d.name == 'a'
+        time.sleep(0.02)
+        assert c.get_device('1').name == 'b'
+
+        c.get_device('2')
+        c.get_device('3')
+        del d
+        gc.collect()
+        assert c.identity_map.get(Device, '1') is None
+        assert c.identity_map.get(Device, '3') is not None
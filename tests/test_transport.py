@@ -0,0 +1,1317 @@
+# -*- coding: utf-8 -*-
+
+"""
+This module contains tests of the HTTP transport layer of the API client.
+
+Unlike most other tests in this package these ones don't need any network
+access or credentials. They replace the HTTP session of the API object
+with a fake one returning canned responses, so they can be run anywhere.
+"""
+
+import json
+
+import pytest
+
+
+class FakeResponse(object):
+    "A minimal stand-in for ``requests.Response``."
+
+    def __init__(self, status_code=200, data=None, headers=None):
+        self.status_code = status_code
+        self.content = b'' if data is None else json.dumps(data).encode('utf-8')
+        self.headers = headers or {}
+        self.closed = False
+
+    def json(self):
+        return json.loads(self.content.decode('utf-8'))
+
+    def iter_content(self, chunk_size=1):
+        for i in range(0, len(self.content), chunk_size):
+            yield self.content[i:i + chunk_size]
+
+    def close(self):
+        self.closed = True
+
+
+class FakeSession(object):
+    """
+    A minimal stand-in for ``requests.Session`` recording all requests.
+
+    Responses are taken from a dict mapping URL path suffixes to responses
+    or callables returning responses, the server status is always fine.
+    """
+
+    def __init__(self, responses=None):
+        self.responses = responses or {}
+        self.requests = []
+        self.closed = False
+
+    def request(self, method, url, **kwargs):
+        self.requests.append((method, url, kwargs))
+        if url.endswith('/server-status'):
+            return FakeResponse(200, {'database': 'ok'})
+        for suffix, resp in self.responses.items():
+            if url.split('?')[0].endswith(suffix):
+                return resp() if callable(resp) else resp
+        return FakeResponse(404, {'message': 'URL could not be routed.'})
+
+    def close(self):
+        self.closed = True
+
+
+class TestSessions(object):
+    "Test pooled HTTP sessions."
+
+    def test_default_session_pool(self):
+        "Test creating a session with a given pool size."
+        from relayr.api import create_session
+        s = create_session(pool_size=3)
+        adapter = s.get_adapter('https://api.relayr.io')
+        assert adapter._pool_connections == 3
+        assert adapter._pool_maxsize == 3
+
+    def test_shared_session(self):
+        "Test sharing one session between several API objects."
+        from relayr.api import Api
+        session = FakeSession({'/devices/42': FakeResponse(200, {'id': '42'})})
+        a1 = Api(session=session)
+        a2 = Api(session=session)
+        assert a1.get_device('42') == {'id': '42'}
+        assert a2.get_device('42') == {'id': '42'}
+        assert a1.session is a2.session
+        a1.close()
+        assert not session.closed
+
+    def test_keep_alive(self):
+        "Test connections are kept alive unless asked otherwise."
+        from relayr.api import Api
+        session = FakeSession({'/devices/42': FakeResponse(200, {'id': '42'})})
+        Api(session=session).get_device('42')
+        method, url, kwargs = session.requests[-1]
+        assert 'Connection' not in kwargs['headers']
+
+        Api(session=session, keep_alive=False).get_device('42')
+        method, url, kwargs = session.requests[-1]
+        assert kwargs['headers']['Connection'] == 'close'
+
+    def test_error_response(self):
+        "Test raising an exception for non-2XX responses."
+        from relayr.api import Api
+        from relayr.exceptions import RelayrApiException
+        api = Api(session=FakeSession())
+        with pytest.raises(RelayrApiException) as excinfo:
+            api.get_device('42')
+        assert str(excinfo.value).startswith('URL could not be routed.')
+
+
+class TestServerStatus(object):
+    "Test the server status check done when creating API objects."
+
+    def test_skip_status_check(self):
+        "Test creating an API object without checking the server status."
+        from relayr.api import Api
+        session = FakeSession()
+        Api(session=session, check_status=False)
+        assert session.requests == []
+
+    def test_cached_status_check(self):
+        "Test reusing a recent server status check."
+        from relayr import api
+        api._server_status_cache.clear()
+        session = FakeSession()
+        for i in range(5):
+            api.Api(session=session)
+        assert len(session.requests) == 1
+
+        a = api.Api(session=session)
+        assert a.check_server_status(ttl=0) == {'database': 'ok'}
+        assert len(session.requests) == 2
+
+    def test_status_checks_per_host(self):
+        "Test a slow status check not delaying checks of other hosts."
+        import threading
+        import time
+        from relayr import api
+
+        class SlowSession(FakeSession):
+            def request(self, method, url, **kwargs):
+                if 'slow' in url:
+                    time.sleep(0.3)
+                return super(SlowSession, self).request(method, url, **kwargs)
+
+        api._server_status_cache.clear()
+        session = SlowSession()
+        slow = api.Api(session=session, check_status=False)
+        slow.host = 'https://slow.relayr.io'
+        fast = api.Api(session=session, check_status=False)
+        threads = [threading.Thread(target=slow.check_server_status) for i in range(2)]
+        for t in threads:
+            t.start()
+        time.sleep(0.05)
+        start = time.time()
+        fast.check_server_status()
+        assert time.time() - start < 0.2
+        for t in threads:
+            t.join()
+        assert len([r for r in session.requests if 'slow' in r[1]]) == 1
+
+
+class FakeAsyncResponse(object):
+    "A minimal stand-in for ``aiohttp.ClientResponse``."
+
+    def __init__(self, response):
+        self.status = response.status_code
+        self.headers = response.headers
+        self.content = FakeStreamReader(response)
+        self._body = response.content
+
+    async def read(self):
+        return self._body
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+
+class FakeStreamReader(object):
+    "A minimal stand-in for ``aiohttp.StreamReader``."
+
+    def __init__(self, response):
+        self.response = response
+
+    async def iter_chunked(self, n):
+        for chunk in self.response.iter_content(n):
+            yield chunk
+
+
+class FakeAsyncSession(FakeSession):
+    "A minimal stand-in for ``aiohttp.ClientSession``."
+
+    def request(self, method, url, **kwargs):
+        resp = super(FakeAsyncSession, self).request(method, url, **kwargs)
+        return FakeAsyncResponse(resp)
+
+
+class TestAsyncApi(object):
+    "Test the asyncio-based API class."
+
+    def test_endpoints(self):
+        "Test awaiting endpoint methods concurrently."
+        pytest.importorskip('aiohttp')
+        import asyncio
+        from relayr.aio import AsyncApi
+
+        session = FakeAsyncSession({
+            '/devices/1': FakeResponse(200, {'id': '1'}),
+            '/devices/2': FakeResponse(200, {'id': '2'}),
+        })
+
+        async def main():
+            a = AsyncApi(session=session, concurrency=2)
+            assert await a.check_server_status(ttl=0) == {'database': 'ok'}
+            return await asyncio.gather(a.get_device('1'), a.get_device('2'))
+
+        assert asyncio.run(main()) == [{'id': '1'}, {'id': '2'}]
+        assert not session.closed
+
+    def test_error_response(self):
+        "Test raising an exception for non-2XX responses."
+        pytest.importorskip('aiohttp')
+        import asyncio
+        from relayr.aio import AsyncApi
+        from relayr.exceptions import RelayrApiException
+
+        a = AsyncApi(session=FakeAsyncSession())
+        with pytest.raises(RelayrApiException):
+            asyncio.run(a.get_device('42'))
+
+    def test_batch_and_sync_methods(self):
+        "Test awaiting a batch and the thread-based helpers being off."
+        pytest.importorskip('aiohttp')
+        import asyncio
+        from relayr.aio import AsyncApi
+        from relayr.exceptions import RelayrApiException
+
+        a = AsyncApi(session=FakeAsyncSession({
+            '/devices/1': FakeResponse(200, {'id': '1'}),
+        }))
+        assert a.retry is None and a.single_flight is None
+        assert a.concurrency_limiter is None
+        res = asyncio.run(a.batch('get_device', ['1', '2'], workers=2))
+        assert res.results == [{'id': '1'}, None]
+        assert isinstance(res.errors[1], RelayrApiException)
+        assert 'concurrency' not in a.stats()
+
+    def test_deadline(self):
+        "Test deadlines applying to the calls prepared in a block."
+        pytest.importorskip('aiohttp')
+        import asyncio
+        from relayr.aio import AsyncApi
+
+        session = FakeAsyncSession({'/devices/1': FakeResponse(200, {'id': '1'})})
+        a = AsyncApi(session=session)
+
+        async def main():
+            with a.deadline(10):
+                calls = [a.get_device('1'), a.get_device('1')]
+                with a.deadline(60):
+                    calls.append(a.get_device('1'))
+            calls.append(a.get_device('1'))
+            return await asyncio.gather(*calls)
+
+        assert asyncio.run(main()) == [{'id': '1'}] * 4
+        totals = [kwargs['timeout'].total for (_, _, kwargs) in session.requests[-4:]]
+        assert 9 < totals[0] <= 10 and 9 < totals[1] <= 10 and 9 < totals[2] <= 10
+        assert totals[3] is None
+
+    def test_iter_history_devices(self):
+        "Test yielding history data asynchronously."
+        pytest.importorskip('aiohttp')
+        import asyncio
+        from relayr.aio import AsyncApi
+        from relayr.exceptions import RelayrApiException
+
+        points = [{'ts': i, 'value': i * 0.5} for i in range(10)]
+        session = FakeAsyncSession({'/history/devices/42':
+            FakeResponse(200, {'limit': 10, 'data': points})})
+        infos = []
+        a = AsyncApi(session=session, hooks={'after_response': [infos.append],
+            'on_error': [infos.append]})
+
+        async def collect(**kwargs):
+            return [item async for item in a.iter_history_devices('42', **kwargs)]
+
+        assert asyncio.run(collect(start=0, limit=10)) == points
+        method, url, kwargs = session.requests[-1]
+        assert url.endswith('/history/devices/42?limit=10&start=0')
+        chunks = asyncio.run(collect(chunk_size=4))
+        assert [len(c) for c in chunks] == [4, 4, 2]
+        assert infos[-1].endpoint == 'iter_history_devices'
+        assert infos[-1].response_bytes == len(session.responses['/history/devices/42'].content)
+
+        truncated = FakeResponse(200, {'data': points})
+        truncated.content = truncated.content[:50]
+        session.responses['/history/devices/42'] = truncated
+        with pytest.raises(RelayrApiException) as excinfo:
+            asyncio.run(collect())
+        assert 'truncated' in str(excinfo.value)
+        assert infos[-1].error is excinfo.value
+
+        session.responses['/history/devices/42'] = FakeResponse(404, {})
+        with pytest.raises(RelayrApiException):
+            asyncio.run(collect())
+        assert infos[-1].status == 404
+
+
+class TestBatch(object):
+    "Test calling endpoints concurrently for many sets of arguments."
+
+    def test_batch_order_and_errors(self):
+        "Test results are in input order and errors are collected."
+        from relayr.api import Api
+        from relayr.exceptions import RelayrApiException
+        responses = dict(('/devices/%d' % i, FakeResponse(200, {'id': i}))
+            for i in range(20) if i != 7)
+        api = Api(session=FakeSession(responses))
+        res = api.batch('get_device', range(20), workers=4)
+        assert len(res) == 20
+        assert list(res.errors) == [7]
+        assert isinstance(res.errors[7], RelayrApiException)
+        assert res[7] is None
+        assert [r['id'] for r in res if r is not None] == [i for i in range(20) if i != 7]
+        assert res.elapsed >= 0
+        assert not res.ok
+
+    def test_batch_arguments(self):
+        "Test passing positional and keyword arguments."
+        from relayr.api import Api
+        session = FakeSession({'/devices/1/cmd': FakeResponse(200, {})})
+        api = Api(session=session)
+        res = api.batch(api.post_device_command,
+            [('1', {'cmd': 'a'}), {'deviceID': '1', 'command': {'cmd': 'b'}}])
+        assert res.ok
+        assert len([r for r in session.requests if r[1].endswith('/cmd')]) == 2
+
+    def test_adaptive_limiter(self):
+        "Test adjusting the concurrency limit to successes and overload."
+        from relayr.concurrency import AdaptiveLimiter
+        from relayr.exceptions import RelayrApiException, RelayrApiTimeoutException
+        limiter = AdaptiveLimiter(initial=4, max_limit=8, tolerance=1000)
+        for i in range(40):
+            limiter.release(limiter.acquire())
+        assert limiter.limit == 8
+        limiter.release(limiter.acquire(), RelayrApiTimeoutException('timeout'))
+        assert limiter.limit == 4
+        not_found = RelayrApiException('not found')
+        not_found.status = 404
+        limiter._last_decrease = None
+        limiter.release(limiter.acquire(), not_found)
+        assert limiter.limit == 4
+        assert limiter.stats()['decreases'] == 1
+        assert limiter.stats()['in_flight'] == 0
+
+    def test_adaptive_limiter_endpoints(self):
+        "Test slow endpoints not being taken for overloaded fast ones."
+        from relayr.concurrency import AdaptiveLimiter
+        limiter = AdaptiveLimiter(initial=8, max_limit=8)
+        for i in range(5):
+            limiter.release(limiter.acquire() - 0.001, key='fast')
+        for i in range(5):
+            limiter.release(limiter.acquire() - 0.2, key='slow')
+        assert limiter.stats()['decreases'] == 0
+        limiter.release(limiter.acquire() - 0.2, key='fast')
+        assert limiter.stats()['decreases'] == 1
+
+    def test_nested_batch(self):
+        "Test batches in calls of a batch not waiting for slots forever."
+        import threading
+        from relayr.api import Api
+        responses = dict(('/devices/%d' % i, FakeResponse(200, {'id': i}))
+            for i in range(4))
+        api = Api(session=FakeSession(responses), pool_size=2)
+        results = []
+
+        def outer(i):
+            return api.batch('get_device', range(4)).results
+
+        t = threading.Thread(target=lambda: results.append(api.batch(outer, range(6))))
+        t.daemon = True
+        t.start()
+        t.join(10)
+        assert not t.is_alive()
+        assert results[0].ok
+        assert results[0][5] == [{'id': i} for i in range(4)]
+        assert api.concurrency_limiter.in_flight == 0
+
+    def test_client_bulk_helpers(self):
+        "Test retrieving devices and sending commands concurrently."
+        from relayr.client import Client
+        session = FakeSession({
+            '/devices/1': FakeResponse(200, {'id': '1', 'name': 'a'}),
+            '/devices/2': FakeResponse(200, {'id': '2', 'name': 'b'}),
+            '/cmd': FakeResponse(200, {}),
+        })
+        c = Client(session=session)
+        res = c.get_devices(['1', '2', '3'])
+        assert [d.name for d in res.results[:2]] == ['a', 'b']
+        assert list(res.errors) == [2]
+        res = c.send_commands(res.results[:2], {'path': 'led', 'command': 'led', 'value': True})
+        assert res.ok
+        assert 'limit' in c.api.stats()['concurrency']
+
+
+class TestResponseCache(object):
+    "Test caching responses of read-mostly endpoints."
+
+    modelID = 'a7ec1b21-8582-4304-b1cf-15a1fc66d1e8'
+
+    def test_endpoint_template(self):
+        "Test identifying endpoints by URL templates."
+        from relayr.api import endpoint_template
+        url = 'https://api.relayr.io/device-models/%s?x=1' % self.modelID
+        assert endpoint_template(url) == '/device-models/{id}'
+        url = 'https://api.relayr.io/device-models/meanings'
+        assert endpoint_template(url) == '/device-models/meanings'
+
+    def test_memory_cache_lru(self):
+        "Test evicting least recently used entries."
+        from relayr.cache import MemoryCache
+        c = MemoryCache(maxsize=2)
+        c.set('a', 1)
+        c.set('b', 2)
+        c.get('a')
+        c.set('c', 3)
+        assert c.get('b') is None
+        assert c.get('a') == 1
+        assert len(c) == 2
+
+    def test_fresh_responses(self):
+        "Test returning fresh responses from the cache."
+        from relayr.api import Api
+        from relayr.cache import MemoryCache
+        session = FakeSession({
+            '/device-models/' + self.modelID: FakeResponse(200, {'id': self.modelID}),
+            '/devices/' + self.modelID: FakeResponse(200, {'id': 'dev'}),
+        })
+        api = Api(session=session, check_status=False, cache=MemoryCache())
+        for i in range(3):
+            assert api.get_device_model(self.modelID) == {'id': self.modelID}
+            assert api.get_device(self.modelID) == {'id': 'dev'}
+        urls = [url for method, url, kwargs in session.requests]
+        assert len([u for u in urls if '/device-models/' in u]) == 1
+        assert len([u for u in urls if '/devices/' in u]) == 3
+
+    def test_cached_responses_copied(self):
+        "Test callers changing a response not changing the cached one."
+        from relayr.api import Api
+        from relayr.cache import MemoryCache
+        session = FakeSession({
+            '/device-models/' + self.modelID: FakeResponse(200, {'readings': []}),
+        })
+        api = Api(session=session, check_status=False, cache=MemoryCache())
+        api.get_device_model(self.modelID)['readings'].append('changed')
+        api.get_device_model(self.modelID)['readings'].append('changed')
+        assert api.get_device_model(self.modelID) == {'readings': []}
+
+    def test_revalidation(self, tmpdir):
+        "Test revalidating stale responses with the ETag."
+        from relayr.api import Api
+        from relayr.cache import FileCache
+        responses = [
+            FakeResponse(200, {'id': self.modelID}, headers={'ETag': '"v1"'}),
+            FakeResponse(304),
+        ]
+        session = FakeSession({
+            '/device-models/' + self.modelID: lambda: responses.pop(0),
+        })
+        cache = FileCache(directory=str(tmpdir))
+        api = Api(session=session, check_status=False, cache=cache,
+            cache_ttls={'/device-models/{id}': -1})
+        assert api.get_device_model(self.modelID) == {'id': self.modelID}
+        assert api.get_device_model(self.modelID) == {'id': self.modelID}
+        method, url, kwargs = session.requests[-1]
+        assert kwargs['headers']['If-None-Match'] == '"v1"'
+        assert len(cache) == 1
+
+    def test_invalidation(self):
+        "Test removing cached responses after modifying a resource."
+        from relayr.api import Api
+        from relayr.cache import MemoryCache
+        session = FakeSession({
+            '/transmitters/' + self.modelID: FakeResponse(200, {'name': 'x'}),
+        })
+        api = Api(session=session, check_status=False, cache=MemoryCache())
+        api.get_transmitter(self.modelID)
+        assert len(api.cache.backend) == 1
+        api.patch_transmitter(self.modelID, name='y')
+        assert len(api.cache.backend) == 0
+
+
+class TestRetries(object):
+    "Test retrying failed requests and circuit breakers."
+
+    def test_retry_temporary_errors(self):
+        "Test retrying idempotent requests after temporary errors."
+        from relayr.api import Api
+        from relayr.retry import RetryPolicy
+        responses = [FakeResponse(503), FakeResponse(429, headers={'Retry-After': '0'}),
+            FakeResponse(200, {'id': '42'})]
+        session = FakeSession({'/devices/42': lambda: responses.pop(0)})
+        api = Api(session=session, check_status=False,
+            retry=RetryPolicy(total=3, backoff_factor=0))
+        assert api.get_device('42') == {'id': '42'}
+        assert len(session.requests) == 3
+
+    def test_no_retry_post(self):
+        "Test not retrying non-idempotent requests."
+        from relayr.api import Api
+        from relayr.retry import RetryPolicy
+        from relayr.exceptions import RelayrApiException
+        session = FakeSession({'/devices/42/cmd': FakeResponse(503)})
+        api = Api(session=session, check_status=False,
+            retry=RetryPolicy(total=3, backoff_factor=0))
+        with pytest.raises(RelayrApiException):
+            api.post_device_command('42', {})
+        assert len(session.requests) == 1
+
+    def test_backoff(self):
+        "Test delays before retries."
+        from relayr.retry import RetryPolicy, parse_retry_after
+        p = RetryPolicy(backoff_factor=1, max_backoff=10, jitter=False)
+        assert [p.backoff(i) for i in range(5)] == [1, 2, 4, 8, 10]
+        assert p.backoff(0, retry_after=3) == 3
+        assert parse_retry_after('7') == 7
+        assert parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT') == 0
+        assert parse_retry_after(None) is None
+
+    def test_circuit_breaker(self):
+        "Test state transitions of a circuit breaker."
+        from relayr.retry import CircuitBreaker
+        b = CircuitBreaker(failure_threshold=2, recovery_timeout=0.01)
+        assert b.allow()
+        b.record_failure()
+        assert b.allow()
+        b.record_failure()
+        assert b.state == CircuitBreaker.OPEN
+        assert not b.allow()
+        import time
+        time.sleep(0.02)
+        assert b.allow()
+        assert b.state == CircuitBreaker.HALF_OPEN
+        assert not b.allow()
+        b.record_success()
+        assert b.state == CircuitBreaker.CLOSED
+        assert b.stats()['rejected'] == 2
+
+    def test_fail_fast(self):
+        "Test rejecting requests while a host is down."
+        import requests
+        from relayr.api import Api
+        from relayr.exceptions import RelayrCircuitOpenException
+
+        def fail():
+            raise requests.exceptions.ConnectionError('down')
+
+        session = FakeSession({'/x': fail})
+        api = Api(session=session, check_status=False, retry=False)
+        url = 'https://down.example.com/x'
+        for i in range(5):
+            with pytest.raises(requests.exceptions.ConnectionError):
+                api.perform_request('GET', url)
+        with pytest.raises(RelayrCircuitOpenException):
+            api.perform_request('GET', url)
+        assert len(session.requests) == 5
+        stats = api.stats()['circuit_breakers']['down.example.com']
+        assert stats['state'] == 'open'
+
+    def test_half_open_aborted_trial(self):
+        "Test a trial request without a result not keeping a breaker half-open."
+        import time
+        import requests
+        from relayr.api import Api
+        from relayr.retry import get_circuit_breaker
+        from relayr.exceptions import RelayrApiTimeoutException
+
+        def redirects():
+            raise requests.exceptions.TooManyRedirects('loop')
+
+        session = FakeSession({'/x': redirects, '/y': FakeResponse(200, {})})
+        api = Api(session=session, check_status=False, retry=False)
+        breaker = get_circuit_breaker('trial.example.com')
+        breaker.recovery_timeout = 0.01
+        for i in range(breaker.failure_threshold):
+            breaker.record_failure()
+        time.sleep(0.02)
+        with pytest.raises(RelayrApiTimeoutException):
+            with api.deadline(0):
+                api.perform_request('GET', 'https://trial.example.com/y')
+        with pytest.raises(requests.exceptions.TooManyRedirects):
+            api.perform_request('GET', 'https://trial.example.com/x')
+        assert breaker.state == 'half-open'
+        api.perform_request('GET', 'https://trial.example.com/y')
+        assert breaker.state == 'closed'
+
+
+class TestRateLimits(object):
+    "Test client-side rate limiting."
+
+    def test_token_bucket(self):
+        "Test queueing callers beyond the burst size."
+        from relayr.ratelimit import TokenBucket
+        b = TokenBucket(rate=10, burst=2)
+        delays = [b.reserve() for i in range(4)]
+        assert delays[:2] == [0, 0]
+        assert 0.05 < delays[2] <= 0.1
+        assert 0.15 < delays[3] <= 0.2
+        assert b.stats()['waits'] == 2
+
+    def test_groups(self):
+        "Test budgets per host and per group of endpoints."
+        from relayr import config
+        from relayr.api import Api
+        from relayr.ratelimit import RateLimiter
+        limiter = RateLimiter({config.relayrAPI: (1000, 1000),
+                               config.relayrHistoryAPI: 1000})
+        limiter.add_limit('commands', rate=1000,
+            match=lambda method, url: url.endswith('/cmd'))
+        session = FakeSession({'/cmd': FakeResponse(200, {})})
+        api = Api(session=session, check_status=False, rate_limiter=limiter)
+        api.post_device_command('42', {})
+        stats = api.stats()['rate_limiter']
+        assert sorted(stats) == sorted([config.relayrAPI, config.relayrHistoryAPI, 'commands'])
+        limiter.acquire('GET', config.relayrHistoryAPI + '/history')
+        assert limiter.reserve('GET', 'https://other.example.com/') == 0
+
+    def test_deadline(self):
+        "Test failing at once if the rate limit would delay a call past its deadline."
+        import time
+        from relayr import config
+        from relayr.api import Api
+        from relayr.ratelimit import RateLimiter
+        from relayr.exceptions import RelayrApiTimeoutException
+        limiter = RateLimiter({config.relayrAPI: (0.5, 1)})
+        session = FakeSession({'/devices/42': FakeResponse(200, {})})
+        api = Api(session=session, check_status=False, rate_limiter=limiter)
+        api.get_device('42')
+        start = time.time()
+        with pytest.raises(RelayrApiTimeoutException):
+            with api.deadline(0.2):
+                api.get_device('42')
+        assert time.time() - start < 0.1
+        assert limiter.stats()[config.relayrAPI]['waits'] == 0
+        assert len(session.requests) == 1
+
+        try:
+            import asyncio
+            from relayr.aio import AsyncApi
+        except ImportError:
+            return
+        a = AsyncApi(session=FakeAsyncSession(), rate_limiter=limiter)
+        with pytest.raises(RelayrApiTimeoutException):
+            asyncio.run(a.perform_request_async('GET', a.host + '/devices/42',
+                deadline=0.2))
+
+
+class TestTimeouts(object):
+    "Test timeouts and deadlines of API calls."
+
+    def test_default_timeouts(self):
+        "Test passing the configured timeouts with every request."
+        from relayr import config
+        from relayr.api import Api
+        session = FakeSession({'/devices/42': FakeResponse(200, {})})
+        Api(session=session, check_status=False).get_device('42')
+        method, url, kwargs = session.requests[-1]
+        assert kwargs['timeout'] == (config.CONNECT_TIMEOUT, config.READ_TIMEOUT)
+        Api(session=session, check_status=False, timeout=3).get_device('42')
+        method, url, kwargs = session.requests[-1]
+        assert kwargs['timeout'] == (3, 3)
+
+    def test_timeout_exception(self):
+        "Test raising a distinct exception for timeouts."
+        import requests
+        from relayr.api import Api
+        from relayr.exceptions import RelayrApiTimeoutException, RelayrApiException
+
+        def stall():
+            raise requests.exceptions.ReadTimeout('stalled')
+
+        session = FakeSession({'/devices/42': stall})
+        api = Api(session=session, check_status=False, retry=False, circuit_breaker=False)
+        with pytest.raises(RelayrApiTimeoutException):
+            api.get_device('42')
+        assert issubclass(RelayrApiTimeoutException, RelayrApiException)
+
+    def test_deadline_bounds_retries(self):
+        "Test stopping retries at the deadline."
+        from relayr.api import Api
+        from relayr.retry import RetryPolicy
+        from relayr.exceptions import RelayrApiException, RelayrApiTimeoutException
+        session = FakeSession({'/devices/42': FakeResponse(503)})
+        api = Api(session=session, check_status=False, circuit_breaker=False,
+            retry=RetryPolicy(total=100, backoff_factor=0.01, jitter=False))
+        with pytest.raises(RelayrApiException):
+            with api.deadline(0.05):
+                api.get_device('42')
+        assert 1 < len(session.requests) < 10
+        method, url, kwargs = session.requests[-1]
+        assert kwargs['timeout'][1] <= 0.05
+
+        with pytest.raises(RelayrApiTimeoutException):
+            api.perform_request('GET', url, deadline=0)
+
+
+class TestCodecs(object):
+    "Test JSON codecs for request and response bodies."
+
+    def test_codecs(self):
+        "Test encoding to and decoding from bytes with all installed codecs."
+        from relayr.codec import CODECS, get_codec
+        data = {'name': u'Wunderbär', 'values': [1, 2.5, None, True]}
+        for name in CODECS:
+            try:
+                codec = get_codec(name)
+            except ImportError:
+                continue
+            encoded = codec.dumps(data)
+            assert isinstance(encoded, bytes)
+            assert codec.loads(encoded) == data
+        assert get_codec('auto').name in CODECS
+
+    def test_orjson_fallback(self):
+        "Test encoding data not supported by orjson."
+        pytest.importorskip('orjson')
+        from relayr.codec import get_codec
+        codec = get_codec('orjson')
+        assert codec.loads(codec.dumps({1: 'a'})) == {'1': 'a'}
+
+    def test_api_codec(self):
+        "Test request bodies are encoded by the codec of the API object."
+        from relayr.api import Api
+        session = FakeSession({'/cmd': FakeResponse(200, {'ok': True})})
+        api = Api(session=session, check_status=False, codec='json')
+        assert api.post_device_command('42', {'cmd': 1}) == {'ok': True}
+        method, url, kwargs = session.requests[-1]
+        assert kwargs['data'] == b'{"cmd": 1}'
+        assert Api(session=session, check_status=False, codec=u'json').codec.name == 'json'
+
+
+class TestHistoryStreaming(object):
+    "Test streaming large history responses."
+
+    def test_iter_array_items(self):
+        "Test parsing array items from a JSON object in small chunks."
+        from relayr.utils.jsonstream import iter_array_items
+        doc = {'count': 3, 'meta': {'x': [1, ']']}, 'data': [
+            {'ts': 1, 'value': 1.25}, {'ts': 2, 'value': u'ä'}, 3e-05, None]}
+        content = json.dumps(doc).encode('utf-8')
+        for size in (1, 3, 1000):
+            chunks = [content[i:i + size] for i in range(0, len(content), size)]
+            assert list(iter_array_items(chunks, 'data')) == doc['data']
+        assert list(iter_array_items([b'{"x": 1}'], 'data')) == []
+
+    def test_iter_history_devices(self):
+        "Test yielding history data one by one and in chunks."
+        from relayr.api import Api
+        points = [{'ts': i, 'value': i * 0.5} for i in range(10)]
+        session = FakeSession({'/history/devices/42':
+            FakeResponse(200, {'limit': 10, 'data': points})})
+        api = Api(session=session, check_status=False)
+        readings = api.iter_history_devices('42', start=0, limit=10)
+        assert session.requests == []
+        assert list(readings) == points
+        method, url, kwargs = session.requests[-1]
+        assert url.endswith('/history/devices/42?limit=10&start=0')
+        assert kwargs['stream'] is True
+        chunks = list(api.iter_history_devices('42', start=0, chunk_size=4))
+        assert [len(c) for c in chunks] == [4, 4, 2]
+
+    def test_iter_history_devices_errors(self):
+        "Test streaming errors being mapped, recorded and passed to hooks."
+        import time
+        import requests
+        from requests.packages.urllib3.exceptions import ReadTimeoutError
+        from relayr.api import Api
+        from relayr.metrics import MetricsRegistry
+        from relayr.exceptions import RelayrApiException, RelayrApiTimeoutException
+
+        class BrokenResponse(FakeResponse):
+            def iter_content(self, chunk_size=1):
+                yield self.content[:20]
+                raise requests.exceptions.ConnectionError(
+                    ReadTimeoutError(None, None, 'Read timed out.'))
+
+        points = [{'ts': i, 'value': i} for i in range(10)]
+        session = FakeSession({'/history/devices/42':
+            lambda: BrokenResponse(200, {'data': points})})
+        errors = []
+        api = Api(session=session, check_status=False, metrics=MetricsRegistry(),
+            hooks={'on_error': [errors.append]})
+        readings = api.iter_history_devices('42')
+        with pytest.raises(RelayrApiTimeoutException):
+            list(readings)
+        stats = api.metrics.stats()['GET /history/devices/42']
+        assert stats['timeouts'] == 1
+        assert stats['bytes_received'] == 20
+        assert errors[0].endpoint == 'iter_history_devices'
+        assert errors[0].status == 200
+        assert errors[0].response_bytes == 20
+
+        session.responses['/history/devices/42'] = FakeResponse(404, {})
+        with pytest.raises(RelayrApiException):
+            list(api.iter_history_devices('42'))
+        assert errors[1].status == 404
+
+        class SmallChunksResponse(FakeResponse):
+            def iter_content(self, chunk_size=1):
+                return FakeResponse.iter_content(self, 8)
+
+        session.responses['/history/devices/42'] = SmallChunksResponse(200, {'data': points})
+        with api.deadline(0.05):
+            readings = api.iter_history_devices('42')
+            next(readings)
+            time.sleep(0.1)
+            with pytest.raises(RelayrApiTimeoutException):
+                list(readings)
+
+        truncated = FakeResponse(200, {'data': points})
+        truncated.content = truncated.content[:50]
+        session.responses['/history/devices/42'] = truncated
+        readings = api.iter_history_devices('42')
+        with pytest.raises(RelayrApiException) as excinfo:
+            list(readings)
+        assert 'truncated' in str(excinfo.value)
+        assert '/history/devices/42' in str(excinfo.value)
+        assert errors[-1].error is excinfo.value
+
+
+class TestLogging(object):
+    "Test the logging of requests and responses."
+
+    def test_shared_handler(self, tmpdir, monkeypatch):
+        "Test that many API objects log each request once to one file."
+        import logging
+        from relayr import config, logs
+        from relayr.api import Api
+        monkeypatch.setattr(config, 'LOG', True)
+        monkeypatch.setattr(config, 'LOG_DIR', str(tmpdir))
+        session = FakeSession({'/devices/42': FakeResponse(200, {'id': '42'})})
+        try:
+            apis = [Api(session=session, check_status=False) for i in range(3)]
+            apis[0].get_device('42')
+            logger = logging.getLogger(logs.LOGGER_NAME)
+            assert len(logger.handlers) == 1
+        finally:
+            logs.stop()
+        lines = tmpdir.join('relayr-api.log').read().splitlines()
+        requests = [l for l in lines if 'API request: curl' in l]
+        assert len(requests) == 1
+        assert '/devices/42' in requests[0]
+        assert any('API response content: {"id": "42"}' in l for l in lines)
+
+    def test_body_sampling(self, tmpdir, monkeypatch):
+        "Test leaving out bodies not in the sample."
+        from relayr import config, logs
+        from relayr.api import Api
+        monkeypatch.setattr(config, 'LOG', True)
+        monkeypatch.setattr(config, 'LOG_DIR', str(tmpdir))
+        monkeypatch.setattr(config, 'LOG_SAMPLE_RATE', 0)
+        session = FakeSession({'/devices/42': FakeResponse(200, {'id': '42'})})
+        try:
+            a = Api(session=session, check_status=False)
+            a.patch_device('42', name='secret')
+        finally:
+            logs.stop()
+        text = tmpdir.join('relayr-api.log').read()
+        assert 'API request: curl' in text
+        assert 'secret' not in text
+        assert 'API response content' not in text
+
+    def test_queue_fallback(self, monkeypatch):
+        "Test the queue handler and listener used on Python 2."
+        import importlib.util
+        import logging
+        import logging.handlers
+        from relayr import logs
+        from relayr.compat import queue
+        monkeypatch.delattr(logging.handlers, 'QueueHandler')
+        spec = importlib.util.spec_from_file_location('relayr_logs_py2', logs.__file__)
+        py2_logs = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(py2_logs)
+        assert py2_logs.QueueHandler is not logs.QueueHandler
+
+        class ListHandler(logging.Handler):
+            def __init__(self):
+                logging.Handler.__init__(self)
+                self.messages = []
+
+            def emit(self, record):
+                self.messages.append(record.getMessage())
+
+        records = queue.Queue()
+        target = ListHandler()
+        listener = py2_logs.QueueListener(records, target)
+        listener.start()
+        logger = logging.getLogger('relayr-test-queue-fallback')
+        logger.addHandler(py2_logs._QueueHandler(records))
+        logger.warning('lazy %s', logs.Lazy(str, 42))
+        listener.stop()
+        assert target.messages == ['lazy 42']
+
+    def test_logging_off(self, monkeypatch):
+        "Test that nothing is formatted if logging is off."
+        from relayr import api
+        from relayr.api import Api
+
+        def fail(*args, **kwargs):
+            raise AssertionError('formatted a log message')
+
+        monkeypatch.setattr(api, 'build_curl_call', fail)
+        session = FakeSession({'/devices/42': FakeResponse(200, {'id': '42'})})
+        a = Api(session=session, check_status=False)
+        assert a.logger is None
+        assert a.get_device('42') == {'id': '42'}
+
+
+class TestMetrics(object):
+    "Test recording metrics per endpoint."
+
+    def test_endpoint_metrics(self):
+        "Test recording latencies, status codes, sizes and retries."
+        from relayr.api import Api
+        from relayr.retry import RetryPolicy
+        from relayr.metrics import MetricsRegistry
+        from relayr.exceptions import RelayrApiException
+        responses = [FakeResponse(503), FakeResponse(200, {'id': '42'})]
+        session = FakeSession({
+            '/devices/42': lambda: responses.pop(0),
+            '/devices/unknown-device-1': FakeResponse(404, {'message': 'no'}),
+        })
+        registry = MetricsRegistry()
+        api = Api(session=session, check_status=False, metrics=registry,
+            retry=RetryPolicy(total=3, backoff_factor=0))
+        api.get_device('42')
+        with pytest.raises(RelayrApiException):
+            api.get_device('unknown-device-1')
+        stats = api.stats()['endpoints']
+        assert stats['GET /devices/42']['count'] == 1
+        assert stats['GET /devices/42']['statuses'] == {200: 1}
+        assert stats['GET /devices/42']['retries'] == 1
+        assert stats['GET /devices/42']['bytes_received'] == len(b'{"id": "42"}')
+        assert stats['GET /devices/{id}']['statuses'] == {404: 1}
+        assert stats['GET /devices/{id}']['p99'] is not None
+
+        text = registry.to_prometheus()
+        assert '# TYPE relayr_api_request_duration_seconds histogram' in text
+        assert 'relayr_api_request_duration_seconds_count{method="GET",endpoint="/devices/42"} 1' in text
+        assert 'relayr_api_responses_total{method="GET",endpoint="/devices/{id}",status="404"} 1' in text
+        assert 'relayr_api_retries_total{method="GET",endpoint="/devices/42"} 1' in text
+
+    def test_histogram_quantiles(self):
+        "Test estimating quantiles from histogram buckets."
+        from relayr.metrics import Histogram
+        h = Histogram(buckets=(1, 2, 4))
+        assert h.quantile(0.5) is None
+        for value in (0.5, 1.5, 1.5, 3):
+            h.observe(value)
+        assert h.quantile(0.5) == 1.5
+        assert h.quantile(1) == 4
+        h.observe(100)
+        assert h.quantile(1) == 4
+
+    def test_metrics_off(self):
+        "Test disabling metrics."
+        from relayr.api import Api
+        session = FakeSession({'/devices/42': FakeResponse(200, {'id': '42'})})
+        api = Api(session=session, check_status=False, metrics=False)
+        api.get_device('42')
+        assert 'endpoints' not in api.stats()
+
+
+class TestHooks(object):
+    "Test hooks into the lifecycle of API calls."
+
+    def test_hooks(self):
+        "Test calling hooks with infos about calls."
+        from relayr.api import Api
+        from relayr.exceptions import RelayrApiException
+        session = FakeSession({'/devices/42': FakeResponse(200, {'id': '42'})})
+        calls = []
+        api = Api(session=session, check_status=False, hooks={
+            'before_request': [lambda info: calls.append(('before', info))],
+            'after_response': [lambda info: calls.append(('after', info))],
+        })
+        api.add_hook('on_error', lambda info: calls.append(('error', info)))
+        api.get_device('42')
+        with pytest.raises(RelayrApiException):
+            api.get_device('43')
+
+        assert [event for (event, info) in calls] == ['before', 'after', 'before', 'error']
+        info = calls[1][1]
+        assert info is calls[0][1]
+        assert info.endpoint == 'get_device'
+        assert (info.method, info.template, info.status) == ('GET', '/devices/42', 200)
+        assert info.response_bytes == len(b'{"id": "42"}')
+        assert info.duration >= 0
+        assert calls[3][1].status == 404
+        assert isinstance(calls[3][1].error, RelayrApiException)
+        api.perform_request('GET', api.host + '/devices/42')
+        assert calls[-1][1].endpoint is None
+        with pytest.raises(ValueError):
+            api.add_hook('after_request', print)
+
+    def test_async_hooks(self):
+        "Test calling hooks for asynchronous calls."
+        pytest.importorskip('aiohttp')
+        import asyncio
+        from relayr.aio import AsyncApi
+        session = FakeAsyncSession({'/devices/1': FakeResponse(200, {'id': '1'})})
+        infos = []
+        a = AsyncApi(session=session, hooks={'after_response': [infos.append]})
+        asyncio.run(a.get_device('1'))
+        assert infos[0].endpoint == 'get_device'
+        assert infos[0].status == 200
+
+    def test_json_lines_exporter(self, tmpdir):
+        "Test writing spans to a JSON-lines file."
+        from relayr.api import Api
+        from relayr.hooks import JsonLinesExporter
+        session = FakeSession({'/devices/42': FakeResponse(200, {'id': '42'})})
+        api = Api(session=session, check_status=False)
+        path = str(tmpdir.join('spans.jsonl'))
+        exporter = JsonLinesExporter(path)
+        exporter.install(api)
+        api.get_device('42')
+        api.get_device('42')
+        exporter.close()
+        spans = [json.loads(line) for line in open(path)]
+        assert len(spans) == 2
+        assert spans[0]['endpoint'] == 'get_device'
+        assert spans[0]['status'] == 200
+        assert spans[0]['span_id'] != spans[1]['span_id']
+
+
+class TestSingleFlight(object):
+    "Test coalescing concurrent identical requests."
+
+    def test_coalesce_gets(self):
+        "Test sharing one request among concurrent identical GETs."
+        import time
+        import threading
+        from relayr.api import Api
+        release = threading.Event()
+
+        def respond():
+            release.wait(5)
+            return FakeResponse(200, {'id': '42'})
+
+        session = FakeSession({'/devices/42': respond})
+        api = Api(session=session, check_status=False, coalesce=True)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(api.get_device('42')))
+            for i in range(5)]
+        for t in threads:
+            t.start()
+        for i in range(500):
+            if api.single_flight.coalesced == 4:
+                break
+            time.sleep(0.01)
+        release.set()
+        for t in threads:
+            t.join()
+        assert results == [{'id': '42'}] * 5
+        assert len(session.requests) == 1
+        assert api.stats()['single_flight'] == {'calls': 1, 'coalesced': 4}
+
+    def test_waiting_deadline(self):
+        "Test callers waiting for a shared request keeping their deadline."
+        import time
+        import threading
+        from relayr.api import Api
+        from relayr.exceptions import RelayrApiTimeoutException
+        release = threading.Event()
+
+        def respond():
+            release.wait(5)
+            return FakeResponse(200, {'id': '42'})
+
+        session = FakeSession({'/devices/42': respond})
+        api = Api(session=session, check_status=False, coalesce=True)
+        leader = threading.Thread(target=api.get_device, args=('42',))
+        leader.start()
+        for i in range(500):
+            if session.requests:
+                break
+            time.sleep(0.01)
+        start = time.time()
+        with pytest.raises(RelayrApiTimeoutException):
+            with api.deadline(0.1):
+                api.get_device('42')
+        assert time.time() - start < 1
+        release.set()
+        leader.join()
+
+    def test_shared_errors(self):
+        "Test raising the exception of the shared call in all callers."
+        from relayr.concurrency import SingleFlight
+        flight = SingleFlight()
+
+        def fail():
+            raise ValueError('failed')
+
+        with pytest.raises(ValueError):
+            flight.call('key', fail)
+        assert flight.call('key', lambda: 42) == 42
+        assert flight.stats() == {'calls': 2, 'coalesced': 0}
+
+        import threading
+        import time
+        started, release = threading.Event(), threading.Event()
+        errors = []
+
+        def slow_fail():
+            started.set()
+            release.wait(5)
+            raise ValueError('failed')
+
+        def call(func):
+            try:
+                flight.call('key', func)
+            except ValueError as e:
+                errors.append(e)
+
+        leader = threading.Thread(target=call, args=(slow_fail,))
+        leader.start()
+        started.wait(5)
+        follower = threading.Thread(target=call, args=(fail,))
+        follower.start()
+        while flight.coalesced == 0:
+            time.sleep(0.001)
+        release.set()
+        leader.join()
+        follower.join()
+        assert len(errors) == 2 and errors[0] is not errors[1]
+        assert [str(e) for e in errors] == ['failed', 'failed']
+
+    def test_coalesce_off(self):
+        "Test disabling coalescing."
+        from relayr.api import Api
+        session = FakeSession({'/devices/42': FakeResponse(200, {'id': '42'})})
+        api = Api(session=session, check_status=False, coalesce=False)
+        assert api.get_device('42') == {'id': '42'}
+        assert 'single_flight' not in api.stats()
+        assert Api(session=session, check_status=False).single_flight is None
+
+
+class TestHedging(object):
+    "Test hedging slow requests."
+
+    def test_hedge_slow_request(self):
+        "Test using the response of a duplicate of a slow request."
+        import time
+        from relayr.api import Api
+        from relayr.hedge import HedgePolicy
+        delays = [0.5, 0]
+
+        def respond():
+            time.sleep(delays.pop(0))
+            return FakeResponse(200, {'id': '42'})
+
+        session = FakeSession({'/devices/42': respond})
+        hedge = HedgePolicy(default_delay=0.05, min_delay=0)
+        api = Api(session=session, check_status=False, hedge=hedge, metrics=False)
+        start = time.time()
+        assert api.get_device('42') == {'id': '42'}
+        assert time.time() - start < 0.4
+        assert len(session.requests) == 2
+        assert api.stats()['hedging'] == {'/devices/42': {'hedged': 1, 'won': 1, 'denied': 0}}
+        api.close()
+
+    def test_hedge_budget(self):
+        "Test not hedging beyond the budget of an endpoint."
+        from relayr.hedge import HedgePolicy
+        from relayr.metrics import MetricsRegistry
+        hedge = HedgePolicy(budget=0.5, burst=1, budgets={'/devices/{id}/cmd': 0})
+        assert hedge.delay('POST', '/devices/{id}') is None
+        assert hedge.delay('GET', '/devices/{id}/cmd') is None
+        assert hedge.delay('GET', '/devices/{id}') == hedge.default_delay
+        assert hedge.allow('/devices/{id}')
+        assert not hedge.allow('/devices/{id}')
+        hedge.delay('GET', '/devices/{id}')
+        hedge.delay('GET', '/devices/{id}')
+        assert hedge.allow('/devices/{id}')
+        assert hedge.stats()['/devices/{id}']['denied'] == 1
+
+        metrics = MetricsRegistry(buckets=(0.1, 0.2))
+        for i in range(20):
+            metrics.observe('GET', '/devices/{id}', 0.15)
+        assert hedge.delay('GET', '/devices/{id}', metrics) == pytest.approx(0.195)
+
+
+class TestForkSafety(object):
+    "Test replacing inherited resources in forked processes."
+
+    def test_fork(self):
+        "Test replacing the session and locks of an API object in a child process."
+        import os
+        if not hasattr(os, 'fork'):
+            pytest.skip('needs os.fork()')
+        from relayr.api import Api
+        api = Api(check_status=False, coalesce=True)
+        parent_session = api.session
+        api.single_flight._flights['stuck'] = object()
+        api.concurrency_limiter.in_flight = 3
+
+        read, write = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            ok = (api.session is not parent_session and
+                not api.single_flight._flights and
+                api.concurrency_limiter.in_flight == 0)
+            os.write(write, b'1' if ok else b'0')
+            os._exit(0)
+        os.close(write)
+        result = os.read(read, 1)
+        os.close(read)
+        os.waitpid(pid, 0)
+        assert result == b'1'
+        assert api.session is parent_session
+        assert 'stuck' in api.single_flight._flights
+
+    def test_check(self, monkeypatch):
+        "Test noticing a fork by a changed process ID."
+        from relayr import forksafe
+        from relayr.api import Api
+        api = Api(check_status=False)
+        parent_session = api.session
+        monkeypatch.setattr(forksafe, '_pid', -1)
+        forksafe.check()
+        assert api.session is not parent_session
+        assert forksafe._pid == __import__('os').getpid()
+
+    def test_helper_locks(self, tmpdir, monkeypatch):
+        "Test replacing locks held by other threads at the time of a fork."
+        from relayr import forksafe
+        from relayr.cache import MemoryCache, FileCache
+        from relayr.hedge import HedgePolicy
+        from relayr.hooks import JsonLinesExporter
+        from relayr.ratelimit import TokenBucket
+        from relayr.utils import dns
+        objects = [MemoryCache(), FileCache(str(tmpdir)), HedgePolicy(),
+            JsonLinesExporter(str(tmpdir.join('spans.jsonl'))), TokenBucket(1),
+            dns.DnsCache([])]
+        for obj in objects:
+            obj._lock.acquire()
+        dns._lock.acquire()
+        try:
+            monkeypatch.setattr(forksafe, '_pid', -1)
+            forksafe.check()
+            assert not any(obj._lock.locked() for obj in objects)
+            assert not dns._lock.locked()
+        finally:
+            dns._lock = __import__('threading').Lock()
+
+
+class TestWarmUp(object):
+    "Test opening connections ahead of time and caching addresses."
+
+    def test_warm(self):
+        "Test opening connections to both hosts."
+        from relayr import config
+        from relayr.api import Api
+        session = FakeSession()
+        api = Api(session=session, check_status=False)
+        opened = api.warm(connections=3)
+        assert opened == {config.relayrAPI: 3, config.relayrHistoryAPI: 3}
+        assert sorted(set((m, u) for (m, u, kw) in session.requests)) == [
+            ('HEAD', config.relayrAPI + '/'), ('HEAD', config.relayrHistoryAPI + '/')]
+        assert len(session.requests) == 6
+
+    def test_async_warm(self):
+        "Test opening connections with asyncio."
+        pytest.importorskip('aiohttp')
+        import asyncio
+        from relayr import config
+        from relayr.aio import AsyncApi
+        api = AsyncApi(session=FakeAsyncSession())
+        opened = asyncio.run(api.warm(connections=2))
+        assert opened == {config.relayrAPI: 2, config.relayrHistoryAPI: 2}
+
+    def test_dns_cache(self):
+        "Test caching addresses of some hosts only."
+        from relayr.utils.dns import DnsCache, host_name
+        lookups = []
+
+        def getaddrinfo(host, port, *args):
+            lookups.append(host)
+            return [(2, 1, 6, '', ('10.0.0.1', port))]
+
+        cache = DnsCache(['api.relayr.io'], ttl=60, getaddrinfo=getaddrinfo)
+        for i in range(3):
+            assert cache.getaddrinfo('api.relayr.io', 443)[0][4] == ('10.0.0.1', 443)
+            cache.getaddrinfo('example.com', 443)
+        assert lookups == ['api.relayr.io'] + ['example.com'] * 3
+        assert cache.stats() == {'hits': 2, 'misses': 1}
+        cache.ttl = 0
+        cache.clear()
+        cache.getaddrinfo('api.relayr.io', 443)
+        cache.getaddrinfo('api.relayr.io', 443)
+        assert lookups.count('api.relayr.io') == 3
+        assert host_name('https://data.relayr.io:443/history') == 'data.relayr.io'
+
+    def test_enable_dns_cache(self):
+        "Test installing the DNS cache for the whole process."
+        import socket
+        from relayr.utils.dns import enable_dns_cache, disable_dns_cache, get_dns_cache
+        original = socket.getaddrinfo
+        try:
+            cache = enable_dns_cache(['https://api.relayr.io'], ttl=10)
+            assert socket.getaddrinfo == cache.getaddrinfo
+            assert get_dns_cache() is cache
+            assert 'api.relayr.io' in cache.hosts
+        finally:
+            disable_dns_cache()
+        assert socket.getaddrinfo is original
+        assert get_dns_cache() is None